@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
@@ -46,11 +47,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "hbm.profiling.profiling_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "hbm.middleware.account_middleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -59,7 +62,7 @@ ROOT_URLCONF = "Home_book.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "hbm.profiling.ProfilingDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -68,6 +71,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "hbm.context_processors.account",
             ],
         },
     },
@@ -78,11 +82,59 @@ WSGI_APPLICATION = "Home_book.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# SQLite by default. HBM_DB_ENGINE=postgresql switches to PostgreSQL configured by the HBM_DB_* variables, with
+# HBM_DB_PGBOUNCER=1 behind PgBouncer in transaction pooling mode. Connections are kept for HBM_DB_CONN_MAX_AGE
+# seconds; set it to 0 under ASGI, where each request may run in a new thread.
+CONN_MAX_AGE = int(os.environ.get("HBM_DB_CONN_MAX_AGE", 60))
+
+if os.environ.get("HBM_DB_ENGINE") == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("HBM_DB_NAME", "home_book"),
+            "USER": os.environ.get("HBM_DB_USER", ""),
+            "PASSWORD": os.environ.get("HBM_DB_PASSWORD", ""),
+            "HOST": os.environ.get("HBM_DB_HOST", ""),
+            "PORT": os.environ.get("HBM_DB_PORT", ""),
+            "CONN_MAX_AGE": CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            # A pooler in transaction mode may hand the next transaction to another server connection.
+            "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("HBM_DB_PGBOUNCER") == "1",
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("HBM_DB_NAME", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            # A file-backed test database lets the concurrency tests use one connection per thread. It is kept out
+            # of the source tree, with its WAL files.
+            "TEST": {"NAME": Path(tempfile.gettempdir()) / "hbm_test_db.sqlite3"},
+        }
     }
+
+# PRAGMAs applied to each new SQLite connection, a profile of hbm.db.SQLITE_PROFILES: "wal" or "default"
+HBM_SQLITE_PROFILE = os.environ.get("HBM_SQLITE_PROFILE", "wal")
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared by all worker processes when HBM_STATISTICS_CACHE_DIR is set, otherwise local to each process. The
+    # entries are keyed by the statistics version of the account, kept in the database, so a process never serves
+    # statistics invalidated by another one.
+    "statistics": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ["HBM_STATISTICS_CACHE_DIR"],
+    } if os.environ.get("HBM_STATISTICS_CACHE_DIR") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "statistics",
+    },
 }
 
 # Password validation
@@ -122,5 +174,39 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_REDIRECT_URL = "/"
 LOGIN_URL = "/login"
 
+# Cache alias behind the in-process category registry, None for the registry only. A category changed in one process
+# is reloaded by the others sharing the cache, so with several processes the cache must be shared by all of them.
+HBM_CATEGORY_CACHE = "default"
+
+# Cache alias and timeout in seconds of the per-account transaction statistics
+HBM_STATISTICS_CACHE = "statistics"
+HBM_STATISTICS_CACHE_TIMEOUT = 3600
+
+# Cache alias shared by all processes for the account of each user, None to read it from the database once per request
+HBM_ACCOUNT_CACHE = None
+
+# Record the query count, SQL time, render time and response size of each view, served at /metrics/ to staff users
+# and to the requests with the HBM_METRICS_TOKEN bearer token
+HBM_PROFILING = os.environ.get("HBM_PROFILING") == "1"
+
+# Bearer token of the scraper reading /metrics/ without a session, None to serve the metrics to staff users only
+HBM_METRICS_TOKEN = os.environ.get("HBM_METRICS_TOKEN") or None
+
+# Log the requests slower than this number of seconds as warnings when profiling, None to log none
+HBM_SLOW_REQUEST_SECONDS = float(os.environ["HBM_SLOW_REQUEST_SECONDS"]) if os.environ.get(
+    "HBM_SLOW_REQUEST_SECONDS") else None
+
+# Compute the statistics from a NumPy copy of each ledger kept by every process when NumPy is installed, and the
+# number of accounts whose copy is kept. Off by default: the first read after every write reloads the whole ledger of
+# the account, which only pays off for large ledgers that are read much more often than written.
+HBM_LEDGER_SNAPSHOTS = os.environ.get("HBM_LEDGER_SNAPSHOTS", "0") == "1"
+HBM_LEDGER_SNAPSHOT_ACCOUNTS = 100
+
+# Directory of the files of the background jobs run by manage.py run_jobs: the uploads to import and the exports
+HBM_JOB_FILES_DIR = os.environ.get("HBM_JOB_FILES_DIR", BASE_DIR / "job_files")
+
+# Route the read-heavy pages to the async views in hbm.async_views, for ASGI deployments
+HBM_ASYNC_VIEWS = os.environ.get("HBM_ASYNC_VIEWS") == "1"
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -0,0 +1,141 @@
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+
+from .models import Account
+
+ACCOUNT_CACHE_KEY = 'hbm:accounts:{}'
+# The session key of the account selected with the account switcher.
+SESSION_ACCOUNT_KEY = 'hbm_account'
+
+
+def _cache():
+    """
+    Function returning the Django cache of the accounts by owner, or None if HBM_ACCOUNT_CACHE is not set.
+    """
+    alias = getattr(settings, 'HBM_ACCOUNT_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def _from_cache(owner_id: int) -> Optional[List[Account]]:
+    """
+    Function for the cached accounts of the owner, or None on a miss or without a cache.
+    """
+    cache = _cache()
+    rows = cache.get(ACCOUNT_CACHE_KEY.format(owner_id)) if cache is not None else None
+    if rows is None:
+        return None
+    return [Account(pk=pk, account_owner_id=owner_id, account_number=account_number, account_balance=account_balance,
+                    account_name=account_name, account_version=account_version)
+            for pk, account_number, account_balance, account_name, account_version in rows]
+
+
+def _to_cache(owner_id: int, accounts: List[Account]) -> None:
+    """
+    Function storing the accounts of the owner in the cache, if there is one.
+    """
+    cache = _cache()
+    if cache is not None:
+        cache.set(ACCOUNT_CACHE_KEY.format(owner_id),
+                  [(account.pk, account.account_number, account.account_balance, account.account_name,
+                    account.account_version) for account in accounts], None)
+
+
+def get_user_accounts(user) -> List[Account]:
+    """
+    Function for all the accounts of the user, oldest first, read with one query or from the account cache if
+    configured.
+    :param user: The user, possibly anonymous.
+    :return: The accounts, empty for an anonymous user.
+    :rtype: List[Account]
+    """
+    if not user.is_authenticated:
+        return []
+    accounts = _from_cache(user.pk)
+    if accounts is None:
+        accounts = list(Account.objects.filter(account_owner=user).order_by('pk'))
+        _to_cache(user.pk, accounts)
+    return accounts
+
+
+async def aget_user_accounts(user) -> List[Account]:
+    """
+    Async version of get_user_accounts() for async views, reading the database with the async ORM.
+    """
+    if not user.is_authenticated:
+        return []
+    accounts = _from_cache(user.pk)
+    if accounts is None:
+        accounts = [account async for account in Account.objects.filter(account_owner=user).order_by('pk')]
+        _to_cache(user.pk, accounts)
+    return accounts
+
+
+def find_account(accounts: Iterable[Account], account_id) -> Optional[Account]:
+    """
+    Function for the account with the given ID among the accounts of a user, or None if it is not one of them.
+    """
+    return next((account for account in accounts if str(account.pk) == str(account_id)), None)
+
+
+def select_account(accounts: List[Account], account_id=None) -> Optional[Account]:
+    """
+    Function for the account selected with the account switcher among the accounts of a user, or, if none is
+    selected or it is not one of them anymore, the oldest one.
+    :param accounts: The accounts of the user, see get_user_accounts().
+    :type accounts: List[Account]
+    :param account_id: The ID of the selected account, or None.
+    :return: The account, or None for a user without an account.
+    :rtype: Optional[Account]
+    """
+    account = find_account(accounts, account_id) if account_id is not None else None
+    return account or next(iter(accounts), None)
+
+
+def get_user_account(user, account_id=None) -> Optional[Account]:
+    """
+    Function for the selected account of the user, see select_account().
+    :param user: The user, possibly anonymous.
+    :param account_id: The ID of the selected account, or None.
+    :return: The account, or None for an anonymous user or a user without an account.
+    :rtype: Optional[Account]
+    """
+    return select_account(get_user_accounts(user), account_id)
+
+
+async def aget_user_account(user, account_id=None) -> Optional[Account]:
+    """
+    Async version of get_user_account() for async views.
+    """
+    return select_account(await aget_user_accounts(user), account_id)
+
+
+def invalidate_account(owner_id: int) -> None:
+    """
+    Function removing the accounts of the owner from the account cache after the current transaction commits, so
+    the next request reads the new balance.
+    :param owner_id: The ID of the user owning the changed account.
+    :type owner_id: int
+    :return: None
+    """
+    cache = _cache()
+    if cache is not None:
+        db_transaction.on_commit(lambda: cache.delete(ACCOUNT_CACHE_KEY.format(owner_id)))
+
+
+def invalidate_account_by_id(account_id: int) -> None:
+    """
+    Function for invalidate_account() when only the ID of the changed account is known. The owner is only read if
+    there is an account cache.
+    """
+    if _cache() is not None:
+        invalidate_account(Account.objects.filter(pk=account_id).values_list('account_owner_id', flat=True).get())
+
+
+def invalidate_account_for_instance(instance: Account, **kwargs) -> None:
+    """
+    Function connected to the post_save and post_delete signals of Account, so admin edits invalidate the cache too.
+    """
+    invalidate_account(instance.account_owner_id)
@@ -1,23 +1,88 @@
 from django.contrib import admin
-from .models import Account, Transaction, TransactionCategory, PlanningTransaction
+from django.db import transaction as db_transaction
+from django.db.models import Model
+
+from .models import Account, Transaction, TransactionCategory, PlanningTransaction, Job
+from .rollups import add_planned_transaction_to_rollup, add_transaction_to_rollup, \
+    remove_planned_transaction_from_rollup, remove_transaction_from_rollup
+from .statistics_cache import bump_statistics_version
+
+# The functions adding a saved row to the monthly rollup and removing a deleted one, per model edited in the admin.
+ROLLUP_FUNCTIONS = {
+    Transaction: (add_transaction_to_rollup, remove_transaction_from_rollup),
+    PlanningTransaction: (add_planned_transaction_to_rollup, remove_planned_transaction_from_rollup),
+}
+
+
+def bump_ledger_versions(*objs: Model) -> None:
+    """
+    Function invalidating the cached statistics of the accounts of transactions edited in the admin, which changes
+    the ledger without Account.add_to_balance(). Planned transactions are not in the statistics.
+    """
+    for account_id in {obj.transaction_account_id for obj in objs if isinstance(obj, Transaction)}:
+        bump_statistics_version(account_id)
+
+
+def save_with_rollup(obj: Model) -> None:
+    """
+    Function saving a transaction or a planned transaction edited in the admin and moving it in the monthly rollup:
+    the saved row, if any, is removed from it and the new one is added.
+    """
+    add, remove = ROLLUP_FUNCTIONS[type(obj)]
+    saved = [type(obj).objects.get(pk=obj.pk)] if obj.pk is not None else []
+    for row in saved:
+        remove(row)
+    obj.save()
+    add(obj)
+    bump_ledger_versions(obj, *saved)
+
+
+def delete_with_rollup(obj: Model) -> None:
+    """
+    Function deleting a transaction or a planned transaction from the admin and removing it from the monthly rollup.
+    """
+    ROLLUP_FUNCTIONS[type(obj)][1](obj)
+    obj.delete()
+    bump_ledger_versions(obj)
+
+
+class RollupModelAdmin(admin.ModelAdmin):
+    """
+    Admin of a model kept in the monthly rollup, which every add, change and delete updates in the same transaction.
+    """
+
+    def save_model(self, request, obj, form, change):
+        with db_transaction.atomic():
+            save_with_rollup(obj)
+
+    def delete_model(self, request, obj):
+        with db_transaction.atomic():
+            delete_with_rollup(obj)
+
+    def delete_queryset(self, request, queryset):
+        with db_transaction.atomic():
+            for obj in queryset:
+                delete_with_rollup(obj)
 
 
 # Register your models here.
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(RollupModelAdmin):
     model = Transaction
     list_display = (
         "transaction_account", "transaction_type", "transaction_category", "transaction_sum", "transaction_comment",
         "transaction_date")
     list_filter = ("transaction_date",)
+    list_select_related = ("transaction_account__account_owner", "transaction_category")
 
 
-class PlanningTransactionAdmin(admin.ModelAdmin):
+class PlanningTransactionAdmin(RollupModelAdmin):
     model = PlanningTransaction
     list_display = (
         "transaction_account_plan", "transaction_type_plan", "transaction_category_plan", "transaction_sum_plan",
         "transaction_comment_plan",
         "transaction_date_plan")
     list_filter = ("transaction_date_plan",)
+    list_select_related = ("transaction_account_plan__account_owner", "transaction_category_plan")
 
 
 class TransactionInstanceInline(admin.TabularInline):
@@ -30,10 +95,33 @@ class TransactionCategoryAdmin(admin.ModelAdmin):
 
 class AccountAdmin(admin.ModelAdmin):
     list_display = ("account_owner", "account_number", "account_balance")
+    list_select_related = ("account_owner",)
     inlines = [TransactionInstanceInline]
 
+    def save_formset(self, request, form, formset, change):
+        """
+        Method saving the transactions of the inline like save_model() of TransactionAdmin, so the monthly rollup
+        follows them.
+        """
+        if formset.model is not Transaction:
+            return super().save_formset(request, form, formset, change)
+        with db_transaction.atomic():
+            instances = formset.save(commit=False)
+            for obj in formset.deleted_objects:
+                delete_with_rollup(obj)
+            for obj in instances:
+                save_with_rollup(obj)
+            formset.save_m2m()
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "job_owner", "job_kind", "job_status", "job_attempts", "job_created", "job_finished")
+    list_filter = ("job_status", "job_kind")
+    list_select_related = ("job_owner",)
+
 
 admin.site.register(Account, AccountAdmin)
 admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(TransactionCategory, TransactionCategoryAdmin)
 admin.site.register(PlanningTransaction, PlanningTransactionAdmin)
+admin.site.register(Job, JobAdmin)
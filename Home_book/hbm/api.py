@@ -0,0 +1,318 @@
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Callable
+from urllib.parse import urlencode
+
+from django.http import HttpRequest, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .accounts import find_account
+from .budget import budget_report, parse_month
+from .categories import TRANSFER_CATEGORY_NAME, get_categories
+from .forecast import FORECAST_DAYS, MAX_FORECAST_DAYS, forecast
+from .forms import TransactionForm, PlanningTransactionForm
+from .importers import clean_rows
+from .jobs import JOB_DONE, enqueue_job, job_status
+from .ledger import keyset_page, save_batch, delete_batch
+from .models import Job
+from .snapshot import compare_sums, ledger_sums
+from .statistics_cache import get_cached_statistics
+from .views import get_filtered_transactions, get_statistic_data
+
+API_PAGE_SIZE = 100
+MAX_API_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+FORM_CLASSES = {False: TransactionForm, True: PlanningTransactionForm}
+API_JOB_KINDS = ('statistics', 'export', 'reconcile')
+
+
+def api_login_required(view: Callable) -> Callable:
+    """
+    Decorator for API views answering anonymous requests with a 401 JSON error instead of a redirect to the login
+    page.
+    """
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def get_api_account(request: HttpRequest):
+    """
+    Function for the account of the user given by the account parameter, by default the one selected with the
+    account switcher, or None if the user has no such account.
+    """
+    account_id = request.GET.get('account')
+    if account_id:
+        return find_account(request.accounts, account_id)
+    return request.account or None
+
+
+def read_json_body(request: HttpRequest, key: str):
+    """
+    Function for a list from the JSON request body.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param key: The key of the list in the body.
+    :type key: str
+    :return: The list.
+    :rtype: list
+    :raises ValueError: If the body is not a JSON object with a list under the key, or the list is too long.
+    """
+    body = json.loads(request.body)
+    items = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        raise ValueError(f'Expected a JSON object with a "{key}" list')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'At most {MAX_BATCH_SIZE} items per request')
+    return items
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def transaction_list(request: HttpRequest, planned: bool = False) -> JsonResponse:
+    """
+    Function for one page of the transactions or planned transactions of the account as JSON, newest first. Accepts
+    the filter parameters of the filter page, limit and the cursor returned with the previous page.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: A JSON object with the transactions and the cursor of the next page.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    try:
+        limit = min(int(request.GET.get('limit', API_PAGE_SIZE)), MAX_API_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+        transactions = get_filtered_transactions(request.GET, user_account, planned).values(
+            'id', *FORM_CLASSES[planned]._meta.fields)
+        page, next_cursor = keyset_page(transactions, request.GET.get('cursor'), limit, planned)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit, cursor or date'}, status=400)
+    return JsonResponse({'results': page, 'next_cursor': next_cursor})
+
+
+@api_login_required
+@require_http_methods(["POST"])
+def transaction_batch_create(request: HttpRequest, planned: bool = False) -> JsonResponse:
+    """
+    Function creating a batch of transactions or planned transactions from a JSON object with a "transactions" list,
+    keyed like the add forms. The batch is saved all or nothing, with the balance changed once.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: A JSON object with the IDs of the created transactions, or with the errors of the invalid ones.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    try:
+        rows = read_json_body(request, 'transactions')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    errors = []
+    batch = list(clean_rows((row if isinstance(row, dict) else {} for row in rows), errors, FORM_CLASSES[planned]))
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    saved = save_batch(user_account, batch, planned)
+    return JsonResponse({'created': len(saved), 'ids': [transaction.pk for transaction in saved]}, status=201)
+
+
+@api_login_required
+@require_http_methods(["POST"])
+def transaction_batch_delete(request: HttpRequest, planned: bool = False) -> JsonResponse:
+    """
+    Function deleting the transactions or planned transactions of the account listed in a JSON object with an "ids"
+    list. The balance is changed once for the whole batch; unknown IDs are ignored.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: A JSON object with the number of deleted transactions.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    try:
+        ids = read_json_body(request, 'ids')
+        # JSON true and false are bools, which are ints in Python.
+        if not all(type(transaction_id) is int for transaction_id in ids):
+            raise ValueError('The IDs must be integers')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'deleted': delete_batch(user_account, ids, planned)})
+
+
+def parse_period(request: HttpRequest, start_key: str, end_key: str) -> tuple:
+    """
+    Function for the first and the last day of a period given by two date parameters, or (None, None) if either of
+    them is missing.
+    :raises ValueError: If a date is invalid.
+    """
+    start_date = request.GET.get(start_key)
+    end_date = request.GET.get(end_key)
+    if not (start_date and end_date):
+        return None, None
+    return datetime.strptime(start_date, '%Y-%m-%d').date(), datetime.strptime(end_date, '%Y-%m-%d').date()
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def summary(request: HttpRequest) -> JsonResponse:
+    """
+    Function for the balance of the account and the statistics of its transactions for the optional
+    transaction_start_date and transaction_end_date period, as on the statistics page. The statistics can be limited
+    to the categories given by the repeated category parameter, and compared per category with the
+    compare_start_date and compare_end_date period.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: A JSON object with the balance, the statistics and the optional comparison.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    try:
+        transaction_start_date, transaction_end_date = parse_period(
+            request, 'transaction_start_date', 'transaction_end_date')
+        compare_start_date, compare_end_date = parse_period(request, 'compare_start_date', 'compare_end_date')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date'}, status=400)
+    try:
+        categories = [int(category) for category in request.GET.getlist('category')] or None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid category'}, status=400)
+
+    if categories is None:
+        statistic_data = get_cached_statistics(
+            user_account, transaction_start_date, transaction_end_date,
+            lambda: get_statistic_data(ledger_sums(user_account, transaction_start_date, transaction_end_date)))
+    else:
+        statistic_data = get_statistic_data(
+            ledger_sums(user_account, transaction_start_date, transaction_end_date, categories))
+    response = {'account_balance': user_account.account_balance, 'statistics': statistic_data}
+    if compare_start_date is not None:
+        response['comparison'] = compare_sums(user_account, (transaction_start_date, transaction_end_date),
+                                              (compare_start_date, compare_end_date), categories)
+    return JsonResponse(response)
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def budget(request: HttpRequest) -> JsonResponse:
+    """
+    Function for the budget-vs-actual report of the account between the start_month and end_month months given as
+    YYYY-MM, the current year by default, as on the budget page.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: A JSON object with the report rows per month and category and the totals per category.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    today = timezone.localdate()
+    try:
+        start_month = parse_month(request.GET.get('start_month'), today.replace(month=1))
+        end_month = parse_month(request.GET.get('end_month'), today.replace(month=12))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid month'}, status=400)
+    transfer_categories = [category.pk for category in get_categories()
+                           if category.category_name == TRANSFER_CATEGORY_NAME]
+    return JsonResponse(budget_report(user_account, start_month, end_month, transfer_categories))
+
+
+@api_login_required
+@require_http_methods(["POST"])
+def job_create(request: HttpRequest) -> JsonResponse:
+    """
+    Function queueing a statistics or export job of the account, or a reconciliation of all the balances for staff
+    users, from a JSON object with its "kind" and its "params": the query parameters of the statistics page or of
+    the export, or "fix" and "incremental" for a reconciliation. A run_jobs worker runs the job, whose status is
+    read at the returned URL.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: A JSON object with the status of the queued job and its URL.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    kind = body.get('kind') if isinstance(body, dict) else None
+    params = body.get('params', {}) if isinstance(body, dict) else None
+    if kind not in API_JOB_KINDS or not isinstance(params, dict):
+        return JsonResponse({'error': f'Expected a JSON object with a "kind" among {", ".join(API_JOB_KINDS)} and a '
+                                      f'"params" object'}, status=400)
+    if kind == 'reconcile':
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'Staff only'}, status=403)
+        job = enqueue_job(request.user, kind, params={'fix': bool(params.get('fix')),
+                                                      'incremental': bool(params.get('incremental'))})
+    else:
+        job = enqueue_job(request.user, kind, user_account, {'query': urlencode(params, doseq=True)})
+    return JsonResponse({**job_status(job), 'url': reverse('api_job', args=[job.pk])}, status=202)
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def job_detail(request: HttpRequest, job_id: int) -> JsonResponse:
+    """
+    Function for the status of a job of the user, with its result once done and the URL of the file of an export.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param job_id: The ID of the job.
+    :type job_id: int
+    :return: A JSON object with the status of the job.
+    :rtype: JsonResponse
+    """
+    job = Job.objects.filter(pk=job_id, job_owner=request.user).first()
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    status = job_status(job)
+    if job.job_kind == 'export' and job.job_status == JOB_DONE:
+        status['download'] = reverse('job_download', args=[job.pk])
+    return JsonResponse(status)
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def balance_forecast(request: HttpRequest) -> JsonResponse:
+    """
+    Function for the daily forecast of the balance of the account from today to the end date parameter, or for the
+    number of days given by the days parameter, one year by default.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: A JSON object with the current balance and the projected balance for each day.
+    :rtype: JsonResponse
+    """
+    user_account = get_api_account(request)
+    if user_account is None:
+        return JsonResponse({'error': 'Account not found'}, status=404)
+    start = timezone.localdate()
+    try:
+        if request.GET.get('end'):
+            end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date()
+        else:
+            end = start + timedelta(days=int(request.GET.get('days', FORECAST_DAYS)) - 1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid end or days'}, status=400)
+    if not start <= end < start + timedelta(days=MAX_FORECAST_DAYS):
+        return JsonResponse({'error': f'The forecast covers 1 to {MAX_FORECAST_DAYS} days from today'}, status=400)
+    return JsonResponse({'account_balance': user_account.account_balance,
+                         'series': forecast(user_account, end, start)})
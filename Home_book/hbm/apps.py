@@ -5,3 +5,24 @@ class HbmConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hbm"
     verbose_name = 'Home bookkeeping'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save, post_delete
+        from .accounts import invalidate_account_for_instance
+        from .categories import invalidate_categories, warm_categories
+        from .db import apply_sqlite_profile
+        from .models import Account, Transaction, TransactionCategory
+        from .profiling import install_query_timer
+        from .search import index_transaction_for_instance, unindex_transaction_for_instance
+
+        post_save.connect(invalidate_categories, sender=TransactionCategory)
+        post_delete.connect(invalidate_categories, sender=TransactionCategory)
+        request_started.connect(warm_categories)
+        post_save.connect(index_transaction_for_instance, sender=Transaction)
+        post_delete.connect(unindex_transaction_for_instance, sender=Transaction)
+        post_save.connect(invalidate_account_for_instance, sender=Account)
+        post_delete.connect(invalidate_account_for_instance, sender=Account)
+        connection_created.connect(install_query_timer)
+        connection_created.connect(apply_sqlite_profile)
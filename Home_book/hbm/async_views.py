@@ -0,0 +1,207 @@
+from decimal import Decimal
+from functools import wraps
+from typing import AsyncIterator, Callable, Optional, Union
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse, Http404, HttpResponseBadRequest, HttpResponseNotAllowed, \
+    StreamingHttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+
+from .accounts import SESSION_ACCOUNT_KEY, aget_user_account
+from .categories import get_categories
+from .ledger import akeyset_page
+from .models import Account, Transaction, PlanningTransaction
+from .rollups import arollup_sums
+from .running_balance import abalance_checkpoint, arunning_balance_page, set_running_balances, with_running_total
+from .search import asearch_page
+from .snapshot import ledger_sums, snapshots_enabled
+from .statistics_cache import aget_cached_statistics
+from .views import FILTER_PAGE_SIZE, STREAM_CHUNK_SIZE, STREAM_ROWS_MARKER, get_filtered_transactions, \
+    get_statistic_data, parse_date_range, running_balance_end_date
+
+# Async versions of the read-heavy views, routed instead of the ones in views when HBM_ASYNC_VIEWS is set. They read
+# the database with the async ORM, so one ASGI worker can serve many concurrent readers. Templates are rendered in a
+# thread, since the category_name filter may reload the category registry.
+
+arender = sync_to_async(render)
+arender_to_string = sync_to_async(render_to_string)
+
+
+async def aget_user(request: HttpRequest):
+    """
+    Function loading the lazy request.user in a thread, since it reads the session and the user from the database.
+    """
+    user = request.user
+    await sync_to_async(getattr)(user, 'is_authenticated')
+    return user
+
+
+async def aget_request_account(request: HttpRequest) -> Account:
+    """
+    Async version of views.get_request_account().
+    :raises Http404: If the user has no account.
+    """
+    session = getattr(request, 'session', None)
+    account_id = await sync_to_async(session.get)(SESSION_ACCOUNT_KEY) if session is not None else None
+    account = await aget_user_account(await aget_user(request), account_id)
+    if account is None:
+        raise Http404('No Account matches the given query.')
+    return account
+
+
+def async_view(methods: Optional[list] = None, login: bool = True) -> Callable:
+    """
+    Decorator for async views combining require_http_methods() and login_required. Django wraps async views with
+    them only since 5.0 and 5.1; this one also works on the earlier versions the project supports, and reads the user
+    with aget_user(), so it accepts requests whose user was set directly, without request.auser().
+    :param methods: The allowed HTTP methods, or None for any.
+    :type methods: Optional[list]
+    :param login: True to redirect anonymous users to the login page.
+    :type login: bool
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        async def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            if methods is not None and request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            if login and not (await aget_user(request)).is_authenticated:
+                return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def astream_filtered_transactions(request: HttpRequest, transactions: QuerySet, context: dict,
+                                        checkpoint: Optional[Decimal] = None) -> AsyncIterator[str]:
+    """
+    Async version of stream_filtered_transactions(), reading the rows with an async server-side iterator.
+    """
+    page = await arender_to_string('hbm/filter.html', {**context, 'stream_rows_marker': STREAM_ROWS_MARKER},
+                                   request=request)
+    head, tail = page.split(STREAM_ROWS_MARKER)
+    yield head
+    rows_context = {'show_balance': checkpoint is not None}
+    chunk = []
+    async for transaction in transactions.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        chunk.append(transaction)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            if checkpoint is not None:
+                set_running_balances(chunk, checkpoint)
+            yield await arender_to_string('hbm/filter_rows.html', {**rows_context, 'transactions': chunk})
+            chunk = []
+    if chunk:
+        if checkpoint is not None:
+            set_running_balances(chunk, checkpoint)
+        yield await arender_to_string('hbm/filter_rows.html', {**rows_context, 'transactions': chunk})
+    yield tail
+
+
+@async_view(login=False)
+async def home(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of views.home().
+    """
+    if (await aget_user(request)).is_authenticated:
+        user_account = await aget_request_account(request)
+        return await arender(request, 'hbm/home.html', {'user_account': user_account})
+    else:
+        return await arender(request, 'hbm/home.html')
+
+
+@async_view(["GET"])
+async def latest(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of views.latest().
+    """
+    user_account = await aget_request_account(request)
+    transactions, _ = await arunning_balance_page(
+        user_account, Transaction.objects.filter(transaction_account=user_account), None, 10)
+    return await arender(request, 'hbm/transaction.html', {'transactions': transactions, 'user_account': user_account})
+
+
+@async_view(["GET"])
+async def filter(request: HttpRequest) -> Union[HttpResponse, StreamingHttpResponse]:
+    """
+    Async version of views.filter().
+    """
+    user_account = await aget_request_account(request)
+    try:
+        transactions = get_filtered_transactions(request.GET, user_account).order_by('-transaction_date', '-id')
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date or category')
+    category_list = await sync_to_async(get_categories)()
+    export_query = request.GET.copy()
+    for name in ('cursor', 'stream'):
+        export_query.pop(name, None)
+    show_balance, end_date = running_balance_end_date(request.GET)
+    context = {'category_list': category_list, 'user_account': user_account, 'export_query': export_query.urlencode(),
+               'show_balance': show_balance, 'search': request.GET.get("search", "")}
+
+    if request.GET.get("stream"):
+        if show_balance:
+            return StreamingHttpResponse(astream_filtered_transactions(
+                request, with_running_total(transactions), context,
+                await abalance_checkpoint(user_account, None, end_date)))
+        return StreamingHttpResponse(astream_filtered_transactions(request, transactions, context))
+
+    cursor = request.GET.get("cursor")
+    try:
+        if request.GET.get("search"):
+            page, next_cursor = await asearch_page(transactions, cursor, FILTER_PAGE_SIZE)
+        elif show_balance:
+            page, next_cursor = await arunning_balance_page(user_account, transactions, cursor, FILTER_PAGE_SIZE,
+                                                            end_date)
+        else:
+            page, next_cursor = await akeyset_page(transactions, cursor, FILTER_PAGE_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    if next_cursor:
+        next_page = request.GET.copy()
+        next_page['cursor'] = next_cursor
+        context['next_page_query'] = next_page.urlencode()
+    if cursor:
+        first_page = request.GET.copy()
+        del first_page['cursor']
+        context['first_page_query'] = first_page.urlencode()
+    context['transactions'] = page
+    return await arender(request, 'hbm/filter.html', context)
+
+
+@async_view(["GET"])
+async def transaction_statistics(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of views.transaction_statistics().
+    """
+    user_account = await aget_request_account(request)
+    try:
+        transaction_start_date, transaction_end_date = parse_date_range(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date')
+
+    async def compute() -> list:
+        if snapshots_enabled():
+            sums = await sync_to_async(ledger_sums)(user_account, transaction_start_date, transaction_end_date)
+        else:
+            sums = await arollup_sums(user_account, transaction_start_date, transaction_end_date)
+        return get_statistic_data(sums)
+
+    statistic_data = await aget_cached_statistics(user_account, transaction_start_date, transaction_end_date,
+                                                  compute)
+    return await arender(request, 'hbm/transaction_statistics.html',
+                         {"statistic_data": statistic_data, 'user_account': user_account})
+
+
+@async_view(["GET"])
+async def planned_transactions(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of views.planned_transactions().
+    """
+    user_account = await aget_request_account(request)
+    transactions = [transaction async for transaction in PlanningTransaction.objects.filter(
+        transaction_account_plan=user_account).order_by('-transaction_date_plan')]
+    return await arender(request, 'hbm/planned_transactions.html',
+                         {'transactions': transactions, 'user_account': user_account})
@@ -0,0 +1,104 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.db import connection
+from django.db.models import F, Sum
+from django.test.utils import CaptureQueriesContext
+
+from ..categories import get_category_name
+from ..load_test import percentile
+from ..models import Account, Transaction, TransactionCategory
+from ..rollups import rollup_sums
+from ..snapshot import LedgerSnapshot
+
+ANALYTICS_ENGINES = ('orm', 'rollups', 'snapshot')
+
+
+def orm_sums(account: Account, start_date: date, end_date: date, categories: Optional[List[int]]) -> list:
+    """
+    Function for the sums per transaction type and category name grouped by the database over the raw ledger, the
+    path without rollups nor snapshot.
+    """
+    transactions = Transaction.objects.filter(transaction_account=account,
+                                              transaction_date__range=(start_date, end_date))
+    if categories is not None:
+        transactions = transactions.filter(transaction_category__in=categories)
+    return [{'type': row['type'], 'category_name': get_category_name(row['transaction_category']),
+             'total': row['total']}
+            for row in transactions.values('transaction_category').annotate(
+                type=F('transaction_type'), total=Sum('transaction_sum')).order_by()]
+
+
+def random_slices(categories: List[TransactionCategory], count: int, end: date, days: int, seed: int = 0) -> list:
+    """
+    Function for count random (start_date, end_date, categories) slices of the days before end: a third over all
+    categories, the others over two to five of them.
+    """
+    rng = random.Random(seed)
+    ids = [category.pk for category in categories]
+    slices = []
+    for number in range(count):
+        first, last = sorted(rng.randrange(days) for _ in range(2))
+        subset = None if number % 3 == 0 else rng.sample(ids, min(len(ids), rng.randint(2, 5)))
+        slices.append((end - timedelta(days=last), end - timedelta(days=first), subset))
+    return slices
+
+
+def analytics_benchmark(account: Account, categories: List[TransactionCategory], count: int = 200,
+                        end: Optional[date] = None, days: int = 3650, seed: int = 0) -> List[dict]:
+    """
+    Function timing the same random date range and category slices of the ledger of the account with each engine:
+    the raw ORM grouping, rollup_sums() and a LedgerSnapshot loaded once. The engines must return the same totals.
+    :param account: The account with a ledger, see generate_transactions().
+    :type account: Account
+    :param categories: The categories the slices pick from.
+    :type categories: List[TransactionCategory]
+    :param count: The number of slices.
+    :type count: int
+    :param end: The last day of the ledger, today by default.
+    :type end: Optional[date]
+    :param days: The number of days of the ledger.
+    :type days: int
+    :param seed: The seed of the random slices.
+    :type seed: int
+    :return: One result per engine with the median and p95 time per slice in milliseconds and the number of queries;
+        the snapshot also has its load time, its size in bytes and its number of rows.
+    :rtype: List[dict]
+    :raises RuntimeError: If the engines do not agree on the totals of a slice.
+    """
+    slices = random_slices(categories, count, end or date.today(), days, seed)
+    started = time.perf_counter()
+    snapshot = LedgerSnapshot.load(account)
+    load_ms = (time.perf_counter() - started) * 1000
+    engines: Dict[str, Callable] = {
+        'orm': lambda start_date, end_date, subset: orm_sums(account, start_date, end_date, subset),
+        'rollups': lambda start_date, end_date, subset: rollup_sums(account, start_date, end_date,
+                                                                     categories=subset),
+        'snapshot': lambda start_date, end_date, subset: snapshot.sums(start_date, end_date, subset),
+    }
+    results = []
+    answers = {}
+    for engine, compute in engines.items():
+        durations = []
+        with CaptureQueriesContext(connection) as queries:
+            for number, (start_date, end_date, subset) in enumerate(slices):
+                started = time.perf_counter()
+                rows = compute(start_date, end_date, subset)
+                durations.append(time.perf_counter() - started)
+                totals = {}
+                for row in rows:
+                    key = (row['type'], row['category_name'])
+                    totals[key] = totals.get(key, 0) + row['total']
+                answers.setdefault(number, totals)
+                if {key: round(total, 2) for key, total in totals.items()} != \
+                        {key: round(total, 2) for key, total in answers[number].items()}:
+                    raise RuntimeError(f'{engine} disagrees with {ANALYTICS_ENGINES[0]} on slice {number}')
+        result = {'engine': engine, 'median_ms': statistics.median(durations) * 1000,
+                  'p95_ms': percentile(durations, 0.95) * 1000, 'queries': len(queries)}
+        if engine == 'snapshot':
+            result.update(load_ms=load_ms, bytes=snapshot.nbytes, rows=len(snapshot))
+        results.append(result)
+    return results
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.db import connection, connections
+from django.test import Client, override_settings
+
+from ..load_test import percentile
+from ..models import Account, TransactionCategory
+
+READ_PATHS = ('/latest/', '/filter/', '/transaction_statistics/')
+
+
+def run_client(cookies, deadline: float, request) -> tuple:
+    """
+    Function sending requests with a test client sharing the given session cookies until the deadline, in its own
+    thread and database connection.
+    :return: The latencies in seconds of the successful requests and the number of failed ones.
+    :rtype: tuple
+    """
+    client = Client()
+    client.cookies = cookies
+    latencies = []
+    failures = 0
+    number = 0
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = request(client, number)
+            except Exception:
+                # e.g. OperationalError: database is locked
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+            number += 1
+    finally:
+        connection.close()
+    return latencies, failures
+
+
+def read_write_benchmark(account: Account, category: TransactionCategory, profile: str, readers: int = 4,
+                         writers: int = 2, duration: float = 5.0) -> dict:
+    """
+    Function measuring the read throughput of the pages of a user while other threads add transactions, with the
+    given SQLite profile applied to every connection. All connections are closed first, so the journal mode of the
+    database file can change.
+    :param account: The account whose pages are read and to which the transactions are added.
+    :type account: Account
+    :param category: The category of the added transactions.
+    :type category: TransactionCategory
+    :param profile: The profile of hbm.db.SQLITE_PROFILES.
+    :type profile: str
+    :param readers: The number of reading threads.
+    :type readers: int
+    :param writers: The number of writing threads.
+    :type writers: int
+    :param duration: The duration of the run in seconds.
+    :type duration: float
+    :return: The profile, the journal mode in effect, the read and write counts and rates, the failures and the read
+        latency percentiles.
+    :rtype: dict
+    """
+    def read(client, number):
+        return client.get(READ_PATHS[number % len(READ_PATHS)]).status_code == 200
+
+    def write(client, number):
+        return client.post('/add_transaction/', {
+            'transaction_type': category.category_type, 'transaction_category': category.pk,
+            'transaction_date': date.today().isoformat(), 'transaction_sum': '1.00',
+            'transaction_comment': 'concurrency'}).status_code == 302
+
+    connections.close_all()
+    with override_settings(HBM_SQLITE_PROFILE=profile):
+        login = Client()
+        login.force_login(account.account_owner)
+        with connection.cursor() as cursor:
+            journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        connection.close()
+        deadline = time.perf_counter() + duration
+        with ThreadPoolExecutor(readers + writers) as executor:
+            futures = [executor.submit(run_client, login.cookies, deadline, read) for _ in range(readers)]
+            futures += [executor.submit(run_client, login.cookies, deadline, write) for _ in range(writers)]
+            results = [future.result() for future in futures]
+    read_latencies = [latency for latencies, _ in results[:readers] for latency in latencies]
+    writes = sum(len(latencies) for latencies, _ in results[readers:])
+    return {'profile': profile, 'journal_mode': journal_mode, 'reads': len(read_latencies), 'writes': writes,
+            'failures': sum(failures for _, failures in results),
+            'reads_per_second': len(read_latencies) / duration, 'writes_per_second': writes / duration,
+            'read_p50_ms': percentile(read_latencies, 0.5) * 1000,
+            'read_p99_ms': percentile(read_latencies, 0.99) * 1000}
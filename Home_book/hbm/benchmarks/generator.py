@@ -0,0 +1,118 @@
+import json
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+
+from ..accounts import invalidate_account
+from ..models import Account, Transaction, TransactionCategory
+from ..reconciliation import ledger_balance_subquery
+from ..rollups import rebuild_rollups
+from ..search import rebuild_search_index
+from ..statistics_cache import bump_statistics_version
+
+CATEGORIES_FILE = Path(__file__).resolve().parent.parent / 'json_data' / 'categories.json'
+INCOME_CATEGORIES = {'salary', 'pension', 'allowance', 'deposit', 'rental income', 'income from securities'}
+GENERATOR_BATCH_SIZE = 5000
+BENCHMARK_PASSWORD = 'benchmark'
+
+
+def load_categories() -> List[TransactionCategory]:
+    """
+    Function for the categories listed in categories.json, created if they do not exist, with the income ones typed
+    as income.
+    :return: The categories.
+    :rtype: List[TransactionCategory]
+    """
+    with open(CATEGORIES_FILE) as file:
+        names = [row['category_name'] for row in json.load(file)['data']]
+    return [TransactionCategory.objects.get_or_create(
+        category_name=name, defaults={'category_type': int(name in INCOME_CATEGORIES)})[0] for name in names]
+
+
+def create_accounts(count: int, prefix: str = 'bench') -> List[Account]:
+    """
+    Function creating users named prefix0, prefix1, ... with the password BENCHMARK_PASSWORD, each with an empty
+    account. The password is hashed once for all users.
+    :param count: The number of users.
+    :type count: int
+    :param prefix: The prefix of the usernames.
+    :type prefix: str
+    :return: The accounts, in the order of the usernames.
+    :rtype: List[Account]
+    """
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(User(username=f'{prefix}{number}', password=password) for number in range(count))
+    users = User.objects.filter(username__in=[f'{prefix}{number}' for number in range(count)])
+    Account.objects.bulk_create(Account(account_owner=user, account_number=f'{user.pk:010d}') for user in users)
+    accounts = {account.account_owner.username: account for account in Account.objects.filter(
+        account_owner__in=users).select_related('account_owner')}
+    return [accounts[f'{prefix}{number}'] for number in range(count)]
+
+
+def synthetic_transactions(account: Account, count: int, categories: List[TransactionCategory], rng: random.Random,
+                           end: date, days: int) -> Iterator[Transaction]:
+    """
+    Generator for count random transactions of the account over the days before end, mostly expenses of 1.00 to
+    200.00 and a few incomes of 100.00 to 3,000.00.
+    """
+    expenses = [category for category in categories if category.category_type == 0]
+    incomes = [category for category in categories if category.category_type == 1]
+    for _ in range(count):
+        income = rng.random() < 0.1
+        category = rng.choice(incomes if income else expenses)
+        cents = rng.randint(10000, 300000) if income else rng.randint(100, 20000)
+        yield Transaction(transaction_account=account, transaction_type=int(income), transaction_category=category,
+                          transaction_date=end - timedelta(days=rng.randrange(days)),
+                          transaction_sum=Decimal(cents).scaleb(-2), transaction_comment=category.category_name)
+
+
+def generate_transactions(accounts: List[Account], count: int, categories: List[TransactionCategory],
+                          seed: int = 0, end: Optional[date] = None, days: int = 3650,
+                          batch_size: int = GENERATOR_BATCH_SIZE) -> int:
+    """
+    Function adding count random transactions to each account with bulk_create, batch by batch so memory does not
+    depend on count. The balances are then set to the ledger sums and the rollups and the search index are rebuilt, as
+    if the transactions had been added one by one. The same seed gives the same ledger.
+    :param accounts: The accounts.
+    :type accounts: List[Account]
+    :param count: The number of transactions per account.
+    :type count: int
+    :param categories: The categories to pick from, see load_categories().
+    :type categories: List[TransactionCategory]
+    :param seed: The seed of the random generator.
+    :type seed: int
+    :param end: The date of the newest transactions, today by default.
+    :type end: Optional[date]
+    :param days: The number of days the transactions are spread over.
+    :type days: int
+    :param batch_size: The number of transactions per INSERT.
+    :type batch_size: int
+    :return: The number of created transactions.
+    :rtype: int
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    created = 0
+    with db_transaction.atomic():
+        for account in accounts:
+            rows = synthetic_transactions(account, count, categories, rng, end, days)
+            while batch := list(islice(rows, batch_size)):
+                Transaction.objects.bulk_create(batch)
+                created += len(batch)
+        Account.objects.filter(pk__in=[account.pk for account in accounts]).update(
+            account_balance=ledger_balance_subquery())
+        for account in accounts:
+            rebuild_rollups(account)
+            rebuild_search_index(account)
+            invalidate_account(account.account_owner_id)
+            bump_statistics_version(account.pk)
+    for account in accounts:
+        account.refresh_from_db(fields=['account_balance'])
+    return created
@@ -0,0 +1,152 @@
+import platform
+import statistics
+import time
+from datetime import date, timedelta
+from typing import List, Optional, Sequence
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from ..load_test import percentile
+from ..models import Account, Transaction, TransactionCategory
+from .generator import create_accounts, generate_transactions, load_categories
+
+BENCHMARK_SIZES = (1000, 10000, 100000)
+BENCHMARK_VIEWS = ('latest', 'filter', 'transaction_statistics', 'add_transaction', 'del_transaction')
+BENCHMARK_COMMENT = 'benchmark'
+
+
+def time_request(client: Client, method: str, path: str, data: Optional[dict] = None,
+                 expected_status: int = 200) -> tuple:
+    """
+    Function timing one request of the test client.
+    :return: The duration in seconds and the number of queries.
+    :rtype: tuple
+    :raises RuntimeError: If the response does not have the expected status, e.g. a redirect to the login page.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(path, data)
+        duration = time.perf_counter() - started
+    if response.status_code != expected_status:
+        raise RuntimeError(f'{method.upper()} {path} returned {response.status_code}, expected {expected_status}')
+    return duration, len(queries)
+
+
+def summarize(view: str, durations: List[float], queries: List[int]) -> dict:
+    """
+    Function for the result of a view: the first (cold cache) request, the median and p95 of the others in
+    milliseconds, and the median query count.
+    """
+    warm = durations[1:] or durations
+    return {'view': view, 'first_ms': durations[0] * 1000, 'median_ms': statistics.median(warm) * 1000,
+            'p95_ms': percentile(warm, 0.95) * 1000, 'queries': int(statistics.median(queries))}
+
+
+def benchmark_views(client: Client, category: TransactionCategory, repeat: int,
+                    views: Sequence[str] = BENCHMARK_VIEWS) -> List[dict]:
+    """
+    Function timing each view repeat times through the test client of a logged-in user. add_transaction adds repeat
+    transactions, which del_transaction deletes again, so the ledger keeps its size.
+    :param client: The test client of a user with an account.
+    :type client: Client
+    :param category: The category of the added transactions.
+    :type category: TransactionCategory
+    :param repeat: The number of requests per view.
+    :type repeat: int
+    :param views: The views to time, among BENCHMARK_VIEWS.
+    :type views: Sequence[str]
+    :return: One result per view, see summarize().
+    :rtype: List[dict]
+    """
+    today = date.today()
+    requests = {
+        'latest': lambda number: time_request(client, 'get', '/latest/'),
+        'filter': lambda number: time_request(client, 'get', '/filter/', {
+            'transaction_start_date': (today - timedelta(days=365)).isoformat(),
+            'transaction_end_date': today.isoformat()}),
+        'transaction_statistics': lambda number: time_request(client, 'get', '/transaction_statistics/', {
+            'transaction_start_date': (today - timedelta(days=365)).isoformat(),
+            'transaction_end_date': today.isoformat()}),
+        'add_transaction': lambda number: time_request(client, 'post', '/add_transaction/', {
+            'transaction_type': category.category_type, 'transaction_category': category.pk,
+            'transaction_date': today.isoformat(), 'transaction_sum': '12.34',
+            'transaction_comment': BENCHMARK_COMMENT}, 302),
+        'del_transaction': lambda number: time_request(
+            client, 'post', f'/del_transaction/{added[number]}', expected_status=302),
+    }
+    results = []
+    added = []
+    for view in views:
+        if view == 'del_transaction':
+            added = list(Transaction.objects.filter(transaction_comment=BENCHMARK_COMMENT).values_list(
+                'pk', flat=True).order_by('pk'))
+            if len(added) < repeat:
+                raise RuntimeError('del_transaction deletes the transactions of add_transaction, time both')
+        durations, queries = zip(*(requests[view](number) for number in range(repeat)))
+        results.append(summarize(view, list(durations), list(queries)))
+    return results
+
+
+def run_benchmarks(sizes: Sequence[int] = BENCHMARK_SIZES, repeat: int = 20, users: int = 1, seed: int = 0,
+                   views: Sequence[str] = BENCHMARK_VIEWS) -> dict:
+    """
+    Function timing the views at each ledger size, in the current database, which should be an empty test database.
+    Each of the users gets size transactions, the first one is benchmarked; the ledgers grow from one size to the
+    next instead of being generated again.
+    :param sizes: The numbers of transactions per account.
+    :type sizes: Sequence[int]
+    :param repeat: The number of requests per view and size.
+    :type repeat: int
+    :param users: The number of users sharing the tables.
+    :type users: int
+    :param seed: The seed of the synthetic ledgers.
+    :type seed: int
+    :param views: The views to time, among BENCHMARK_VIEWS.
+    :type views: Sequence[str]
+    :return: The run metadata and one result per size and view.
+    :rtype: dict
+    """
+    categories = load_categories()
+    accounts = create_accounts(users)
+    client = Client()
+    client.force_login(accounts[0].account_owner)
+    expense = next(category for category in categories if category.category_type == 0)
+    results = []
+    generated = 0
+    for size in sorted(sizes):
+        generate_transactions(accounts, size - generated, categories, seed=seed + size)
+        generated = size
+        results.extend({'size': size, **result} for result in benchmark_views(client, expense, repeat, views))
+    return {'meta': {'sizes': sorted(sizes), 'repeat': repeat, 'users': users, 'seed': seed,
+                     'database': connection.vendor, 'django': django.get_version(),
+                     'python': platform.python_version()},
+            'results': results}
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.25) -> List[str]:
+    """
+    Function comparing a run with a baseline run of the same sizes and views.
+    :param baseline: The results of the baseline run.
+    :type baseline: dict
+    :param current: The results of the current run.
+    :type current: dict
+    :param threshold: The allowed relative increase of the median time, e.g. 0.25 for 25 %.
+    :type threshold: float
+    :return: One message per regression: a median time above the threshold or more queries.
+    :rtype: List[str]
+    """
+    previous = {(row['size'], row['view']): row for row in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        base = previous.get((row['size'], row['view']))
+        if base is None:
+            continue
+        if row['median_ms'] > base['median_ms'] * (1 + threshold):
+            regressions.append(f"{row['view']} at {row['size']}: median {row['median_ms']:.2f} ms, was "
+                               f"{base['median_ms']:.2f} ms")
+        if row['queries'] > base['queries']:
+            regressions.append(f"{row['view']} at {row['size']}: {row['queries']} queries, was {base['queries']}")
+    return regressions
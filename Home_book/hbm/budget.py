@@ -0,0 +1,86 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.db.models import Q
+
+from .categories import get_category_name
+from .models import Account, PlanningTransaction, TransactionRollup
+from .recurrence import occurrences
+from .rollups import CENT, month_start, next_month
+
+
+def budget_line(planned: Decimal, actual: Decimal) -> dict:
+    """
+    Function for the planned and actual totals of a budget line with their variance, actual minus planned, and the
+    percentage of the planned total used, None if nothing was planned.
+    """
+    planned, actual = planned.quantize(CENT), actual.quantize(CENT)
+    used = (actual * 100 / planned).quantize(Decimal('0.1')) if planned else None
+    return {'planned': planned, 'actual': actual, 'variance': actual - planned, 'used': used}
+
+
+def budget_report(account: Account, start_month: date, end_month: date,
+                  exclude_categories: Iterable[int] = ()) -> dict:
+    """
+    Function comparing the planned and the real transactions of the account per month and category, and per
+    category over the whole period. The planned totals are read from the plans, each recurring plan counting once per
+    occurrence of the period, and the actual totals from the monthly rollup, which every write path keeps up to date.
+    Both are read with one query each and merged in a single pass, so the cost depends on the number of plans, months
+    and categories, not on the number of transactions.
+    :param account: The account.
+    :type account: Account
+    :param start_month: A day of the first month of the period.
+    :type start_month: date
+    :param end_month: A day of the last month of the period.
+    :type end_month: date
+    :param exclude_categories: The IDs of the categories left out, e.g. the transfers between the accounts.
+    :type exclude_categories: Iterable[int]
+    :return: A dict with 'rows', one dict per month, type and category with the 'month', 'type', 'category_name',
+        'planned', 'actual', 'variance' and 'used' keys, and 'totals', the same per type and category without
+        'month'. Both are sorted by month, type and category name.
+    :rtype: dict
+    """
+    first_day = month_start(start_month)
+    last_day = next_month(month_start(end_month)) - timedelta(days=1)
+    lines = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    # The one-off plans materialized by the scheduler are kept, so they still count as planned.
+    plans = PlanningTransaction.objects.filter(
+        transaction_account_plan=account, transaction_date_plan__lte=last_day).filter(
+        Q(transaction_date_plan__gte=first_day) | ~Q(transaction_recurrence_plan='')).exclude(
+        transaction_category_plan__in=exclude_categories).values_list(
+        'transaction_date_plan', 'transaction_recurrence_plan', 'transaction_rule_plan', 'transaction_type_plan',
+        'transaction_category_plan', 'transaction_sum_plan').order_by()
+    for plan_date, recurrence, rule, transaction_type, category_id, plan_sum in plans.iterator():
+        for day in occurrences(plan_date, recurrence, rule, first_day - timedelta(days=1), last_day):
+            lines[(month_start(day), transaction_type, category_id)][0] += plan_sum
+    rollups = TransactionRollup.objects.filter(
+        rollup_account=account, rollup_planned=False, rollup_month__gte=first_day, rollup_month__lte=last_day,
+        rollup_count__gt=0).exclude(rollup_category__in=exclude_categories).order_by()
+    for month, transaction_type, category_id, actual in rollups.values_list(
+            'rollup_month', 'rollup_type', 'rollup_category', 'rollup_sum'):
+        lines[(month, transaction_type, category_id)][1] += Decimal(actual)
+    rows = []
+    totals = {}
+    for (month, transaction_type, category_id), (planned, actual) in lines.items():
+        name = get_category_name(category_id)
+        rows.append({'month': month, 'type': transaction_type, 'category_name': name,
+                     **budget_line(planned, actual)})
+        total = totals.setdefault((transaction_type, name), [Decimal(0), Decimal(0)])
+        total[0] += rows[-1]['planned']
+        total[1] += rows[-1]['actual']
+    rows.sort(key=lambda line: (line['month'], line['type'], line['category_name']))
+    return {'rows': rows, 'totals': [{'type': transaction_type, 'category_name': name, **budget_line(*total)}
+                                     for (transaction_type, name), total in sorted(totals.items())]}
+
+
+def parse_month(value: Optional[str], default: date) -> date:
+    """
+    Function for the first day of a month given as YYYY-MM, or of the default month if the value is empty.
+    :raises ValueError: If the value is not a month.
+    """
+    if not value:
+        return month_start(default)
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
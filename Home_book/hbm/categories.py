@@ -0,0 +1,159 @@
+import time
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+
+from .models import TransactionCategory
+
+CATEGORY_CACHE_KEY = 'hbm:categories'
+CATEGORY_VERSION_KEY = 'hbm:categories-version'
+TRANSFER_CATEGORY_NAME = 'Transfer'
+
+# Process-local registry of all transaction categories by ID, None until loaded, and the version of the Django cache
+# layer it was loaded under, None without a cache layer.
+_registry: Optional[dict] = None
+_registry_version: Optional[int] = None
+
+
+def _cache():
+    """
+    Function returning the Django cache behind the registry, the default one unless HBM_CATEGORY_CACHE says
+    otherwise, or None if HBM_CATEGORY_CACHE is None.
+    """
+    alias = getattr(settings, 'HBM_CATEGORY_CACHE', 'default')
+    return caches[alias] if alias else None
+
+
+def _shared_version(cache) -> int:
+    """
+    Function for the version of the categories in the Django cache layer, bumped by every change. A missing version
+    starts from the current time, so it never matches a version read before it was evicted.
+    """
+    version = cache.get(CATEGORY_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATEGORY_VERSION_KEY)
+    return version
+
+
+def _load() -> dict:
+    """
+    Function loading the categories from the Django cache layer if configured, otherwise from the database, and
+    recording the version of the cache layer they were loaded under. The version is read first, so the categories
+    are at least as recent as it.
+    """
+    global _registry_version
+    cache = _cache()
+    _registry_version = _shared_version(cache) if cache is not None else None
+    rows = cache.get(CATEGORY_CACHE_KEY) if cache is not None else None
+    if rows is None:
+        rows = list(TransactionCategory.objects.order_by('pk').values_list('pk', 'category_type', 'category_name'))
+        if cache is not None:
+            cache.set(CATEGORY_CACHE_KEY, rows, None)
+    return {pk: TransactionCategory(pk=pk, category_type=category_type, category_name=category_name)
+            for pk, category_type, category_name in rows}
+
+
+def get_categories() -> list:
+    """
+    Function for the list of all transaction categories ordered by ID. Only the first call after start-up or
+    invalidation reads the database.
+    :return: The transaction categories.
+    :rtype: list
+    """
+    global _registry
+    if _registry is None:
+        _registry = _load()
+    return list(_registry.values())
+
+
+def get_category(category_id: int) -> TransactionCategory:
+    """
+    Function for a transaction category by ID. An ID above the highest known one reloads the registry, in case the
+    category was created by another process.
+    :param category_id: The ID of the category.
+    :type category_id: int
+    :return: The transaction category.
+    :rtype: TransactionCategory
+    :raises KeyError: If there is no category with this ID.
+    """
+    global _registry
+    if _registry is None:
+        _registry = _load()
+    if category_id not in _registry and category_id > max(_registry, default=0):
+        _registry = _load()
+    return _registry[category_id]
+
+
+def get_category_name(category_id: int) -> str:
+    """
+    Function for the name of a transaction category by ID, or an empty string for an unknown ID.
+    """
+    try:
+        return get_category(category_id).category_name
+    except KeyError:
+        return ''
+
+
+async def aget_category_name(category_id: int) -> str:
+    """
+    Async version of get_category_name() for async views. Only a registry miss reads the database, in a thread.
+    """
+    if _registry is not None and category_id in _registry:
+        return _registry[category_id].category_name
+    return await sync_to_async(get_category_name)(category_id)
+
+
+def get_transfer_categories() -> Tuple[TransactionCategory, TransactionCategory]:
+    """
+    Function for the expense and the income categories of the transfers between accounts, created on first use.
+    :return: The expense and the income category.
+    :rtype: Tuple[TransactionCategory, TransactionCategory]
+    """
+    categories = {category.category_type: category for category in get_categories()
+                  if category.category_name == TRANSFER_CATEGORY_NAME}
+    for category_type in (0, 1):
+        if category_type not in categories:
+            categories[category_type] = TransactionCategory.objects.create(
+                category_type=category_type, category_name=TRANSFER_CATEGORY_NAME)
+    return categories[0], categories[1]
+
+
+def _invalidate_shared() -> None:
+    """
+    Function removing the categories from the Django cache layer and bumping its version, so the other processes
+    reload their registry at the start of their next request.
+    """
+    cache = _cache()
+    cache.delete(CATEGORY_CACHE_KEY)
+    cache.set(CATEGORY_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_categories(**kwargs) -> None:
+    """
+    Function clearing the registry and the Django cache layer, and clearing the cache layer again once the change is
+    committed, so no process keeps the old categories it may have reloaded into it meanwhile. It is connected to the
+    post_save and post_delete signals of TransactionCategory.
+    """
+    global _registry
+    _registry = None
+    cache = _cache()
+    if cache is not None:
+        cache.delete(CATEGORY_CACHE_KEY)
+        db_transaction.on_commit(_invalidate_shared)
+
+
+def warm_categories(**kwargs) -> None:
+    """
+    Function connected to the request_started signal. It loads the registry ahead of the first request, since
+    Django discourages reading the database while the apps are still being initialized, and reloads it when the
+    version of the Django cache layer shows that another process changed the categories.
+    """
+    global _registry
+    cache = _cache()
+    if _registry is not None and cache is not None and _shared_version(cache) != _registry_version:
+        _registry = None
+    get_categories()
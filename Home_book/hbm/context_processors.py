@@ -0,0 +1,7 @@
+def account(request):
+    """
+    Context processor exposing the lazy request.account and request.accounts set by account_middleware to all
+    templates as user_account and user_accounts, so the balance and the account switcher in the header cost no
+    query of their own.
+    """
+    return {'user_account': getattr(request, 'account', None), 'user_accounts': getattr(request, 'accounts', ())}
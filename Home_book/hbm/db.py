@@ -0,0 +1,23 @@
+from django.conf import settings
+
+# PRAGMAs applied to every new SQLite connection by HBM_SQLITE_PROFILE. The default profile restores the SQLite
+# defaults, so switching back from WAL works too. With WAL, readers do not block the writer nor the writer the
+# readers, and synchronous=NORMAL only syncs at checkpoints, which is still safe against corruption.
+SQLITE_PROFILES = {
+    'default': {'journal_mode': 'delete', 'synchronous': 'full'},
+    'wal': {'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 5000, 'cache_size': -65536,
+            'mmap_size': 268435456, 'temp_store': 'memory'},
+}
+
+
+def apply_sqlite_profile(sender, connection, **kwargs) -> None:
+    """
+    Function connected to the connection_created signal, applying the PRAGMAs of the HBM_SQLITE_PROFILE profile to
+    every new SQLite connection. Other databases are left alone.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = SQLITE_PROFILES[getattr(settings, 'HBM_SQLITE_PROFILE', 'default')]
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+from django.utils import timezone
+
+from .models import Account, PlanningTransaction
+from .recurrence import occurrences
+
+FORECAST_DAYS = 365
+MAX_FORECAST_DAYS = 3660
+
+
+def plan_changes(account: Account, start: date, end: date) -> Tuple[defaultdict, defaultdict]:
+    """
+    Function for the net change of the balance per day planned between start and end, with the occurrences of the
+    recurring plans. The occurrences due before start that the scheduler has not materialized yet are counted on
+    start, as they are not in the balance yet. Daily plans are not expanded: they add to the daily rate from their
+    first day on.
+    :param account: The account.
+    :type account: Account
+    :param start: The first day of the forecast.
+    :type start: date
+    :param end: The last day of the forecast.
+    :type end: date
+    :return: The net change by day and the change of the daily rate by day.
+    :rtype: Tuple[defaultdict, defaultdict]
+    """
+    changes = defaultdict(Decimal)
+    rates = defaultdict(Decimal)
+    plans = PlanningTransaction.objects.filter(
+        transaction_account_plan=account, transaction_date_plan__lte=end).values_list(
+        'transaction_date_plan', 'transaction_recurrence_plan', 'transaction_rule_plan', 'transaction_type_plan',
+        'transaction_sum_plan', 'transaction_materialized_plan').order_by('transaction_date_plan', 'pk')
+    for plan_date, recurrence, rule, transaction_type, plan_sum, materialized in plans.iterator():
+        amount = plan_sum if transaction_type == 1 else -plan_sum
+        after = materialized or plan_date - timedelta(days=1)
+        if recurrence == 'daily':
+            first = max(plan_date, after + timedelta(days=1))
+            if first < start:
+                changes[start] += amount * (start - first).days
+            if first <= end:
+                rates[max(first, start)] += amount
+            continue
+        for day in occurrences(plan_date, recurrence, rule, after, end):
+            changes[max(day, start)] += amount
+    return changes, rates
+
+
+def forecast(account: Account, end: date, start: Optional[date] = None) -> List[dict]:
+    """
+    Function projecting the balance of the account day by day from its current balance and its plans. The plans are
+    read with one ordered query and the balance is the running sum of the daily changes, so the cost grows with the
+    number of days and occurrences and not with queries.
+    :param account: The account.
+    :type account: Account
+    :param end: The last day of the forecast.
+    :type end: date
+    :param start: The first day of the forecast, today by default.
+    :type start: Optional[date]
+    :return: One dict per day with the date, the planned change and the projected balance at the end of the day.
+    :rtype: List[dict]
+    """
+    start = start or timezone.localdate()
+    changes, rates = plan_changes(account, start, end)
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    daily_rates = accumulate(rates.get(day, Decimal(0)) for day in days)
+    daily = [changes.get(day, Decimal(0)) + rate for day, rate in zip(days, daily_rates)]
+    balances = accumulate(daily, initial=account.account_balance)
+    next(balances)
+    return [{'date': day, 'change': change, 'balance': balance}
+            for day, change, balance in zip(days, daily, balances)]
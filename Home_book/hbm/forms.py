@@ -1,7 +1,9 @@
 from datetime import date
+from decimal import Decimal
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Transaction, PlanningTransaction
+from .categories import get_categories, get_category
+from .models import Account, Transaction, PlanningTransaction, TransactionCategory
 from django.forms import DateInput
 
 
@@ -21,19 +23,72 @@ def validate_not_past_date(value: date) -> None:
         raise ValidationError({'transaction_date_plan': [f'{value} is in the past']})
 
 
+def validate_recurrence(recurrence: str, rule: str) -> None:
+    """
+    Function for throwing an error if a cron plan has no rule or another plan has one
+    """
+    if recurrence == 'cron' and not rule:
+        raise ValidationError({'transaction_rule_plan': ['A cron plan needs a rule']})
+    if recurrence != 'cron' and rule:
+        raise ValidationError({'transaction_rule_plan': ['Only cron plans have a rule']})
+
+
+class CategoryChoiceIterator(forms.models.ModelChoiceIterator):
+    """
+    Choice iterator that reads the categories from the category registry instead of the field queryset.
+    """
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield "", self.field.empty_label
+        for category in get_categories():
+            yield self.choice(category)
+
+    def __len__(self):
+        return len(get_categories()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(get_categories())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    """
+    Category choice field that reads its choices and cleaned values from the category registry instead of querying
+    the database.
+    """
+    iterator = CategoryChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return get_category(int(value))
+        except (KeyError, ValueError, TypeError):
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+                                  params={'value': value})
+
+
 class TransactionForm(forms.ModelForm):
     class Meta:
         model = Transaction
         fields = (
             'transaction_type', 'transaction_category', 'transaction_date', 'transaction_sum', 'transaction_comment')
         widgets = {'transaction_date': DateInput(attrs={'type': 'date'}), }
+        field_classes = {'transaction_category': CategoryChoiceField}
 
     def clean(self):
         """
         clean() override for custom validators call
         """
         super().clean()
-        validate_not_future_date(self.cleaned_data.get('transaction_date'))
+        self.validate_values(self.cleaned_data)
+
+    @staticmethod
+    def validate_values(values: dict) -> None:
+        """
+        Method for the validation across fields, shared with the bulk validation of imported rows
+        """
+        validate_not_future_date(values.get('transaction_date'))
 
 
 class PlanningTransactionForm(forms.ModelForm):
@@ -41,12 +96,68 @@ class PlanningTransactionForm(forms.ModelForm):
         model = PlanningTransaction
         fields = (
             'transaction_type_plan', 'transaction_category_plan', 'transaction_date_plan', 'transaction_sum_plan',
-            'transaction_comment_plan')
+            'transaction_comment_plan', 'transaction_recurrence_plan', 'transaction_rule_plan')
         widgets = {'transaction_date_plan': DateInput(attrs={'type': 'date'}), }
+        field_classes = {'transaction_category_plan': CategoryChoiceField}
+
+    def clean(self):
+        """
+        clean() override for custom validators call
+        """
+        super().clean()
+        self.validate_values(self.cleaned_data)
+
+    @staticmethod
+    def validate_values(values: dict) -> None:
+        """
+        Method for the validation across fields, shared with the bulk validation of imported rows
+        """
+        validate_not_past_date(values.get('transaction_date_plan'))
+        validate_recurrence(values.get('transaction_recurrence_plan'), values.get('transaction_rule_plan'))
+
+
+class ImportTransactionsForm(forms.Form):
+    import_format_choices = [('csv', 'CSV'), ('ofx', 'OFX')]
+    import_file = forms.FileField()
+    import_format = forms.ChoiceField(choices=import_format_choices)
+    import_category = CategoryChoiceField(queryset=TransactionCategory.objects.all(), required=False,
+                                          help_text='Category of the OFX transactions, which have none')
+    import_in_background = forms.BooleanField(required=False, label='Import in the background',
+                                              help_text='For large files: follow the import on the jobs page')
+
+    def clean(self):
+        """
+        clean() override to require the category of OFX transactions
+        """
+        super().clean()
+        if self.cleaned_data.get('import_format') == 'ofx' and not self.cleaned_data.get('import_category'):
+            raise ValidationError({'import_category': ['OFX transactions need a category']})
+
+
+class AccountForm(forms.ModelForm):
+    class Meta:
+        model = Account
+        fields = ('account_name', 'account_number')
+        labels = {'account_name': 'Name', 'account_number': 'Number'}
+
+
+class TransferForm(forms.Form):
+    transfer_account = forms.TypedChoiceField(coerce=int, label='To account')
+    transaction_date = forms.DateField(widget=DateInput(attrs={'type': 'date'}), initial=date.today)
+    transaction_sum = forms.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    transaction_comment = forms.CharField(max_length=255, required=False)
+
+    def __init__(self, *args, accounts=(), **kwargs):
+        """
+        __init__() override offering the other accounts of the user, given as a list so no query is needed
+        """
+        super().__init__(*args, **kwargs)
+        self.fields['transfer_account'].choices = [(account.pk, account.account_label) for account in accounts]
 
     def clean(self):
         """
         clean() override for custom validators call
         """
         super().clean()
-        validate_not_past_date(self.cleaned_data.get('transaction_date_plan'))
+        if self.cleaned_data.get('transaction_date'):
+            validate_not_future_date(self.cleaned_data['transaction_date'])
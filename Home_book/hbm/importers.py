@@ -0,0 +1,143 @@
+import csv
+import re
+from datetime import date
+from itertools import islice
+from typing import Iterable, Iterator, TextIO, Optional, Type
+
+from django.core.exceptions import ValidationError
+from django.db.models import Model
+from django.forms import ModelForm
+
+from .categories import get_categories
+from .forms import TransactionForm
+from .ledger import save_batch
+from .models import Account
+from .rollups import LEDGER_FIELDS
+
+IMPORT_BATCH_SIZE = 5000
+MAX_IMPORT_ERRORS = 100
+
+OFX_TRANSACTION_RE = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.S | re.I)
+OFX_TAG_RE = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def parse_csv(file: TextIO) -> Iterator[dict]:
+    """
+    Generator reading transactions from a CSV file with a header row of TransactionForm field names:
+    transaction_date, transaction_type, transaction_category, transaction_sum and transaction_comment.
+    The type may be given as Expense/Income or 0/1, the category by name or ID.
+    :param file: The CSV file opened in text mode.
+    :type file: TextIO
+    :return: One dict of raw values per row.
+    :rtype: Iterator[dict]
+    """
+    yield from csv.DictReader(file)
+
+
+def parse_ofx(file: TextIO, default_category: Optional[int] = None) -> Iterator[dict]:
+    """
+    Generator reading the STMTTRN entries of an OFX statement, one entry at a time. The type is taken from the sign
+    of TRNAMT and the comment from NAME and MEMO; OFX has no categories, so every row gets the default category.
+    :param file: The OFX file opened in text mode.
+    :type file: TextIO
+    :param default_category: The ID of the category of the imported transactions.
+    :type default_category: Optional[int]
+    :return: One dict of raw values per transaction.
+    :rtype: Iterator[dict]
+    """
+    buffer = ''
+    for line in file:
+        buffer += line
+        if '</STMTTRN>' not in line.upper():
+            continue
+        end = 0
+        for match in OFX_TRANSACTION_RE.finditer(buffer):
+            tags = {tag.upper(): value.strip() for tag, value in OFX_TAG_RE.findall(match.group(1))}
+            amount = tags.get('TRNAMT', '')
+            comment = ' '.join(value for value in (tags.get('NAME'), tags.get('MEMO')) if value)
+            posted = tags.get('DTPOSTED', '')
+            yield {'transaction_date': f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}',
+                   'transaction_type': 0 if amount.startswith('-') else 1,
+                   'transaction_category': default_category,
+                   'transaction_sum': amount.lstrip('+-'),
+                   'transaction_comment': comment[:255]}
+            end = match.end()
+        buffer = buffer[end:]
+
+
+def clean_rows(rows: Iterable[dict], errors: list, form_class: Type[ModelForm] = TransactionForm) -> Iterator[Model]:
+    """
+    Generator validating raw rows with the field rules of the form, the model field validators and the validation
+    across fields of the form. Invalid rows are skipped and reported in errors. The category is checked against the
+    category registry, so no row costs a query.
+    :param rows: The raw rows, keyed by the form field names.
+    :type rows: Iterable[dict]
+    :param errors: The list the error messages are appended to.
+    :type errors: list
+    :param form_class: TransactionForm or PlanningTransactionForm.
+    :type form_class: Type[ModelForm]
+    :return: Unsaved transactions or planned transactions without an account.
+    :rtype: Iterator[Model]
+    """
+    fields = form_class.base_fields
+    model = form_class._meta.model
+    ledger_fields = next(names for names in LEDGER_FIELDS.values() if names['model'] is model)
+    type_name, category_name, date_name = ledger_fields['type'], ledger_fields['category'], ledger_fields['date']
+    other_names = [name for name in form_class._meta.fields if name not in (type_name, category_name, date_name)]
+    types = {'expense': 0, 'income': 1}
+    category_ids = {category.category_name.lower(): category.pk for category in get_categories()}
+    model_validators = [(field.name, field.run_validators) for field in model._meta.concrete_fields
+                        if field.name in fields and field.validators]
+    for line, row in enumerate(rows, start=1):
+        try:
+            raw_type = str(row.get(type_name, '')).strip()
+            raw_category = str(row.get(category_name) or '').strip()
+            raw_date = str(row.get(date_name, '')).strip()
+            try:
+                # ISO dates skip the slower, locale-aware form field parsing.
+                raw_date = date.fromisoformat(raw_date)
+            except ValueError:
+                pass
+            values = {
+                type_name: fields[type_name].clean(types.get(raw_type.lower(), raw_type)),
+                category_name: fields[category_name].clean(category_ids.get(raw_category.lower(), raw_category)),
+                date_name: fields[date_name].clean(raw_date),
+            }
+            for name in other_names:
+                values[name] = fields[name].clean(row.get(name))
+            # The model field validators, such as the minimum sum, run in Model.full_clean() for a form.
+            for name, run_validators in model_validators:
+                run_validators(values[name])
+            form_class.validate_values(values)
+        except ValidationError as error:
+            errors.append(f"Line {line}: {'; '.join(error.messages)}")
+            continue
+        yield model(**values)
+
+
+def import_transactions(account: Account, rows: Iterable[dict], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Function importing raw rows into an account. Rows are validated and inserted batch by batch, so memory does not
+    depend on the size of the import.
+    :param account: The account to import into.
+    :type account: Account
+    :param rows: The raw rows, e.g. from parse_csv() or parse_ofx().
+    :type rows: Iterable[dict]
+    :param batch_size: The number of transactions inserted per batch.
+    :type batch_size: int
+    :return: A dict with the number of imported transactions, the number of invalid rows and the first
+             MAX_IMPORT_ERRORS error messages.
+    :rtype: dict
+    """
+    errors = []
+    error_count = 0
+    imported = 0
+    transactions = clean_rows(rows, errors)
+    while batch := list(islice(transactions, batch_size)):
+        save_batch(account, batch)
+        imported += len(batch)
+        # Only the first MAX_IMPORT_ERRORS messages are kept, the rest are just counted.
+        error_count += len(errors) - min(error_count, MAX_IMPORT_ERRORS)
+        del errors[MAX_IMPORT_ERRORS:]
+    error_count += len(errors) - min(error_count, MAX_IMPORT_ERRORS)
+    return {'imported': imported, 'error_count': error_count, 'errors': errors[:MAX_IMPORT_ERRORS]}
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+from typing import List, Optional
+
+import django
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, close_old_connections, connection, connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Account, Job
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+MAX_JOB_ATTEMPTS = 3
+JOB_POLL_SECONDS = 1.0
+JOB_HEARTBEAT_SECONDS = 60
+JOB_STALE_SECONDS = 600
+# The kinds of jobs that are failed rather than run again when their worker stops: an import commits batch by batch,
+# so running it again would import its first batches twice.
+NON_RETRYABLE_JOB_KINDS = ('import',)
+
+# The functions running each kind of job, in hbm.tasks. They take the job and return its JSON result; an exception
+# fails the job. They are imported by path, as the tasks use the views and the views enqueue jobs.
+JOB_TASKS = {
+    'statistics': 'hbm.tasks.statistics_job',
+    'export': 'hbm.tasks.export_job',
+    'import': 'hbm.tasks.import_job',
+    'reconcile': 'hbm.tasks.reconcile_job',
+}
+
+
+def job_storage() -> FileSystemStorage:
+    """
+    Function for the storage of the files of the jobs, the uploads to import and the exports, in HBM_JOB_FILES_DIR.
+    """
+    return FileSystemStorage(location=settings.HBM_JOB_FILES_DIR)
+
+
+def enqueue_job(owner, kind: str, account: Optional[Account] = None, params: Optional[dict] = None) -> Job:
+    """
+    Function adding a job to the queue, to be run by a run_jobs worker.
+    :param owner: The user who can read the job.
+    :type owner: User
+    :param kind: The kind of the job, a key of JOB_TASKS.
+    :type kind: str
+    :param account: The account the job works on, if any.
+    :type account: Optional[Account]
+    :param params: The parameters of the task.
+    :type params: Optional[dict]
+    :return: The queued job.
+    :rtype: Job
+    :raises ValueError: If the kind is unknown.
+    """
+    if kind not in JOB_TASKS:
+        raise ValueError(f'Unknown job kind {kind}')
+    return Job.objects.create(job_owner=owner, job_account=account, job_kind=kind, job_params=params or {})
+
+
+def claim_jobs(limit: int) -> List[int]:
+    """
+    Function claiming up to limit queued jobs, oldest first. Each job is claimed by a conditional UPDATE, so several
+    workers can share the queue, on SQLite as well, and a job is never run twice at the same time.
+    :param limit: The maximum number of jobs to claim.
+    :type limit: int
+    :return: The IDs of the claimed jobs.
+    :rtype: List[int]
+    """
+    claimed = []
+    for pk in Job.objects.filter(job_status=JOB_QUEUED).order_by('pk').values_list('pk', flat=True)[:limit]:
+        now = timezone.now()
+        if Job.objects.filter(pk=pk, job_status=JOB_QUEUED).update(
+                job_status=JOB_RUNNING, job_started=now, job_updated=now, job_attempts=F('job_attempts') + 1):
+            claimed.append(pk)
+    return claimed
+
+
+def touch_job(job_id: int) -> None:
+    """
+    Function recording that the worker of a running job is alive, so the job is not taken for stale.
+    """
+    Job.objects.filter(pk=job_id, job_status=JOB_RUNNING).update(job_updated=timezone.now())
+
+
+def _heartbeat(job_id: int, stop: threading.Event, interval: float) -> None:
+    """
+    Function touching a job every interval seconds until stop is set, run in a thread with its own connection while
+    the job runs.
+    """
+    try:
+        while not stop.wait(interval):
+            try:
+                touch_job(job_id)
+            except DatabaseError:
+                # E.g. SQLite locked by a write of the job; the next beat tries again.
+                logger.warning('Heartbeat of job %s failed', job_id, exc_info=True)
+    finally:
+        connection.close()
+
+
+def run_job(job_id: int) -> str:
+    """
+    Function running a claimed job and storing its result or its error. The job is touched every
+    JOB_HEARTBEAT_SECONDS while it runs, so a long job is not requeued by requeue_stale_jobs().
+    :param job_id: The ID of the job.
+    :type job_id: int
+    :return: The final status of the job.
+    :rtype: str
+    """
+    job = Job.objects.select_related('job_account').get(pk=job_id)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job_id, stop, JOB_HEARTBEAT_SECONDS), daemon=True)
+    heartbeat.start()
+    try:
+        result = import_string(JOB_TASKS[job.job_kind])(job)
+    except Exception as error:
+        logger.exception('Job %s (%s) failed', job_id, job.job_kind)
+        Job.objects.filter(pk=job_id).update(job_status=JOB_FAILED, job_error=f'{type(error).__name__}: {error}',
+                                             job_finished=timezone.now())
+        return JOB_FAILED
+    finally:
+        stop.set()
+        heartbeat.join()
+    # Saved through the model so the result is encoded by the field, like job_params.
+    job.job_status, job.job_result, job.job_finished = JOB_DONE, result, timezone.now()
+    job.save(update_fields=['job_status', 'job_result', 'job_finished'])
+    return JOB_DONE
+
+
+def run_job_in_process(job_id: int) -> str:
+    """
+    Function running a job in a pool process, whose connections are checked around each job like around a request.
+    """
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def requeue_stale_jobs(stale_seconds: float = JOB_STALE_SECONDS) -> int:
+    """
+    Function putting back in the queue the running jobs not touched for stale_seconds, whose worker presumably died,
+    or failing them after MAX_JOB_ATTEMPTS attempts or if their kind is in NON_RETRYABLE_JOB_KINDS.
+    :param stale_seconds: The number of seconds without heartbeat after which a running job is stale.
+    :type stale_seconds: float
+    :return: The number of requeued or failed jobs.
+    :rtype: int
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(job_status=JOB_RUNNING, job_updated__lt=now - timedelta(seconds=stale_seconds))
+    failed = stale.filter(job_kind__in=NON_RETRYABLE_JOB_KINDS).update(
+        job_status=JOB_FAILED, job_error='Timed out; the job may have partly run and is not retried', job_finished=now)
+    failed += stale.filter(job_attempts__gte=MAX_JOB_ATTEMPTS).update(
+        job_status=JOB_FAILED, job_error='Timed out', job_finished=now)
+    return failed + stale.update(job_status=JOB_QUEUED)
+
+
+def run_worker(processes: int, once: bool = False, poll: float = JOB_POLL_SECONDS,
+               stale_seconds: float = JOB_STALE_SECONDS) -> dict:
+    """
+    Function running the queued jobs on a pool of processes, so slow jobs do not hold web workers. The pool processes
+    are spawned, set up Django and open their own database connections. With no processes, the jobs are run one by
+    one in the current process.
+    :param processes: The number of worker processes, 0 to run the jobs inline.
+    :type processes: int
+    :param once: True to stop once the queue is empty, False to poll it until interrupted.
+    :type once: bool
+    :param poll: The number of seconds between two reads of an empty queue.
+    :type poll: float
+    :param stale_seconds: The number of seconds without heartbeat after which a running job is requeued, see
+        requeue_stale_jobs().
+    :type stale_seconds: float
+    :return: A dict with the number of done and failed jobs.
+    :rtype: dict
+    """
+    counts = {JOB_DONE: 0, JOB_FAILED: 0}
+    if not processes:
+        while True:
+            requeue_stale_jobs(stale_seconds)
+            claimed = claim_jobs(1)
+            if claimed:
+                counts[run_job(claimed[0])] += 1
+            elif once:
+                return counts
+            else:
+                time.sleep(poll)
+
+    # The spawned processes must not share the connections of this one.
+    connections.close_all()
+    running = set()
+    with ProcessPoolExecutor(processes, mp_context=get_context('spawn'), initializer=django.setup) as pool:
+        while True:
+            requeue_stale_jobs(stale_seconds)
+            running |= {pool.submit(run_job_in_process, pk) for pk in claim_jobs(processes - len(running))}
+            if not running:
+                if once:
+                    return counts
+                time.sleep(poll)
+                continue
+            done, running = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                counts[future.result()] += 1
+
+
+def job_status(job: Job) -> dict:
+    """
+    Function for the state of a job as returned by the job API.
+    """
+    return {'id': job.pk, 'kind': job.job_kind, 'status': job.job_status, 'result': job.job_result,
+            'error': job.job_error, 'created': job.job_created, 'started': job.job_started,
+            'updated': job.job_updated, 'finished': job.job_finished}
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+
+from django.db import transaction as db_transaction
+from django.db.models import F, Q, QuerySet
+
+from .categories import get_transfer_categories
+from .models import Account, Transaction
+from .rollups import LEDGER_FIELDS, apply_to_rollup
+from .search import index_transactions, unindex_transactions
+
+
+def keyset_query(transactions: QuerySet, cursor: Optional[str], page_size: int, planned: bool = False) -> QuerySet:
+    """
+    Function for the query of one page of transactions ordered from the newest, selected with a (date, id) cursor
+    instead of an offset, so every page costs the same. One row more than the page size is selected, to tell
+    whether there is a next page.
+    :raises ValueError: If the cursor is malformed.
+    """
+    date_field = LEDGER_FIELDS[planned]['date']
+    transactions = transactions.order_by(f'-{date_field}', '-id')
+    if cursor:
+        cursor_date, cursor_id = cursor.split('_')
+        cursor_date = datetime.strptime(cursor_date, '%Y-%m-%d').date()
+        transactions = transactions.filter(Q(**{f'{date_field}__lt': cursor_date}) |
+                                           Q(**{date_field: cursor_date, 'id__lt': int(cursor_id)}))
+    return transactions[:page_size + 1]
+
+
+def split_keyset_page(page: list, page_size: int, planned: bool = False) -> Tuple[list, Optional[str]]:
+    """
+    Function splitting the rows selected by keyset_query() into the page and the cursor of the next page.
+    """
+    if len(page) <= page_size:
+        return page, None
+    date_field = LEDGER_FIELDS[planned]['date']
+    page = page[:page_size]
+    last = page[-1]
+    last_date, last_id = (last[date_field], last['id']) if isinstance(last, dict) else (
+        getattr(last, date_field), last.id)
+    return page, f'{last_date:%Y-%m-%d}_{last_id}'
+
+
+def keyset_page(transactions: QuerySet, cursor: Optional[str], page_size: int,
+                planned: bool = False) -> Tuple[list, Optional[str]]:
+    """
+    Function for one page of transactions ordered from the newest, selected with a (date, id) cursor instead of an
+    offset, so every page costs the same.
+    :param transactions: The filtered transactions, model instances or values() dicts including the ID and the date.
+    :type transactions: QuerySet
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: Optional[str]
+    :param page_size: The number of transactions per page.
+    :type page_size: int
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: The page and the cursor of the next page, or None on the last page.
+    :rtype: Tuple[list, Optional[str]]
+    :raises ValueError: If the cursor is malformed.
+    """
+    page = list(keyset_query(transactions, cursor, page_size, planned))
+    return split_keyset_page(page, page_size, planned)
+
+
+async def akeyset_page(transactions: QuerySet, cursor: Optional[str], page_size: int,
+                       planned: bool = False) -> Tuple[list, Optional[str]]:
+    """
+    Async version of keyset_page() for async views, reading the page with the async ORM.
+    """
+    page = [transaction async for transaction in keyset_query(transactions, cursor, page_size, planned)]
+    return split_keyset_page(page, page_size, planned)
+
+
+def save_batch(account: Account, batch: list, planned: bool = False) -> list:
+    """
+    Function inserting a batch of transactions or planned transactions of one account, see save_transactions().
+    :param account: The account of the transactions.
+    :type account: Account
+    :param batch: Unsaved transactions or planned transactions.
+    :type batch: list
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: The saved transactions.
+    :rtype: list
+    """
+    for transaction in batch:
+        setattr(transaction, LEDGER_FIELDS[planned]['account'], account)
+    return save_transactions(batch, planned)
+
+
+def save_transactions(batch: list, planned: bool = False) -> list:
+    """
+    Function inserting a batch of transactions or planned transactions of any accounts with bulk_create and applying
+    the balance changes, one UPDATE per account, and the rollup changes of the whole batch once, in one atomic block.
+    Planned transactions do not change the balance.
+    :param batch: Unsaved transactions or planned transactions with their account objects set.
+    :type batch: list
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: The saved transactions.
+    :rtype: list
+    """
+    fields = LEDGER_FIELDS[planned]
+    accounts = {}
+    balance_changes = defaultdict(Decimal)
+    rollup_changes = defaultdict(lambda: [Decimal(0), 0])
+    for transaction in batch:
+        account = getattr(transaction, fields['account'])
+        accounts[account.pk] = account
+        transaction_type = getattr(transaction, fields['type'])
+        transaction_sum = getattr(transaction, fields['sum'])
+        balance_changes[account.pk] += transaction_sum if transaction_type == 1 else -transaction_sum
+        change = rollup_changes[(account.pk, getattr(transaction, fields['date']).replace(day=1), transaction_type,
+                                 getattr(transaction, f"{fields['category']}_id"))]
+        change[0] += transaction_sum
+        change[1] += 1
+    with db_transaction.atomic():
+        if not planned:
+            for account_id, balance_change in balance_changes.items():
+                accounts[account_id].add_to_balance(balance_change)
+        saved = fields['model'].objects.bulk_create(batch)
+        for (account_id, month, transaction_type, category_id), (amount, count) in rollup_changes.items():
+            apply_to_rollup(account_id, month, transaction_type, category_id, amount, count, planned=planned)
+        if not planned:
+            # bulk_create() sends no post_save signal, so the transactions are indexed here. The statistics version
+            # was bumped by add_to_balance().
+            index_transactions(saved)
+    return saved
+
+
+def transfer(source: Account, destination: Account, amount: Decimal, transfer_date: date, comment: str = '') -> list:
+    """
+    Function moving money between two accounts as an expense of the source and an income of the destination in the
+    transfer categories, both saved by save_transactions() in one atomic block, so a transfer is never half done.
+    :param source: The account the money leaves.
+    :type source: Account
+    :param destination: The account the money goes to.
+    :type destination: Account
+    :param amount: The transferred sum.
+    :type amount: Decimal
+    :param transfer_date: The date of the transfer.
+    :type transfer_date: date
+    :param comment: The comment of both transactions, by default the name of the other account.
+    :type comment: str
+    :return: The expense and the income transactions.
+    :rtype: list
+    :raises ValueError: If both accounts are the same.
+    """
+    if source.pk == destination.pk:
+        raise ValueError('Cannot transfer to the same account')
+    expense, income = get_transfer_categories()
+    return save_transactions([
+        Transaction(transaction_account=source, transaction_type=0, transaction_category=expense,
+                    transaction_date=transfer_date, transaction_sum=amount,
+                    transaction_comment=comment or f'Transfer to {destination.account_label}'),
+        Transaction(transaction_account=destination, transaction_type=1, transaction_category=income,
+                    transaction_date=transfer_date, transaction_sum=amount,
+                    transaction_comment=comment or f'Transfer from {source.account_label}'),
+    ])
+
+
+def delete_batch(account: Account, ids: Iterable[int], planned: bool = False) -> int:
+    """
+    Function deleting the transactions or planned transactions of the account with the given IDs, applying the
+    balance change and the rollup changes of the whole batch once, in one atomic block. The rows are deleted in bulk,
+    without the per-row post_delete signal, and removed from the search index at once. IDs of other accounts or of
+    already deleted transactions are ignored.
+    :param account: The account of the transactions.
+    :type account: Account
+    :param ids: The IDs of the transactions to delete.
+    :type ids: Iterable[int]
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: The number of deleted transactions.
+    :rtype: int
+    """
+    fields = LEDGER_FIELDS[planned]
+    transactions = fields['model'].objects.filter(**{fields['account']: account}, pk__in=list(ids))
+    with db_transaction.atomic():
+        # The account row is written first, so it (the whole database on SQLite) is locked before the rows are read:
+        # overlapping batches of the account run one after the other, and the later ones only read the rows left.
+        Account.objects.filter(pk=account.pk).update(account_version=F('account_version') + 1)
+        rows = list(transactions.values('pk', fields['type'], fields['category'], fields['date'], fields['sum']))
+        pks = [row['pk'] for row in rows]
+        if fields['model'].objects.filter(pk__in=pks)._raw_delete(transactions.db) != len(rows):
+            db_transaction.set_rollback(True)
+            return 0
+        rollup_changes = defaultdict(lambda: [Decimal(0), 0])
+        net = Decimal(0)
+        for row in rows:
+            change = rollup_changes[(row[fields['date']].replace(day=1), row[fields['type']], row[fields['category']])]
+            change[0] -= row[fields['sum']]
+            change[1] -= 1
+            net += row[fields['sum']] if row[fields['type']] == 1 else -row[fields['sum']]
+        if not planned and rows:
+            account.add_to_balance(-net)
+            unindex_transactions(pks, transactions.db)
+        for (month, transaction_type, category_id), (amount, count) in rollup_changes.items():
+            apply_to_rollup(account.pk, month, transaction_type, category_id, amount, count, planned=planned)
+    return len(rows)
@@ -0,0 +1,97 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from typing import Optional, Sequence
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, OpenerDirector, Request, build_opener
+
+LOAD_TEST_PATHS = ('/', '/latest/', '/filter/', '/transaction_statistics/', '/planned/transactions/')
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """
+    Function for the nearest-rank percentile of the values, e.g. 0.99 for p99.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+def login_session(base_url: str, username: str, password: str) -> OpenerDirector:
+    """
+    Function for an opener with its own cookie jar, logged in through the login form like a browser.
+    :param base_url: The URL of the server, e.g. http://127.0.0.1:8000.
+    :type base_url: str
+    :param username: The username of the test user.
+    :type username: str
+    :param password: The password of the test user.
+    :type password: str
+    :return: The logged-in opener.
+    :rtype: OpenerDirector
+    """
+    cookies = CookieJar()
+    opener = build_opener(HTTPCookieProcessor(cookies))
+    login_url = urljoin(base_url, '/login/')
+    opener.open(login_url).read()
+    csrf_token = next((cookie.value for cookie in cookies if cookie.name == 'csrftoken'), '')
+    data = urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': csrf_token}).encode()
+    opener.open(Request(login_url, data=data, headers={'Referer': login_url})).read()
+    if not any(cookie.name == 'sessionid' for cookie in cookies):
+        raise ValueError(f'Could not log in to {base_url} as {username}')
+    return opener
+
+
+def run_user(base_url: str, username: str, password: str, paths: Sequence[str], requests: int) -> tuple:
+    """
+    Function for one simulated user, logging in and requesting the paths in turn.
+    :return: The latencies in seconds of the successful requests and the number of failed ones.
+    :rtype: tuple
+    """
+    opener = login_session(base_url, username, password)
+    latencies = []
+    failures = 0
+    for number in range(requests):
+        started = time.perf_counter()
+        try:
+            with opener.open(urljoin(base_url, paths[number % len(paths)])) as response:
+                response.read()
+        except (HTTPError, OSError):
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return latencies, failures
+
+
+def run_load_test(base_url: str, username: str, password: str, users: int = 20, requests: int = 50,
+                  paths: Optional[Sequence[str]] = None) -> dict:
+    """
+    Function measuring a running server under concurrent users, each in its own thread with its own session.
+    :param base_url: The URL of the server, e.g. http://127.0.0.1:8000.
+    :type base_url: str
+    :param username: The username of the test user, who must have an account.
+    :type username: str
+    :param password: The password of the test user.
+    :type password: str
+    :param users: The number of concurrent users.
+    :type users: int
+    :param requests: The number of requests per user.
+    :type requests: int
+    :param paths: The paths requested in turn, LOAD_TEST_PATHS by default.
+    :type paths: Optional[Sequence[str]]
+    :return: A dict with the number of requests and failures, the requests per second and the p50 and p99 latency
+             in milliseconds.
+    :rtype: dict
+    """
+    paths = paths or LOAD_TEST_PATHS
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        results = list(executor.map(lambda _: run_user(base_url, username, password, paths, requests),
+                                    range(users)))
+    elapsed = time.perf_counter() - started
+    latencies = [latency for user_latencies, _ in results for latency in user_latencies]
+    return {'requests': len(latencies), 'failures': sum(failures for _, failures in results),
+            'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000}
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from hbm.benchmarks.runner import BENCHMARK_SIZES, BENCHMARK_VIEWS, compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Times the hot views through the test client on synthetic ledgers of several sizes, in a new test "
+            "database like the test runner, and compares the results with a baseline run")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCHMARK_SIZES),
+                            help="Numbers of transactions per account")
+        parser.add_argument("--users", type=int, default=1, help="Number of users, each with a ledger of each size")
+        parser.add_argument("--repeat", type=int, default=20, help="Number of requests per view and size")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--view", action="append", dest="views", choices=BENCHMARK_VIEWS,
+                            help="View to time, may be repeated; by default all of them")
+        parser.add_argument("--output", help="File to save the results to as JSON")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Allowed relative increase of the median time, 0.25 by default")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 2:
+            raise CommandError("--repeat must be at least 2")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            result = run_benchmarks(options["sizes"], options["repeat"], options["users"], options["seed"],
+                                    options["views"] or BENCHMARK_VIEWS)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for row in result["results"]:
+            self.stdout.write(f"{row['view']:24} {row['size']:>9} first {row['first_ms']:8.2f} ms, "
+                              f"median {row['median_ms']:8.2f} ms, p95 {row['p95_ms']:8.2f} ms, "
+                              f"{row['queries']} queries")
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(result, file, indent=2)
+        if baseline is not None:
+            regressions = compare_results(baseline, result, options["threshold"])
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from hbm.benchmarks.analytics import analytics_benchmark
+from hbm.benchmarks.generator import create_accounts, generate_transactions, load_categories
+from hbm.snapshot import np
+
+
+class Command(BaseCommand):
+    help = ("Compares the date range and category sums of the ORM, the rollups and the NumPy ledger snapshot on a "
+            "synthetic ledger in a new test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=100000, help="Number of transactions of the ledger")
+        parser.add_argument("--slices", type=int, default=200, help="Number of random slices per engine")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("NumPy is not installed")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            categories = load_categories()
+            account = create_accounts(1)[0]
+            generate_transactions([account], options["size"], categories, options["seed"])
+            results = analytics_benchmark(account, categories, options["slices"], seed=options["seed"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        for result in results:
+            line = (f"{result['engine']:8} median {result['median_ms']:8.3f} ms, p95 {result['p95_ms']:8.3f} ms, "
+                    f"{result['queries']} queries")
+            if "load_ms" in result:
+                line += (f" (loaded {result['rows']} rows in {result['load_ms']:.0f} ms, "
+                         f"{result['bytes'] / 1024:.0f} KiB)")
+            self.stdout.write(line)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from hbm.benchmarks.concurrency import read_write_benchmark
+from hbm.benchmarks.generator import create_accounts, generate_transactions, load_categories
+from hbm.db import SQLITE_PROFILES
+
+
+class Command(BaseCommand):
+    help = ("Compares the read throughput of the pages during concurrent writes with each SQLite profile, on a "
+            "synthetic ledger in a new test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=10000, help="Number of transactions of the ledger")
+        parser.add_argument("--readers", type=int, default=4, help="Number of reading threads")
+        parser.add_argument("--writers", type=int, default=2, help="Number of writing threads")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per profile")
+        parser.add_argument("--profile", action="append", dest="profiles", choices=list(SQLITE_PROFILES),
+                            help="Profile to run, may be repeated; by default all of them")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The database is not SQLite")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            categories = load_categories()
+            account = create_accounts(1)[0]
+            generate_transactions([account], options["size"], categories)
+            category = next(category for category in categories if category.category_type == 0)
+            results = [read_write_benchmark(account, category, profile, options["readers"], options["writers"],
+                                            options["duration"])
+                       for profile in options["profiles"] or SQLITE_PROFILES]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        for result in results:
+            self.stdout.write(
+                f"{result['profile']:8} ({result['journal_mode']}) {result['reads_per_second']:8.1f} reads/s, "
+                f"{result['writes_per_second']:7.1f} writes/s, {result['failures']} failed, "
+                f"read p50 {result['read_p50_ms']:.1f} ms, p99 {result['read_p99_ms']:.1f} ms")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hbm.categories import get_categories
+from hbm.importers import IMPORT_BATCH_SIZE, import_transactions, parse_csv, parse_ofx
+from hbm.models import Account
+
+
+class Command(BaseCommand):
+    help = "Imports transactions into an account from a CSV or OFX file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("account", type=int, help="ID of the account to import into")
+        parser.add_argument("path", help="Path of the CSV or OFX file")
+        parser.add_argument("--format", choices=["csv", "ofx"], help="File format, by default from the extension")
+        parser.add_argument("--category", default="other",
+                            help="Category name of the OFX transactions, which have no category")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(pk=options["account"])
+        except Account.DoesNotExist:
+            raise CommandError(f"Account {options['account']} does not exist")
+        file_format = options["format"] or ("ofx" if options["path"].lower().endswith(".ofx") else "csv")
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as file:
+            if file_format == "ofx":
+                category = next((c for c in get_categories() if c.category_name == options["category"]), None)
+                if category is None:
+                    raise CommandError(f"Category {options['category']} does not exist")
+                rows = parse_ofx(file, category.pk)
+            else:
+                rows = parse_csv(file)
+            result = import_transactions(account, rows, options["batch_size"])
+
+        for error in result["errors"]:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']} transactions, skipped {result['error_count']} invalid rows"))
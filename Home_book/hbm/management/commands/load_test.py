@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hbm.load_test import LOAD_TEST_PATHS, run_load_test
+
+
+class Command(BaseCommand):
+    help = ("Compares requests per second and p99 latency of running WSGI and ASGI servers under concurrent users, "
+            "e.g. 'gunicorn -w 4 Home_book.wsgi' and 'HBM_ASYNC_VIEWS=1 uvicorn Home_book.asgi:application' "
+            "on the same database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", help="URL of the WSGI server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--asgi-url", help="URL of the ASGI server, e.g. http://127.0.0.1:8001")
+        parser.add_argument("--username", required=True, help="Test user with an account")
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--users", type=int, default=20, help="Number of concurrent users")
+        parser.add_argument("--requests", type=int, default=50, help="Number of requests per user")
+        parser.add_argument("--path", action="append", dest="paths",
+                            help=f"Path to request, may be repeated; by default {', '.join(LOAD_TEST_PATHS)}")
+
+    def handle(self, *args, **options):
+        servers = [(name, options[f"{name}_url"]) for name in ("wsgi", "asgi") if options[f"{name}_url"]]
+        if not servers:
+            raise CommandError("Give --wsgi-url, --asgi-url or both")
+        for name, url in servers:
+            try:
+                result = run_load_test(url, options["username"], options["password"], options["users"],
+                                       options["requests"], options["paths"])
+            except (ValueError, OSError) as error:
+                raise CommandError(f"{name.upper()} server at {url}: {error}")
+            self.stdout.write(
+                f"{name.upper():5} {result['requests']} requests, {result['failures']} failed, "
+                f"{result['requests_per_second']:.1f} req/s, p50 {result['p50_ms']:.1f} ms, "
+                f"p99 {result['p99_ms']:.1f} ms")
@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hbm.scheduler import MATERIALIZE_BATCH_SIZE, materialize_plans
+
+
+class Command(BaseCommand):
+    help = "Turns the due planned transactions of all accounts into transactions; safe to rerun"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Last day to materialize as YYYY-MM-DD, today by default")
+        parser.add_argument("--batch-size", type=int, default=MATERIALIZE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options["date"]) if options["date"] else None
+        except ValueError:
+            raise CommandError(f"Invalid date {options['date']}")
+        result = materialize_plans(today, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Materialized {result['plans']} plans into {result['transactions']} transactions"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from hbm.models import Account
+from hbm.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the monthly transaction rollup from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", type=int, help="Rebuild only the account with this ID")
+
+    def handle(self, *args, **options):
+        account = None
+        if options["account"] is not None:
+            account = Account.objects.get(pk=options["account"])
+        created = rebuild_rollups(account)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} rollup rows"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from hbm.models import Account
+from hbm.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of the transaction comments from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", type=int, help="Rebuild only the account with this ID")
+
+    def handle(self, *args, **options):
+        account = None
+        if options["account"] is not None:
+            account = Account.objects.get(pk=options["account"])
+        indexed = rebuild_search_index(account)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} transactions"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from hbm.reconciliation import RECONCILE_BATCH_SIZE, reconcile_balances
+
+
+class Command(BaseCommand):
+    help = "Recomputes the account balances from the transactions and reports or fixes the drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Set the drifted balances to the ledger balances")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Check only the accounts with transactions added since the last run")
+        parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = reconcile_balances(options["fix"], options["incremental"], options["batch_size"])
+        for row in result["drift"]:
+            self.stdout.write(f"Account {row['account']}: balance {row['balance']}, ledger {row['ledger_balance']}, "
+                              f"drift {row['drift']}")
+        summary = (f"Checked {result['checked']} accounts, {len(result['drift'])} drifted, {result['fixed']} fixed, "
+                   f"watermark {result['watermark']}")
+        self.stdout.write(self.style.SUCCESS(summary) if not result["drift"] or result["fixed"]
+                          else self.style.WARNING(summary))
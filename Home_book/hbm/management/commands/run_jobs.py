@@ -0,0 +1,29 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hbm.jobs import JOB_DONE, JOB_FAILED, JOB_POLL_SECONDS, JOB_STALE_SECONDS, run_worker
+
+
+class Command(BaseCommand):
+    help = ("Runs the queued background jobs on a pool of processes, polling the job table of the database until "
+            "interrupted")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                            help="Number of worker processes, 0 to run the jobs in this process; one per CPU by default")
+        parser.add_argument("--once", action="store_true", help="Stop once the queue is empty")
+        parser.add_argument("--poll", type=float, default=JOB_POLL_SECONDS,
+                            help="Seconds between two reads of an empty queue")
+        parser.add_argument("--stale-after", type=float, default=JOB_STALE_SECONDS,
+                            help="Seconds without heartbeat after which a running job is requeued, as its worker "
+                                 "presumably died")
+
+    def handle(self, *args, **options):
+        if options["processes"] < 0:
+            raise CommandError("--processes must not be negative")
+        try:
+            counts = run_worker(options["processes"], options["once"], options["poll"], options["stale_after"])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"Ran {counts[JOB_DONE]} jobs, {counts[JOB_FAILED]} failed"))
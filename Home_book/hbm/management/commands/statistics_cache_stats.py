@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from hbm.statistics_cache import get_statistics_cache_counters
+
+
+class Command(BaseCommand):
+    help = "Shows the hit and miss counters of the transaction statistics cache"
+
+    def handle(self, *args, **options):
+        counters = get_statistics_cache_counters()
+        total = counters["hits"] + counters["misses"]
+        hit_rate = counters["hits"] / total if total else 0
+        self.stdout.write(f"Hits: {counters['hits']}; Misses: {counters['misses']}; Hit rate: {hit_rate:.1%}")
@@ -0,0 +1,33 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+
+from .accounts import SESSION_ACCOUNT_KEY, get_user_accounts, select_account
+
+
+def set_request_accounts(request) -> None:
+    """
+    Function setting request.accounts to the accounts of the user and request.account to the one selected with the
+    account switcher, or None, both resolved lazily from a single query.
+    """
+    request.accounts = SimpleLazyObject(lambda: get_user_accounts(request.user))
+    request.account = SimpleLazyObject(
+        lambda: select_account(request.accounts, request.session.get(SESSION_ACCOUNT_KEY)))
+
+
+@sync_and_async_middleware
+def account_middleware(get_response):
+    """
+    Middleware setting request.accounts to the accounts of the user and request.account to the selected one, or
+    None, resolved lazily at most once per request and shared by the views and, through the account context
+    processor, the templates. It has to come after SessionMiddleware and AuthenticationMiddleware.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            set_request_accounts(request)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            set_request_accounts(request)
+            return get_response(request)
+    return middleware
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def fill_rollups(apps, schema_editor):
+    TransactionRollup = apps.get_model("hbm", "TransactionRollup")
+    for planned, model_name, suffix in ((False, "Transaction", ""), (True, "PlanningTransaction", "_plan")):
+        model = apps.get_model("hbm", model_name)
+        grouped = model.objects.order_by().annotate(month=TruncMonth(f"transaction_date{suffix}")).values(
+            "month", f"transaction_account{suffix}", f"transaction_type{suffix}",
+            f"transaction_category{suffix}").annotate(total=Sum(f"transaction_sum{suffix}"), count=Count("pk"))
+        TransactionRollup.objects.bulk_create(
+            (TransactionRollup(rollup_account_id=row[f"transaction_account{suffix}"], rollup_planned=planned,
+                               rollup_month=row["month"], rollup_type=row[f"transaction_type{suffix}"],
+                               rollup_category_id=row[f"transaction_category{suffix}"], rollup_sum=row["total"],
+                               rollup_count=row["count"]) for row in grouped.iterator()),
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0007_alter_transaction_transaction_sum_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='transactioncategory',
+            options={'verbose_name_plural': 'Transaction categories'},
+        ),
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rollup_planned', models.BooleanField(default=False)),
+                ('rollup_month', models.DateField()),
+                ('rollup_type', models.IntegerField(choices=[(0, 'Expense'), (1, 'Income')], default=0)),
+                ('rollup_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rollup_count', models.IntegerField(default=0)),
+                ('rollup_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hbm.account')),
+                ('rollup_category', models.ForeignKey(default=0, on_delete=django.db.models.deletion.SET_DEFAULT, to='hbm.transactioncategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rollup_account', 'rollup_planned', 'rollup_month'], name='hbm_transac_rollup__34ffcc_idx')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0009_transaction_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='account',
+            constraint=models.UniqueConstraint(fields=('account_owner',), name='account_owner_unique'),
+        ),
+    ]
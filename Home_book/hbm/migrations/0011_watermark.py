@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0010_account_owner_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watermark_name', models.CharField(max_length=100, unique=True)),
+                ('watermark_value', models.BigIntegerField(default=0)),
+                ('watermark_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import hbm.recurrence
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0011_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planningtransaction',
+            name='transaction_materialized_plan',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='planningtransaction',
+            name='transaction_recurrence_plan',
+            field=models.CharField(blank=True, choices=[('', 'Once'), ('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('yearly', 'Yearly'), ('cron', 'Cron rule')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='planningtransaction',
+            name='transaction_rule_plan',
+            field=models.CharField(blank=True, default='', help_text='Cron rule: day of month, month, day of week, e.g. 1 * *', max_length=100, validators=[hbm.recurrence.validate_cron_rule]),
+        ),
+        migrations.AddIndex(
+            model_name='planningtransaction',
+            index=models.Index(fields=['transaction_date_plan', 'transaction_materialized_plan'], name='planning_due_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        # The account is indexed too, so a search is narrowed to one account inside the index; it is not ranked.
+        schema_editor.execute("CREATE VIRTUAL TABLE hbm_transaction_fts USING fts5(transaction_comment, "
+                              "transaction_account, tokenize = 'unicode61 remove_diacritics 2')")
+        schema_editor.execute("INSERT INTO hbm_transaction_fts(hbm_transaction_fts, rank) "
+                              "VALUES('rank', 'bm25(1.0, 0.0)')")
+        schema_editor.execute("INSERT INTO hbm_transaction_fts(rowid, transaction_comment, transaction_account) "
+                              "SELECT id, transaction_comment, transaction_account_id FROM hbm_transaction")
+    elif vendor == "postgresql":
+        schema_editor.execute("CREATE INDEX transaction_comment_search_idx ON hbm_transaction "
+                              "USING gin (to_tsvector('simple', transaction_comment))")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE hbm_transaction_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX transaction_comment_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0012_planningtransaction_recurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSearch',
+            fields=[
+                ('search_transaction', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='hbm.transaction')),
+                ('search_query', models.TextField(db_column='hbm_transaction_fts')),
+                ('search_rank', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'hbm_transaction_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0013_transactionsearch'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='account',
+            name='account_owner_unique',
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='account_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0014_account_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_kind', models.CharField(max_length=20)),
+                ('job_params', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('job_status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('job_result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('job_error', models.TextField(blank=True, default='')),
+                ('job_attempts', models.IntegerField(default=0)),
+                ('job_created', models.DateTimeField(auto_now_add=True)),
+                ('job_started', models.DateTimeField(blank=True, null=True)),
+                ('job_finished', models.DateTimeField(blank=True, null=True)),
+                ('job_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='hbm.account')),
+                ('job_owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job_status', 'id'], name='job_status_idx'), models.Index(fields=['job_owner', '-id'], name='job_owner_idx')],
+            },
+        ),
+    ]
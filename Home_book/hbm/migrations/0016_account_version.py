@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+import time
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0015_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='account_version',
+            field=models.BigIntegerField(default=time.time_ns, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_job_updated(apps, schema_editor):
+    Job = apps.get_model("hbm", "Job")
+    Job.objects.update(job_updated=F("job_started"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hbm', '0016_account_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='job_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_job_updated, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,52 @@
+import time
 from decimal import Decimal
+from typing import Union
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F
+from django.db.models.expressions import Combinable
 from django.utils import timezone
 
+from .recurrence import RECURRENCE_CHOICES, validate_cron_rule
+
 
 # Create your models here.
 class Account(models.Model):
     account_owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     account_number = models.CharField(max_length=200, null=False, blank=False)
     account_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    account_name = models.CharField(max_length=100, blank=True, default='')
+    # Version of the statistics of the account, bumped in the transaction of every change of its ledger, see
+    # hbm.statistics_cache. It starts from the creation time, so entries cached for a deleted account whose ID is
+    # reused are never read.
+    account_version = models.BigIntegerField(default=time.time_ns, editable=False)
 
     def __str__(self):
-        return f'{self.account_owner}'
+        return f'{self.account_owner}: {self.account_label}'
+
+    @property
+    def account_label(self) -> str:
+        """
+        The name of the account, or its number if it has no name, to tell the accounts of a user apart.
+        """
+        return self.account_name or self.account_number
+
+    def add_to_balance(self, amount: Union[Decimal, Combinable]) -> None:
+        """
+        Method for atomically adding the amount (negative for a withdrawal) to the balance with a single
+        UPDATE ... SET account_balance = account_balance + amount, so concurrent changes are never lost.
+        The amount may also be a query expression. The same UPDATE bumps the statistics version, as the ledger
+        changed. The in-memory account_balance is not refreshed, the cached account of the owner is invalidated after
+        the commit.
+        """
+        from .accounts import invalidate_account
+
+        Account.objects.filter(pk=self.pk).update(account_balance=F('account_balance') + amount,
+                                                  account_version=F('account_version') + 1)
+        invalidate_account(self.account_owner_id)
 
 
 class TransactionCategory(models.Model):
@@ -41,6 +74,15 @@ class Transaction(models.Model):
     def __str__(self):
         return f"Username: {self.transaction_account.account_owner.username}; Type: {self.transaction_type_choices[self.transaction_type][1]}; Sum:{self.transaction_sum}; Date:{self.transaction_date}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction_account', '-transaction_date'], name='transaction_account_date_idx'),
+            models.Index(fields=['transaction_account', 'transaction_type', 'transaction_date'],
+                         name='transaction_acc_type_date_idx'),
+            models.Index(fields=['transaction_account', 'transaction_category', 'transaction_date'],
+                         name='transaction_acc_cat_date_idx'),
+        ]
+
 
 class PlanningTransaction(models.Model):
     transaction_account_plan = models.ForeignKey(Account, on_delete=models.CASCADE)
@@ -51,6 +93,85 @@ class PlanningTransaction(models.Model):
     transaction_sum_plan = models.DecimalField(max_digits=10, decimal_places=2,
                                                validators=[MinValueValidator(Decimal('0.01'))])
     transaction_comment_plan = models.CharField(max_length=255)
+    transaction_recurrence_plan = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='', blank=True)
+    transaction_rule_plan = models.CharField(max_length=100, default='', blank=True, validators=[validate_cron_rule],
+                                             help_text='Cron rule: day of month, month, day of week, e.g. 1 * *')
+    # Watermark of the scheduler: the occurrences up to this date have been turned into transactions.
+    transaction_materialized_plan = models.DateField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"Username: {self.transaction_account_plan.account_owner.username}; Type: {self.transaction_type_choices_plan[self.transaction_type_plan][1]}; Sum:{self.transaction_sum_plan}; Date:{self.transaction_date_plan}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction_account_plan', '-transaction_date_plan'], name='planning_account_date_idx'),
+            models.Index(fields=['transaction_account_plan', 'transaction_type_plan', 'transaction_date_plan'],
+                         name='planning_acc_type_date_idx'),
+            models.Index(fields=['transaction_date_plan', 'transaction_materialized_plan'], name='planning_due_idx'),
+        ]
+
+
+class TransactionSearch(models.Model):
+    # The SQLite FTS5 table indexing the transaction comments, created by migration 0013 and kept in sync by
+    # hbm.search. search_query is the hidden column named after the table, which matches a full-text query with =,
+    # and search_rank its bm25 rank. PostgreSQL searches with a GIN index on hbm_transaction and has no such table.
+    search_transaction = models.OneToOneField(Transaction, on_delete=models.DO_NOTHING, primary_key=True,
+                                              db_column='rowid', related_name='search_entry')
+    search_query = models.TextField(db_column='hbm_transaction_fts')
+    search_rank = models.FloatField(db_column='rank')
+
+    class Meta:
+        managed = False
+        db_table = 'hbm_transaction_fts'
+
+
+class TransactionRollup(models.Model):
+    rollup_account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    rollup_planned = models.BooleanField(default=False)
+    rollup_month = models.DateField()
+    rollup_type_choices = [(0, 'Expense'), (1, 'Income')]
+    rollup_type = models.IntegerField(choices=rollup_type_choices, default=0)
+    rollup_category = models.ForeignKey(TransactionCategory, on_delete=models.SET_DEFAULT, default=0)
+    rollup_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rollup_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Account: {self.rollup_account_id}; Month: {self.rollup_month:%Y-%m}; Type: {self.rollup_type_choices[self.rollup_type][1]}; Sum:{self.rollup_sum}"
+
+    class Meta:
+        indexes = [models.Index(fields=['rollup_account', 'rollup_planned', 'rollup_month'])]
+
+
+class Watermark(models.Model):
+    watermark_name = models.CharField(max_length=100, unique=True)
+    watermark_value = models.BigIntegerField(default=0)
+    watermark_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.watermark_name}: {self.watermark_value}"
+
+
+class Job(models.Model):
+    job_status_choices = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+    job_owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    job_account = models.ForeignKey(Account, on_delete=models.CASCADE, null=True, blank=True)
+    job_kind = models.CharField(max_length=20)
+    job_params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    job_status = models.CharField(max_length=10, choices=job_status_choices, default='queued')
+    job_result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    job_error = models.TextField(blank=True, default='')
+    job_attempts = models.IntegerField(default=0)
+    job_created = models.DateTimeField(auto_now_add=True)
+    job_started = models.DateTimeField(null=True, blank=True)
+    # Heartbeat of the worker running the job, see hbm.jobs.touch_job().
+    job_updated = models.DateTimeField(null=True, blank=True)
+    job_finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.pk}: {self.job_kind}; Status: {self.job_status}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job_status', 'id'], name='job_status_idx'),
+            models.Index(fields=['job_owner', '-id'], name='job_owner_idx'),
+        ]
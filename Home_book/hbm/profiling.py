@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.backends.django import DjangoTemplates
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the buckets of the request duration histogram.
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+PROFILED_MODULES = ('hbm.views', 'hbm.async_views', 'hbm.api')
+
+# The profile of the current request: a dict with the query count, the SQL time and the template render time. It is
+# a context variable, so the queries and templates of an async view run in a thread are counted too.
+current_profile: ContextVar[Optional[dict]] = ContextVar('hbm_profile', default=None)
+
+_lock = threading.Lock()
+_metrics = defaultdict(lambda: {'requests': 0, 'queries': 0, 'sql_seconds': 0.0, 'render_seconds': 0.0,
+                                'response_bytes': 0, 'duration_seconds': 0.0, 'slow_requests': 0,
+                                'buckets': [0] * len(DURATION_BUCKETS)})
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the query and its time to the profile of the current request, if any.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile['queries'] += 1
+        profile['sql_seconds'] += time.perf_counter() - start
+
+
+def install_query_timer(connection, **kwargs) -> None:
+    """
+    Function connected to the connection_created signal, installing time_query() on every new database connection,
+    whichever thread opens it.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class ProfiledTemplate:
+    """
+    Wrapper of a template of the Django backend adding its render time to the profile of the current request.
+    """
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        if profile is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile['render_seconds'] += time.perf_counter() - start
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend with the render time of the top-level templates recorded by the profiling middleware.
+    Included templates are part of the time of the template including them.
+    """
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
+
+
+def view_label(request) -> Optional[str]:
+    """
+    Function for the URL name of the view of the request, or None if it is not a view of this app.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None or getattr(match.func, '__module__', None) not in PROFILED_MODULES or \
+            match.url_name == 'metrics':
+        return None
+    return match.url_name or match.view_name
+
+
+def record(label: str, profile: dict, duration: float, response) -> None:
+    """
+    Function adding a profiled request to the metrics of its view and logging it if it is slower than
+    HBM_SLOW_REQUEST_SECONDS. The size of a streaming response is not known and counted as 0.
+    """
+    size = 0 if response.streaming else len(response.content)
+    threshold = getattr(settings, 'HBM_SLOW_REQUEST_SECONDS', None)
+    slow = threshold is not None and duration > threshold
+    with _lock:
+        metrics = _metrics[label]
+        metrics['requests'] += 1
+        metrics['queries'] += profile['queries']
+        metrics['sql_seconds'] += profile['sql_seconds']
+        metrics['render_seconds'] += profile['render_seconds']
+        metrics['response_bytes'] += size
+        metrics['duration_seconds'] += duration
+        metrics['slow_requests'] += slow
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                metrics['buckets'][index] += 1
+    if slow:
+        logger.warning('Slow request to %s (%s): %.3f s, %d queries, %.3f s SQL, %.3f s render, %d bytes',
+                       label, response.status_code, duration, profile['queries'], profile['sql_seconds'],
+                       profile['render_seconds'], size)
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """
+    Middleware recording, for each view of this app, the query count, the SQL time, the template render time, the
+    response size and the duration of the requests, exposed by the metrics view. Enabled by HBM_PROFILING. The
+    metrics are kept in the process, so each worker reports its own requests.
+    """
+    if not getattr(settings, 'HBM_PROFILING', False):
+        raise MiddlewareNotUsed
+
+    def start():
+        return current_profile.set({'queries': 0, 'sql_seconds': 0.0, 'render_seconds': 0.0}), time.perf_counter()
+
+    def finish(request, response, token, started):
+        duration = time.perf_counter() - started
+        profile = current_profile.get()
+        current_profile.reset(token)
+        label = view_label(request)
+        if label is not None:
+            record(label, profile, duration, response)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token, started = start()
+            return finish(request, await get_response(request), token, started)
+    else:
+        def middleware(request):
+            token, started = start()
+            return finish(request, get_response(request), token, started)
+    return middleware
+
+
+def get_metrics() -> dict:
+    """
+    Function for a copy of the metrics of each view.
+    :return: The metrics by view.
+    :rtype: dict
+    """
+    with _lock:
+        return {label: {**metrics, 'buckets': list(metrics['buckets'])} for label, metrics in _metrics.items()}
+
+
+def reset_metrics() -> None:
+    """
+    Function clearing the metrics.
+    """
+    with _lock:
+        _metrics.clear()
+
+
+def render_metrics() -> str:
+    """
+    Function for the metrics in the Prometheus text format.
+    :return: The metrics.
+    :rtype: str
+    """
+    metrics = sorted(get_metrics().items())
+    lines = []
+    for name, key, kind, help_text in (
+            ('hbm_view_queries_total', 'queries', 'counter', 'Database queries run by the view.'),
+            ('hbm_view_db_seconds_total', 'sql_seconds', 'counter', 'Time spent in database queries.'),
+            ('hbm_view_render_seconds_total', 'render_seconds', 'counter', 'Time spent rendering templates.'),
+            ('hbm_view_response_bytes_total', 'response_bytes', 'counter', 'Size of the non-streaming responses.'),
+            ('hbm_view_slow_requests_total', 'slow_requests', 'counter',
+             'Requests slower than HBM_SLOW_REQUEST_SECONDS.')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{name}{{view="{label}"}} {values[key]}' for label, values in metrics)
+    lines.append('# HELP hbm_view_duration_seconds Duration of the requests to the view.')
+    lines.append('# TYPE hbm_view_duration_seconds histogram')
+    for label, values in metrics:
+        lines.extend(f'hbm_view_duration_seconds_bucket{{view="{label}",le="{bound}"}} {count}'
+                     for bound, count in zip(DURATION_BUCKETS, values['buckets']))
+        lines.append(f'hbm_view_duration_seconds_bucket{{view="{label}",le="+Inf"}} {values["requests"]}')
+        lines.append(f'hbm_view_duration_seconds_sum{{view="{label}"}} {values["duration_seconds"]}')
+        lines.append(f'hbm_view_duration_seconds_count{{view="{label}"}} {values["requests"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,92 @@
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .accounts import invalidate_account
+from .models import Account, Transaction
+from .watermarks import get_watermark, set_watermark
+
+RECONCILE_WATERMARK = 'reconcile_balances'
+RECONCILE_BATCH_SIZE = 900
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+def ledger_balances(accounts=None):
+    """
+    Function for the accounts annotated with ledger_balance, the income minus the expense of all their
+    transactions, computed with one grouped query.
+    :param accounts: The accounts to annotate, all accounts by default.
+    :type accounts: QuerySet
+    :return: The annotated accounts.
+    :rtype: QuerySet
+    """
+    if accounts is None:
+        accounts = Account.objects.all()
+    return accounts.annotate(ledger_balance=Coalesce(
+        Sum(Case(When(transaction__transaction_type=1, then=F('transaction__transaction_sum')),
+                 default=-F('transaction__transaction_sum'), output_field=MONEY)),
+        Value(Decimal(0)), output_field=MONEY))
+
+
+def ledger_balance_subquery() -> Coalesce:
+    """
+    Function for the ledger balance of the outer account as a correlated subquery, for UPDATE statements.
+    """
+    net = Transaction.objects.filter(transaction_account=OuterRef('pk')).order_by().values(
+        'transaction_account').annotate(net=Sum(Case(When(transaction_type=1, then=F('transaction_sum')),
+                                                     default=-F('transaction_sum'), output_field=MONEY))).values('net')
+    return Coalesce(Subquery(net), Value(Decimal(0)), output_field=MONEY)
+
+
+def reconcile_balances(fix: bool = False, incremental: bool = False, batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+    """
+    Function comparing every account balance with its ledger balance and optionally fixing the drift.
+    Incrementally, only the accounts with transactions after the watermark of the last run are checked; edits and
+    deletions of older transactions are only found by a full run.
+    :param fix: True to fix the drift.
+    :type fix: bool
+    :param incremental: True to check only the accounts with new transactions since the last run.
+    :type incremental: bool
+    :param batch_size: The number of accounts fixed per UPDATE.
+    :type batch_size: int
+    :return: A dict with the number of checked accounts, the drift as a list of dicts, the number of fixed accounts
+             and the new watermark.
+    :rtype: dict
+    """
+    last_id = Transaction.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    accounts = Account.objects.all()
+    if incremental:
+        accounts = accounts.filter(pk__in=Transaction.objects.filter(
+            id__gt=get_watermark(RECONCILE_WATERMARK)).values('transaction_account'))
+    checked = 0
+    drift = []
+    rows = ledger_balances(accounts).order_by('pk').values_list(
+        'pk', 'account_owner_id', 'account_balance', 'ledger_balance')
+    for pk, owner_id, balance, ledger_balance in rows.iterator(chunk_size=batch_size):
+        checked += 1
+        # SQLite sums decimals as floats and Django only rounds plain columns, so the sum is rounded here.
+        ledger_balance = ledger_balance.quantize(CENT)
+        if balance != ledger_balance:
+            drift.append({'account': pk, 'owner': owner_id, 'balance': balance, 'ledger_balance': ledger_balance,
+                          'drift': ledger_balance - balance})
+
+    fixed = 0
+    if fix:
+        rows = iter(drift)
+        while batch := list(islice(rows, batch_size)):
+            pks = [row['account'] for row in batch]
+            with db_transaction.atomic():
+                # Locking the accounts first makes concurrent balance changes, which lock the account before
+                # writing the transaction, either visible to the UPDATE or wait for it.
+                list(Account.objects.select_for_update().filter(pk__in=pks).values_list('pk', flat=True))
+                fixed += Account.objects.filter(pk__in=pks).update(account_balance=ledger_balance_subquery())
+                # update() sends no signals, so the cached accounts are invalidated here.
+                for row in batch:
+                    invalidate_account(row['owner'])
+    if fix or not drift:
+        set_watermark(RECONCILE_WATERMARK, last_id)
+    return {'checked': checked, 'drift': drift, 'fixed': fixed, 'watermark': last_id}
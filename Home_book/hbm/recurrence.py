@@ -0,0 +1,133 @@
+import calendar
+from datetime import date, timedelta
+from typing import Iterator, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+
+RECURRENCE_CHOICES = [('', 'Once'), ('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'),
+                      ('yearly', 'Yearly'), ('cron', 'Cron rule')]
+
+# (name, lowest, highest) of the day-of-month, month and day-of-week fields of a cron rule; Sunday is 0 or 7.
+CRON_FIELDS = (('day of month', 1, 31), ('month', 1, 12), ('day of week', 0, 7))
+
+
+def parse_cron_field(field: str, lowest: int, highest: int) -> Optional[frozenset]:
+    """
+    Function parsing one cron field with '*', lists, ranges and steps, e.g. '1,15', '1-5' or '*/2'.
+    :return: The matching values, or None for '*'.
+    :rtype: Optional[frozenset]
+    :raises ValueError: If the field is malformed or out of range.
+    """
+    if field == '*':
+        return None
+    values = set()
+    for part in field.split(','):
+        part, _, step = part.partition('/')
+        if part == '*':
+            start, end = lowest, highest
+        else:
+            start, _, end = part.partition('-')
+            start = int(start)
+            end = int(end) if end else (highest if step else start)
+        step = int(step) if step else 1
+        if not lowest <= start <= end <= highest or step < 1:
+            raise ValueError(f'{field} is out of range {lowest}-{highest}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def parse_cron(rule: str) -> Tuple[Optional[frozenset], Optional[frozenset], Optional[frozenset]]:
+    """
+    Function parsing a cron rule of the day of month, month and day of week fields, e.g. '1 * *' for the first of
+    every month or '* * 1-5' for weekdays. A full five-field cron rule is accepted too, its minute and hour fields
+    are ignored.
+    :param rule: The cron rule.
+    :type rule: str
+    :return: The day of month, month and ISO day of week (Monday is 1) values, None for '*'.
+    :rtype: Tuple[Optional[frozenset], Optional[frozenset], Optional[frozenset]]
+    :raises ValueError: If the rule is malformed.
+    """
+    fields = rule.split()
+    if len(fields) == 5:
+        fields = fields[2:]
+    if len(fields) != 3:
+        raise ValueError('A cron rule has the fields: day of month, month, day of week')
+    days, months, weekdays = (parse_cron_field(field, lowest, highest)
+                              for field, (_, lowest, highest) in zip(fields, CRON_FIELDS))
+    if weekdays is not None:
+        weekdays = frozenset(weekday or 7 for weekday in weekdays)
+    return days, months, weekdays
+
+
+def validate_cron_rule(value: str) -> None:
+    """
+    Function to return an error if a non-empty cron rule is malformed
+    """
+    if value:
+        try:
+            parse_cron(value)
+        except ValueError as error:
+            raise ValidationError(f'{value} is not a valid cron rule: {error}')
+
+
+def add_months(value: date, months: int) -> date:
+    """
+    Function adding months to a date, clamping the day to the length of the month.
+    """
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrences(start: date, recurrence: str, rule: str, after: date, until: date) -> Iterator[date]:
+    """
+    Generator for the dates of a plan starting on start with the given recurrence that fall after after and on or
+    before until. Monthly and yearly plans keep the day of the start date, clamped to shorter months.
+    :param start: The first date of the plan.
+    :type start: date
+    :param recurrence: One of the RECURRENCE_CHOICES values, '' for a one-off plan.
+    :type recurrence: str
+    :param rule: The cron rule of a 'cron' plan.
+    :type rule: str
+    :param after: The dates on or before this date are skipped.
+    :type after: date
+    :param until: The last date to generate.
+    :type until: date
+    :return: The dates in order.
+    :rtype: Iterator[date]
+    """
+    if not recurrence:
+        if after < start <= until:
+            yield start
+        return
+    first = max(start, after + timedelta(days=1))
+    if recurrence == 'daily':
+        for offset in range((until - first).days + 1):
+            yield first + timedelta(days=offset)
+    elif recurrence == 'weekly':
+        day = first + timedelta(days=-(first - start).days % 7)
+        while day <= until:
+            yield day
+            day += timedelta(days=7)
+    elif recurrence in ('monthly', 'yearly'):
+        step = 1 if recurrence == 'monthly' else 12
+        count = max(0, ((first.year - start.year) * 12 + first.month - start.month) // step - 1)
+        while (day := add_months(start, count * step)) <= until:
+            if day >= first:
+                yield day
+            count += 1
+    elif recurrence == 'cron':
+        days, months, weekdays = parse_cron(rule)
+        for offset in range((until - first).days + 1):
+            day = first + timedelta(days=offset)
+            if months is not None and day.month not in months:
+                continue
+            # As in cron, a day matches either restricted day field if both are restricted.
+            day_match = days is None or day.day in days
+            weekday_match = weekdays is None or day.isoweekday() in weekdays
+            if (day_match or weekday_match) if days is not None and weekdays is not None \
+                    else (day_match and weekday_match):
+                yield day
+    else:
+        raise ValueError(f'Unknown recurrence {recurrence}')
@@ -0,0 +1,241 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterable, List, Optional, Union
+
+from django.db import transaction as db_transaction
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncMonth
+
+from .categories import get_category_name, aget_category_name
+from .models import Account, Transaction, PlanningTransaction, TransactionRollup
+
+CENT = Decimal('0.01')
+
+# Field names of the raw ledger for real (False) and planned (True) transactions.
+LEDGER_FIELDS = {
+    False: {'model': Transaction, 'account': 'transaction_account', 'type': 'transaction_type',
+            'category': 'transaction_category', 'date': 'transaction_date', 'sum': 'transaction_sum'},
+    True: {'model': PlanningTransaction, 'account': 'transaction_account_plan', 'type': 'transaction_type_plan',
+           'category': 'transaction_category_plan', 'date': 'transaction_date_plan', 'sum': 'transaction_sum_plan'},
+}
+
+
+def month_start(value: date) -> date:
+    """
+    Function returning the first day of the month of the given date.
+    """
+    return value.replace(day=1)
+
+
+def next_month(value: date) -> date:
+    """
+    Function returning the first day of the month following the given date.
+    """
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def apply_to_rollup(account_id: int, transaction_date: date, transaction_type: int, category_id: int,
+                    amount: Decimal, count: int = 1, planned: bool = False) -> None:
+    """
+    Function for incrementally adding a transaction to (or, with a negative amount and count, removing it from) the
+    monthly rollup.
+    :param account_id: The ID of the transaction account.
+    :type account_id: int
+    :param transaction_date: The transaction date.
+    :type transaction_date: date
+    :param transaction_type: The transaction type, 0 for expense and 1 for income.
+    :type transaction_type: int
+    :param category_id: The ID of the transaction category.
+    :type category_id: int
+    :param amount: The sum to add to the rollup row.
+    :type amount: Decimal
+    :param count: The number of transactions to add to the rollup row.
+    :type count: int
+    :param planned: True for planned transactions.
+    :type planned: bool
+    :return: None
+    """
+    key = {'rollup_account_id': account_id, 'rollup_planned': planned, 'rollup_month': month_start(transaction_date),
+           'rollup_type': transaction_type, 'rollup_category_id': category_id}
+    with db_transaction.atomic():
+        updated = TransactionRollup.objects.filter(**key).update(rollup_sum=F('rollup_sum') + amount,
+                                                                 rollup_count=F('rollup_count') + count)
+        if not updated:
+            TransactionRollup.objects.create(rollup_sum=amount, rollup_count=count, **key)
+
+
+def add_transaction_to_rollup(transaction: Transaction) -> None:
+    """
+    Function for adding a saved transaction to the monthly rollup.
+    """
+    apply_to_rollup(transaction.transaction_account_id, transaction.transaction_date, transaction.transaction_type,
+                    transaction.transaction_category_id, transaction.transaction_sum)
+
+
+def remove_transaction_from_rollup(transaction: Transaction) -> None:
+    """
+    Function for removing a deleted transaction from the monthly rollup.
+    """
+    apply_to_rollup(transaction.transaction_account_id, transaction.transaction_date, transaction.transaction_type,
+                    transaction.transaction_category_id, -transaction.transaction_sum, count=-1)
+
+
+def add_planned_transaction_to_rollup(transaction: PlanningTransaction) -> None:
+    """
+    Function for adding a saved planned transaction to the monthly rollup.
+    """
+    apply_to_rollup(transaction.transaction_account_plan_id, transaction.transaction_date_plan,
+                    transaction.transaction_type_plan, transaction.transaction_category_plan_id,
+                    transaction.transaction_sum_plan, planned=True)
+
+
+def remove_planned_transaction_from_rollup(transaction: PlanningTransaction) -> None:
+    """
+    Function for removing a deleted planned transaction from the monthly rollup.
+    """
+    apply_to_rollup(transaction.transaction_account_plan_id, transaction.transaction_date_plan,
+                    transaction.transaction_type_plan, transaction.transaction_category_plan_id,
+                    -transaction.transaction_sum_plan, count=-1, planned=True)
+
+
+def rebuild_rollups(account: Optional[Account] = None) -> int:
+    """
+    Function for rebuilding the monthly rollup from the raw transactions, for one account or for all of them.
+    :param account: The account to rebuild, or None for all accounts.
+    :type account: Optional[Account]
+    :return: The number of rollup rows created.
+    :rtype: int
+    """
+    created = 0
+    with db_transaction.atomic():
+        rollups = TransactionRollup.objects.all()
+        if account is not None:
+            rollups = rollups.filter(rollup_account=account)
+        rollups.delete()
+        for planned, fields in LEDGER_FIELDS.items():
+            rows = fields['model'].objects.order_by()
+            if account is not None:
+                rows = rows.filter(**{fields['account']: account})
+            grouped = rows.annotate(month=TruncMonth(fields['date'])).values(
+                'month', fields['account'], fields['type'], fields['category']).annotate(
+                total=Sum(fields['sum']), count=Count('pk'))
+            objs = TransactionRollup.objects.bulk_create(
+                (TransactionRollup(rollup_account_id=row[fields['account']], rollup_planned=planned,
+                                   rollup_month=row['month'], rollup_type=row[fields['type']],
+                                   rollup_category_id=row[fields['category']], rollup_sum=row['total'],
+                                   rollup_count=row['count']) for row in grouped.iterator()),
+                batch_size=1000)
+            created += len(objs)
+    return created
+
+
+def rollup_sum_queries(account: Union[Account, Iterable[Account]], start_date: Optional[date] = None,
+                       end_date: Optional[date] = None, planned: bool = False, by_account: bool = False,
+                       exclude_categories: Iterable[int] = (), categories: Optional[Iterable[int]] = None) -> list:
+    """
+    Function for the grouped queries behind rollup_sums() and account_sums(): whole months are read from the rollup
+    and only the partial months at the edges of the range are read from the raw transactions. A bound of the range
+    that is None leaves that side open. The rows of several accounts are summed by the same queries. The categories,
+    if given, are the only ones summed.
+    :return: A list of (query, type key, group key) tuples, the queries yielding dicts with a 'total' key, grouped by
+        type and category, or by type and account with by_account.
+    :rtype: list
+    """
+    fields = LEDGER_FIELDS[planned]
+    accounts = [account] if isinstance(account, Account) else list(account)
+    rollups = TransactionRollup.objects.filter(rollup_account__in=accounts, rollup_planned=planned,
+                                               rollup_count__gt=0).exclude(rollup_category__in=exclude_categories)
+    if categories is not None:
+        categories = list(categories)
+        rollups = rollups.filter(rollup_category__in=categories)
+    raw = first_full_month = after_full_months = None
+    if start_date:
+        first_full_month = start_date if start_date.day == 1 else next_month(start_date)
+    if end_date:
+        after_full_months = next_month(end_date) if next_month(end_date) - timedelta(days=1) == end_date \
+            else month_start(end_date)
+    if first_full_month and after_full_months and first_full_month >= after_full_months:
+        rollups = None
+        raw = Q(**{f"{fields['date']}__range": [start_date, end_date]})
+    else:
+        # A missing bound leaves that side of the range open.
+        if first_full_month:
+            rollups = rollups.filter(rollup_month__gte=first_full_month)
+            raw = Q(**{f"{fields['date']}__gte": start_date, f"{fields['date']}__lt": first_full_month})
+        if after_full_months:
+            rollups = rollups.filter(rollup_month__lt=after_full_months)
+            edge = Q(**{f"{fields['date']}__gte": after_full_months, f"{fields['date']}__lte": end_date})
+            raw = edge if raw is None else raw | edge
+
+    queries = []
+    if rollups is not None:
+        group = 'rollup_account' if by_account else 'rollup_category'
+        queries.append((rollups.order_by().values('rollup_type', group).annotate(total=Sum('rollup_sum')),
+                        'rollup_type', group))
+    if raw is not None:
+        group = fields['account'] if by_account else fields['category']
+        rows = fields['model'].objects.filter(raw, **{f"{fields['account']}__in": accounts}).exclude(
+            **{f"{fields['category']}__in": exclude_categories}).order_by()
+        if categories is not None:
+            rows = rows.filter(**{f"{fields['category']}__in": categories})
+        queries.append((rows.values(fields['type'], group).annotate(total=Sum(fields['sum'])), fields['type'], group))
+    return queries
+
+
+def rollup_sums(account: Account, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                planned: bool = False, categories: Optional[Iterable[int]] = None) -> list:
+    """
+    Function for the sums per transaction type and category name over a date range. Whole months are read from the
+    rollup and only the partial months at the edges of the range are read from the raw transactions.
+    :param account: The account to summarize.
+    :type account: Account
+    :param start_date: The first day of the range, or None for the whole history.
+    :type start_date: Optional[date]
+    :param end_date: The last day of the range, or None for the whole history.
+    :type end_date: Optional[date]
+    :param planned: True to summarize planned transactions.
+    :type planned: bool
+    :param categories: The IDs of the only categories to summarize, or None for all of them.
+    :type categories: Optional[Iterable[int]]
+    :return: A list of dicts with 'type', 'category_name' and 'total' keys.
+    :rtype: list
+    """
+    return [{'type': row[type_key], 'category_name': get_category_name(row[category_key]), 'total': row['total']}
+            for query, type_key, category_key in rollup_sum_queries(account, start_date, end_date, planned,
+                                                                    categories=categories)
+            for row in query]
+
+
+async def arollup_sums(account: Account, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                       planned: bool = False) -> list:
+    """
+    Async version of rollup_sums() for async views, reading the rows with the async ORM.
+    """
+    return [{'type': row[type_key], 'category_name': await aget_category_name(row[category_key]),
+             'total': row['total']}
+            for query, type_key, category_key in rollup_sum_queries(account, start_date, end_date, planned)
+            async for row in query]
+
+
+def account_sums(accounts: List[Account], start_date: Optional[date] = None, end_date: Optional[date] = None,
+                 exclude_categories: Iterable[int] = ()) -> dict:
+    """
+    Function for the expense and income totals of each account over a date range, summed for all the accounts by
+    the same grouped queries as rollup_sums(), not by one query per account.
+    :param accounts: The accounts to summarize.
+    :type accounts: List[Account]
+    :param start_date: The first day of the range, or None for the whole history.
+    :type start_date: Optional[date]
+    :param end_date: The last day of the range, or None for the whole history.
+    :type end_date: Optional[date]
+    :param exclude_categories: The IDs of the categories left out, e.g. the transfers between the accounts.
+    :type exclude_categories: Iterable[int]
+    :return: A dict of the account IDs to their [expense, income] totals.
+    :rtype: dict
+    """
+    totals = {account.pk: [Decimal(0), Decimal(0)] for account in accounts}
+    for query, type_key, account_key in rollup_sum_queries(accounts, start_date, end_date, by_account=True,
+                                                           exclude_categories=exclude_categories):
+        for row in query:
+            totals[row[account_key]][row[type_key]] += row['total']
+    return {account_id: [total.quantize(CENT) for total in pair] for account_id, pair in totals.items()}
@@ -0,0 +1,183 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, F, Q, QuerySet, Sum, When, Window
+
+from .ledger import keyset_query, split_keyset_page
+from .models import Account, Transaction
+from .statistics_cache import get_statistics_version
+
+CENT = Decimal('0.01')
+
+# The running balance of a page of transactions, newest first, is computed in the database from the balance after
+# the newest transaction of the page, its checkpoint. The checkpoint of the first page is the account balance; the
+# one of the next page is computed with the page and cached under its cursor, so page N costs the same as page 1.
+
+
+def _cache():
+    """
+    Function returning the cache of the checkpoints, the one of the transaction statistics, whose per-account version
+    changes with every transaction.
+    """
+    return caches[getattr(settings, 'HBM_STATISTICS_CACHE', 'default')]
+
+
+def signed_sum() -> Case:
+    """
+    Function for the sum of a transaction as a change of the balance: positive for an income, negative for an expense.
+    """
+    return Case(When(transaction_type=1, then=F('transaction_sum')), default=-F('transaction_sum'))
+
+
+def with_running_total(transactions: QuerySet) -> QuerySet:
+    """
+    Function annotating each transaction with running_total, the sum of the balance changes from the first selected
+    transaction, in the (date, id) order of the pages from the newest, down to it.
+    :param transactions: The transactions of the page and the older ones.
+    :type transactions: QuerySet
+    :return: The annotated transactions.
+    :rtype: QuerySet
+    """
+    return transactions.annotate(running_total=Window(
+        Sum(signed_sum()), order_by=[F('transaction_date').desc(), F('id').desc()]))
+
+
+def newer_transactions(account: Account, cursor: Optional[str], end_date: Optional[date]) -> Optional[QuerySet]:
+    """
+    Function for the transactions of the account newer than the first one of a page: the ones up to the cursor, or,
+    on the first page, the ones after the end date of the filter.
+    :return: The transactions, or None if there are none to subtract from the account balance.
+    :rtype: Optional[QuerySet]
+    :raises ValueError: If the cursor is malformed.
+    """
+    transactions = Transaction.objects.filter(transaction_account=account)
+    if cursor:
+        cursor_date, cursor_id = cursor.split('_')
+        cursor_date = datetime.strptime(cursor_date, '%Y-%m-%d').date()
+        return transactions.filter(Q(transaction_date__gt=cursor_date) |
+                                   Q(transaction_date=cursor_date, id__gte=int(cursor_id)))
+    if end_date:
+        return transactions.filter(transaction_date__gt=end_date)
+    return None
+
+
+def checkpoint_key(account: Account, cursor: Optional[str], end_date: Optional[date]) -> str:
+    """
+    Function for the cache key of a checkpoint under the statistics version of the account. The balance is part of
+    the key, as a reconciliation changes it without a transaction.
+    """
+    start = f'cursor:{cursor}' if cursor else f'end:{end_date}'
+    return (f'hbm:balance:{account.pk}:{get_statistics_version(account)}:{account.account_balance}:'
+            f'{start}')
+
+
+def balance_checkpoint(account: Account, cursor: Optional[str], end_date: Optional[date]) -> Decimal:
+    """
+    Function for the balance after the newest transaction of a page, read from the cache, or computed as the
+    account balance minus the newer transactions on a miss.
+    :param account: The account.
+    :type account: Account
+    :param cursor: The cursor of the page, or None for the first page.
+    :type cursor: Optional[str]
+    :param end_date: The end date of the filter, or None.
+    :type end_date: Optional[date]
+    :return: The balance.
+    :rtype: Decimal
+    :raises ValueError: If the cursor is malformed.
+    """
+    newer = newer_transactions(account, cursor, end_date)
+    if newer is None:
+        return account.account_balance
+    key = checkpoint_key(account, cursor, end_date)
+    balance = _cache().get(key)
+    if balance is None:
+        net = newer.aggregate(net=Sum(signed_sum()))['net'] or Decimal(0)
+        balance = (account.account_balance - net).quantize(CENT)
+        _cache().set(key, balance, getattr(settings, 'HBM_STATISTICS_CACHE_TIMEOUT', 3600))
+    return balance
+
+
+async def abalance_checkpoint(account: Account, cursor: Optional[str], end_date: Optional[date]) -> Decimal:
+    """
+    Async version of balance_checkpoint() for async views.
+    """
+    newer = newer_transactions(account, cursor, end_date)
+    if newer is None:
+        return account.account_balance
+    key = await sync_to_async(checkpoint_key)(account, cursor, end_date)
+    balance = await _cache().aget(key)
+    if balance is None:
+        net = (await newer.aaggregate(net=Sum(signed_sum())))['net'] or Decimal(0)
+        balance = (account.account_balance - net).quantize(CENT)
+        await _cache().aset(key, balance, getattr(settings, 'HBM_STATISTICS_CACHE_TIMEOUT', 3600))
+    return balance
+
+
+def set_running_balances(transactions: list, checkpoint: Decimal) -> None:
+    """
+    Function setting running_balance, the balance after the transaction, on transactions annotated by
+    with_running_total(). The balance is rounded to cents, as SQLite sums decimals as floats.
+    :param transactions: The annotated transactions.
+    :type transactions: list
+    :param checkpoint: The balance after the first transaction.
+    :type checkpoint: Decimal
+    :return: None
+    """
+    for transaction in transactions:
+        change = transaction.transaction_sum if transaction.transaction_type == 1 else -transaction.transaction_sum
+        transaction.running_balance = (checkpoint - transaction.running_total + change).quantize(CENT)
+
+
+def cache_next_checkpoint(account: Account, rows: list, page: list, next_cursor: Optional[str]) -> Optional[str]:
+    """
+    Function caching the balance after the first transaction of the next page, selected with the page, under the
+    cursor of the next page.
+    """
+    if next_cursor:
+        _cache().set(checkpoint_key(account, next_cursor, None), rows[len(page)].running_balance,
+                     getattr(settings, 'HBM_STATISTICS_CACHE_TIMEOUT', 3600))
+    return next_cursor
+
+
+def running_balance_page(account: Account, transactions: QuerySet, cursor: Optional[str], page_size: int,
+                         end_date: Optional[date] = None) -> Tuple[list, Optional[str]]:
+    """
+    Function for one page of transactions like keyset_page(), each with running_balance, the balance of the account
+    after it. The balances are computed by a window function over the page, from the checkpoint of the cursor, so
+    no page rescans the history. The transactions must be all the transactions of the account, optionally up to an
+    end date; a running balance of transactions filtered by type or category would be meaningless.
+    :param account: The account.
+    :type account: Account
+    :param transactions: The transactions of the account.
+    :type transactions: QuerySet
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: Optional[str]
+    :param page_size: The number of transactions per page.
+    :type page_size: int
+    :param end_date: The last day of the transactions, or None.
+    :type end_date: Optional[date]
+    :return: The page and the cursor of the next page, or None on the last page.
+    :rtype: Tuple[list, Optional[str]]
+    :raises ValueError: If the cursor is malformed.
+    """
+    checkpoint = balance_checkpoint(account, cursor, end_date)
+    rows = list(keyset_query(with_running_total(transactions), cursor, page_size))
+    set_running_balances(rows, checkpoint)
+    page, next_cursor = split_keyset_page(rows, page_size)
+    return page, cache_next_checkpoint(account, rows, page, next_cursor)
+
+
+async def arunning_balance_page(account: Account, transactions: QuerySet, cursor: Optional[str], page_size: int,
+                                end_date: Optional[date] = None) -> Tuple[list, Optional[str]]:
+    """
+    Async version of running_balance_page() for async views.
+    """
+    checkpoint = await abalance_checkpoint(account, cursor, end_date)
+    rows = [transaction async for transaction in keyset_query(with_running_total(transactions), cursor, page_size)]
+    set_running_balances(rows, checkpoint)
+    page, next_cursor = split_keyset_page(rows, page_size)
+    return page, await sync_to_async(cache_next_checkpoint)(account, rows, page, next_cursor)
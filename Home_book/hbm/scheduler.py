@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from django.db import transaction as db_transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from .ledger import save_transactions
+from .models import PlanningTransaction, Transaction
+from .recurrence import occurrences
+
+MATERIALIZE_BATCH_SIZE = 1000
+
+
+class PlansClaimed(Exception):
+    """
+    Raised when another scheduler run materialized some plans of a batch first.
+    """
+
+
+def due_plans(today: date) -> QuerySet:
+    """
+    Function for the plans with occurrences on or before today that were not materialized yet. A one-off plan is
+    materialized once.
+    :param today: The last day to materialize.
+    :type today: date
+    :return: The due plans.
+    :rtype: QuerySet
+    """
+    return PlanningTransaction.objects.filter(transaction_date_plan__lte=today).filter(
+        Q(transaction_materialized_plan__isnull=True) |
+        Q(transaction_materialized_plan__lt=today) & ~Q(transaction_recurrence_plan=''))
+
+
+def materialize_batch(plans: list, today: date) -> int:
+    """
+    Function turning the occurrences of a batch of due plans up to today into transactions, in one atomic block.
+    The plans are claimed first by moving their watermark to today, so a concurrent or repeated run never
+    materializes an occurrence twice. The plans, one-off ones included, are kept with their planned rollup, as the
+    budget compares them with the transactions.
+    :param plans: Due plans with their accounts selected.
+    :type plans: list
+    :param today: The last day to materialize.
+    :type today: date
+    :return: The number of created transactions.
+    :rtype: int
+    :raises PlansClaimed: If another run claimed some of the plans first.
+    """
+    transactions = []
+    for plan in plans:
+        after = plan.transaction_materialized_plan or plan.transaction_date_plan - timedelta(days=1)
+        for day in occurrences(plan.transaction_date_plan, plan.transaction_recurrence_plan,
+                               plan.transaction_rule_plan, after, today):
+            transactions.append(Transaction(
+                transaction_account=plan.transaction_account_plan, transaction_type=plan.transaction_type_plan,
+                transaction_category_id=plan.transaction_category_plan_id, transaction_date=day,
+                transaction_sum=plan.transaction_sum_plan, transaction_comment=plan.transaction_comment_plan))
+
+    with db_transaction.atomic():
+        pks = [plan.pk for plan in plans]
+        if due_plans(today).filter(pk__in=pks).update(transaction_materialized_plan=today) != len(pks):
+            raise PlansClaimed
+        save_transactions(transactions)
+    return len(transactions)
+
+
+def materialize_plans(today: Optional[date] = None, batch_size: int = MATERIALIZE_BATCH_SIZE) -> dict:
+    """
+    Function materializing the due plans of all accounts batch by batch, walking them by ID, so memory does not
+    depend on the number of plans. It is safe to rerun.
+    :param today: The last day to materialize, the current date by default.
+    :type today: Optional[date]
+    :param batch_size: The number of plans per batch.
+    :type batch_size: int
+    :return: A dict with the number of materialized plans and created transactions.
+    :rtype: dict
+    """
+    today = today or timezone.localdate()
+    last_pk = 0
+    materialized = 0
+    created = 0
+    while True:
+        plans = list(due_plans(today).filter(pk__gt=last_pk).select_related('transaction_account_plan').order_by(
+            'pk')[:batch_size])
+        if not plans:
+            break
+        try:
+            created += materialize_batch(plans, today)
+        except PlansClaimed:
+            # The batch is read again; the plans claimed by the other run are no longer due.
+            continue
+        materialized += len(plans)
+        last_pk = plans[-1].pk
+    return {'plans': materialized, 'transactions': created}
@@ -0,0 +1,187 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import connections, DEFAULT_DB_ALIAS, transaction as db_transaction
+from django.db.models import BooleanField, F, FloatField, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Account, Transaction
+
+# The comments are searched with an FTS5 table on SQLite and with a GIN index on their tsvector on PostgreSQL, both
+# created by migration 0013. Only the FTS5 table is written to: PostgreSQL maintains its index by itself.
+FTS_TABLE = 'hbm_transaction_fts'
+PG_SEARCH_INDEX = 'transaction_comment_search_idx'
+PG_SEARCH_CONFIG = 'simple'
+SEARCH_ORDER = ('search_rank', '-transaction_date', '-id')
+
+
+def search_terms(query: str) -> List[Tuple[str, bool]]:
+    """
+    Function splitting a search query into its words, each with True if it ends with * to match it as a prefix.
+    Anything else than word characters is ignored, so the query needs no escaping.
+    """
+    return [(word, bool(star)) for word, star in re.findall(r'(\w+)(\*?)', query)]
+
+
+def fts_query(account_id: int, terms: List[Tuple[str, bool]]) -> str:
+    """
+    Function for the FTS5 query matching the comments of the account that contain all the terms.
+    """
+    words = ' '.join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in terms)
+    return f'transaction_account:"{account_id}" AND transaction_comment:({words})'
+
+
+def pg_tsquery(terms: List[Tuple[str, bool]]) -> str:
+    """
+    Function for the PostgreSQL tsquery matching the comments that contain all the terms.
+    """
+    return ' & '.join(f'{word}:*' if prefix else word for word, prefix in terms)
+
+
+def search_transactions(transactions: QuerySet, account: Account, query: str) -> QuerySet:
+    """
+    Function narrowing the transactions of the account to the ones whose comment contains all the words of the
+    query, a word ending with * matching as a prefix. Each transaction is annotated with search_rank, lower for a
+    better match, so the result can be combined with the other filters and ordered by relevance.
+    :param transactions: The transactions of the account.
+    :type transactions: QuerySet
+    :param account: The account.
+    :type account: Account
+    :param query: The search query.
+    :type query: str
+    :return: The matching transactions.
+    :rtype: QuerySet
+    """
+    terms = search_terms(query)
+    if not terms:
+        return transactions.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+    if connections[transactions.db].vendor == 'postgresql':
+        document = f"to_tsvector('{PG_SEARCH_CONFIG}', {Transaction._meta.db_table}.transaction_comment)"
+        tsquery = f"to_tsquery('{PG_SEARCH_CONFIG}', %s)"
+        return transactions.filter(
+            RawSQL(f'{document} @@ {tsquery}', [pg_tsquery(terms)], output_field=BooleanField())).annotate(
+            search_rank=RawSQL(f'-ts_rank({document}, {tsquery})', [pg_tsquery(terms)], output_field=FloatField()))
+    return transactions.filter(search_entry__search_query=fts_query(account.pk, terms)).annotate(
+        search_rank=F('search_entry__search_rank'))
+
+
+def search_page(transactions: QuerySet, cursor: Optional[str], page_size: int) -> Tuple[list, Optional[str]]:
+    """
+    Function for one page of transactions returned by search_transactions(), the best matches first. The cursor is
+    the page number: ranked pages cannot be selected by key, but the rank is only computed for the matches.
+    :param transactions: The matching transactions.
+    :type transactions: QuerySet
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: Optional[str]
+    :param page_size: The number of transactions per page.
+    :type page_size: int
+    :return: The page and the cursor of the next page, or None on the last page.
+    :rtype: Tuple[list, Optional[str]]
+    :raises ValueError: If the cursor is not a page number.
+    """
+    number = int(cursor) if cursor else 1
+    if number < 1:
+        raise ValueError('Invalid page number')
+    start = (number - 1) * page_size
+    page = list(transactions.order_by(*SEARCH_ORDER)[start:start + page_size + 1])
+    return page[:page_size], str(number + 1) if len(page) > page_size else None
+
+
+async def asearch_page(transactions: QuerySet, cursor: Optional[str], page_size: int) -> Tuple[list, Optional[str]]:
+    """
+    Async version of search_page() for async views.
+    """
+    number = int(cursor) if cursor else 1
+    if number < 1:
+        raise ValueError('Invalid page number')
+    start = (number - 1) * page_size
+    page = [transaction async for transaction in transactions.order_by(*SEARCH_ORDER)[start:start + page_size + 1]]
+    return page[:page_size], str(number + 1) if len(page) > page_size else None
+
+
+def index_transactions(transactions: Iterable[Transaction], using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Function adding saved transactions to the FTS5 table, replacing their previous entries. Called for the
+    transactions saved with bulk_create(), which sends no post_save signal.
+    :param transactions: The saved transactions.
+    :type transactions: Iterable[Transaction]
+    :param using: The alias of the database.
+    :type using: str
+    :return: None
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    rows = [(transaction.pk, transaction.transaction_comment, transaction.transaction_account_id)
+            for transaction in transactions]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, transaction_comment, transaction_account) '
+                           f'VALUES (%s, %s, %s)', rows)
+
+
+def unindex_transactions(ids: Iterable[int], using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Function removing deleted transactions from the FTS5 table. Called for the transactions deleted in bulk without
+    the post_delete signal.
+    :param ids: The IDs of the deleted transactions.
+    :type ids: Iterable[int]
+    :param using: The alias of the database.
+    :type using: str
+    :return: None
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in ids])
+
+
+def index_transaction_for_instance(instance: Transaction, using: str = DEFAULT_DB_ALIAS, **kwargs) -> None:
+    """
+    Function connected to the post_save signal of Transaction, so every write path, including the admin, keeps the
+    FTS5 table in sync. The entry is written in the transaction of the save, so it is rolled back with it.
+    """
+    index_transactions([instance], using)
+
+
+def unindex_transaction_for_instance(instance: Transaction, using: str = DEFAULT_DB_ALIAS, **kwargs) -> None:
+    """
+    Function connected to the post_delete signal of Transaction, removing the transaction from the FTS5 table.
+    QuerySet.delete() sends the signal too, as there are receivers.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [instance.pk])
+
+
+def rebuild_search_index(account: Optional[Account] = None, using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Function for rebuilding the search index from the transactions, for one account or for all of them. On
+    PostgreSQL, the GIN index is rebuilt for all accounts.
+    :param account: The account to rebuild, or None for all accounts.
+    :type account: Optional[Account]
+    :param using: The alias of the database.
+    :type using: str
+    :return: The number of indexed transactions.
+    :rtype: int
+    """
+    connection = connections[using]
+    transactions = Transaction.objects.using(using)
+    if account is not None:
+        transactions = transactions.filter(transaction_account=account)
+    with db_transaction.atomic(using), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'REINDEX INDEX {PG_SEARCH_INDEX}')
+        elif connection.vendor == 'sqlite':
+            if account is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            else:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT rowid FROM {FTS_TABLE} '
+                               f'WHERE {FTS_TABLE} MATCH %s)', [f'transaction_account:"{account.pk}"'])
+            sql, params = transactions.values_list(
+                'pk', 'transaction_comment', 'transaction_account').query.sql_with_params()
+            cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, transaction_comment, transaction_account) {sql}', params)
+    return transactions.count()
@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: without it, the sums are read from the rollups.
+    np = None
+
+from .categories import get_category_name
+from .models import Account, Transaction
+from .rollups import rollup_sums
+from .statistics_cache import get_statistics_version
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SNAPSHOT_CHUNK_SIZE = 10000
+
+# Process-local snapshots by account ID, each with the statistics version it was loaded under, least recently used
+# first. A transaction changes the version, so a stale snapshot is never used, and at most
+# HBM_LEDGER_SNAPSHOT_ACCOUNTS snapshots are kept.
+_lock = threading.Lock()
+_snapshots: OrderedDict = OrderedDict()
+
+
+def snapshots_enabled() -> bool:
+    """
+    Function telling whether the sums are computed from ledger snapshots: NumPy is installed and HBM_LEDGER_SNAPSHOTS
+    is True.
+    """
+    return np is not None and getattr(settings, 'HBM_LEDGER_SNAPSHOTS', False)
+
+
+class LedgerSnapshot:
+    """
+    Columnar copy of the ledger of one account, sorted by date: the days since 1970-01-01 as int32, the sums in cents
+    as int64, the types as int8 and the categories as int16 codes into category_ids, 15 bytes per transaction. A
+    date range is found by binary search and the sums are computed with NumPy, with no query.
+    """
+    def __init__(self, days, cents, types, codes, category_ids):
+        self.days = days
+        self.cents = cents
+        self.types = types
+        self.codes = codes
+        self.category_ids = category_ids
+
+    @classmethod
+    def load(cls, account: Account) -> 'LedgerSnapshot':
+        """
+        Method reading the ledger of the account with one query, SNAPSHOT_CHUNK_SIZE rows at a time.
+        """
+        rows = Transaction.objects.filter(transaction_account=account).order_by('transaction_date').values_list(
+            'transaction_date', 'transaction_sum', 'transaction_type', 'transaction_category').iterator(
+            chunk_size=SNAPSHOT_CHUNK_SIZE)
+        columns = ([], [], [], [])
+        while chunk := list(islice(rows, SNAPSHOT_CHUNK_SIZE)):
+            days, sums, types, categories = zip(*chunk)
+            columns[0].append(np.fromiter((day.toordinal() - EPOCH_ORDINAL for day in days), np.int32, len(chunk)))
+            columns[1].append(np.fromiter((int(value.scaleb(2)) for value in sums), np.int64, len(chunk)))
+            columns[2].append(np.array(types, np.int8))
+            columns[3].append(np.array(categories, np.int64))
+        days, cents, types, categories = (np.concatenate(column) if column else np.zeros(0, dtype)
+                                          for column, dtype in zip(columns, (np.int32, np.int64, np.int8, np.int64)))
+        category_ids, codes = np.unique(categories, return_inverse=True)
+        return cls(days, cents, types, codes.astype(np.int16), category_ids)
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory used by the arrays in bytes.
+        """
+        return sum(array.nbytes for array in (self.days, self.cents, self.types, self.codes, self.category_ids))
+
+    def select(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+               categories: Optional[Iterable[int]] = None) -> Tuple:
+        """
+        Method for the cents, types and category codes of the transactions between the dates, both included, and of
+        the given categories.
+        """
+        first = 0 if start_date is None else np.searchsorted(self.days, start_date.toordinal() - EPOCH_ORDINAL)
+        last = len(self.days) if end_date is None else np.searchsorted(
+            self.days, end_date.toordinal() - EPOCH_ORDINAL, side='right')
+        cents, types, codes = self.cents[first:last], self.types[first:last], self.codes[first:last]
+        if categories is not None:
+            mask = np.isin(codes, np.flatnonzero(np.isin(self.category_ids, list(categories))))
+            cents, types, codes = cents[mask], types[mask], codes[mask]
+        return cents, types, codes
+
+    def totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+               categories: Optional[Iterable[int]] = None):
+        """
+        Method for the sums in cents and the counts of the selected transactions per type and category code, as two
+        (2, number of categories) arrays. The sums are added as float64, exact up to 2**53 cents.
+        """
+        cents, types, codes = self.select(start_date, end_date, categories)
+        keys = types.astype(np.intp) * len(self.category_ids) + codes
+        size = 2 * len(self.category_ids)
+        sums = np.rint(np.bincount(keys, weights=cents, minlength=size)).astype(np.int64)
+        counts = np.bincount(keys, minlength=size)
+        return sums.reshape(2, -1), counts.reshape(2, -1)
+
+    def sums(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+             categories: Optional[Iterable[int]] = None) -> list:
+        """
+        Method for the sums per transaction type and category name, like rollup_sums().
+        :param start_date: The first day of the range, or None for the whole history.
+        :type start_date: Optional[date]
+        :param end_date: The last day of the range, or None for the whole history.
+        :type end_date: Optional[date]
+        :param categories: The IDs of the only categories to summarize, or None for all of them.
+        :type categories: Optional[Iterable[int]]
+        :return: A list of dicts with 'type', 'category_name' and 'total' keys.
+        :rtype: list
+        """
+        sums, counts = self.totals(start_date, end_date, categories)
+        return [{'type': int(transaction_type), 'category_name': get_category_name(int(self.category_ids[code])),
+                 'total': Decimal(int(sums[transaction_type, code])).scaleb(-2)}
+                for transaction_type, code in zip(*np.nonzero(counts))]
+
+
+def get_snapshot(account: Account) -> Optional[LedgerSnapshot]:
+    """
+    Function for the snapshot of the ledger of the account, loaded on the first call after a transaction changed
+    its statistics version, or None if snapshots are not enabled.
+    :param account: The account.
+    :type account: Account
+    :return: The snapshot, or None.
+    :rtype: Optional[LedgerSnapshot]
+    """
+    if not snapshots_enabled():
+        return None
+    version = get_statistics_version(account)
+    with _lock:
+        entry = _snapshots.get(account.pk)
+        if entry is not None and entry[0] == version:
+            _snapshots.move_to_end(account.pk)
+            return entry[1]
+    # Loaded outside the lock. A transaction committed meanwhile has bumped the version with it, so the snapshot is
+    # at worst reloaded once more.
+    snapshot = LedgerSnapshot.load(account)
+    with _lock:
+        _snapshots[account.pk] = (version, snapshot)
+        _snapshots.move_to_end(account.pk)
+        while len(_snapshots) > getattr(settings, 'HBM_LEDGER_SNAPSHOT_ACCOUNTS', 100):
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+def clear_snapshots() -> None:
+    """
+    Function dropping all the snapshots of the process.
+    """
+    with _lock:
+        _snapshots.clear()
+
+
+def ledger_sums(account: Account, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                categories: Optional[Iterable[int]] = None) -> list:
+    """
+    Function for the sums per transaction type and category name over a date range, computed from the ledger
+    snapshot of the account if snapshots are enabled, otherwise read with rollup_sums().
+    :param account: The account to summarize.
+    :type account: Account
+    :param start_date: The first day of the range, or None for the whole history.
+    :type start_date: Optional[date]
+    :param end_date: The last day of the range, or None for the whole history.
+    :type end_date: Optional[date]
+    :param categories: The IDs of the only categories to summarize, or None for all of them.
+    :type categories: Optional[Iterable[int]]
+    :return: A list of dicts with 'type', 'category_name' and 'total' keys.
+    :rtype: list
+    """
+    snapshot = get_snapshot(account)
+    if snapshot is None:
+        return rollup_sums(account, start_date, end_date, categories=categories)
+    return snapshot.sums(start_date, end_date, categories)
+
+
+def compare_sums(account: Account, period: Tuple[date, date], previous: Tuple[date, date],
+                 categories: Optional[Iterable[int]] = None) -> List[dict]:
+    """
+    Function comparing the sums per transaction type and category name of two periods, see ledger_sums().
+    :param account: The account to summarize.
+    :type account: Account
+    :param period: The first and the last day of the period.
+    :type period: Tuple[date, date]
+    :param previous: The first and the last day of the period it is compared with.
+    :type previous: Tuple[date, date]
+    :param categories: The IDs of the only categories to summarize, or None for all of them.
+    :type categories: Optional[Iterable[int]]
+    :return: A list of dicts with 'type', 'category_name', 'total', 'previous_total' and 'change' keys, sorted by
+        type and category name.
+    :rtype: list
+    """
+    categories = None if categories is None else list(categories)
+    rows = {}
+    for key, (start_date, end_date) in (('total', period), ('previous_total', previous)):
+        for row in ledger_sums(account, start_date, end_date, categories):
+            totals = rows.setdefault((row['type'], row['category_name']),
+                                     {'total': Decimal('0.00'), 'previous_total': Decimal('0.00')})
+            totals[key] += row['total']
+    return [{'type': transaction_type, 'category_name': name, **totals,
+             'change': totals['total'] - totals['previous_total']}
+            for (transaction_type, name), totals in sorted(rows.items())]
@@ -0,0 +1,118 @@
+from datetime import date
+from typing import Awaitable, Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .accounts import invalidate_account_by_id
+from .models import Account
+
+HITS_KEY = 'hbm:stats-hits'
+MISSES_KEY = 'hbm:stats-misses'
+
+
+def _cache():
+    """
+    Function returning the cache used for the transaction statistics.
+    """
+    return caches[getattr(settings, 'HBM_STATISTICS_CACHE', 'default')]
+
+
+def _increment(key: str) -> None:
+    """
+    Function incrementing a counter in the statistics cache, creating it if it does not exist.
+    """
+    cache = _cache()
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_statistics_version(account: Account) -> int:
+    """
+    Function for the statistics version of an account, as read from the database with the account at the start of
+    the request, so every process sees the same one whatever the cache backend. It is read before the statistics are
+    computed, so they are at least as recent as the version.
+    """
+    return account.account_version
+
+
+def bump_statistics_version(account_id: int) -> None:
+    """
+    Function invalidating all cached statistics of an account by incrementing its version, for the changes of the
+    ledger that do not go through Account.add_to_balance(), which bumps it itself. It is called in the transaction
+    of the change, so the new version is visible exactly when the changed transactions are: a request reading it
+    sees the changes, and a request that read the old version caches its statistics under a key no longer read.
+    :param account_id: The ID of the account whose transactions changed.
+    :type account_id: int
+    :return: None
+    """
+    Account.objects.filter(pk=account_id).update(account_version=F('account_version') + 1)
+    invalidate_account_by_id(account_id)
+
+
+def statistics_key(account: Account, start_date: Optional[date], end_date: Optional[date]) -> str:
+    """
+    Function for the cache key of the statistics of an account for a date range under its current version.
+    """
+    return f'hbm:stats:{account.pk}:{get_statistics_version(account)}:{start_date}:{end_date}'
+
+
+def get_cached_statistics(account: Account, start_date: Optional[date], end_date: Optional[date],
+                          compute: Callable[[], list]) -> list:
+    """
+    Function returning the statistics of an account for a date range from the cache, computing and storing them on
+    a miss.
+    :param account: The account, as read at the start of the request.
+    :type account: Account
+    :param start_date: The first day of the range, or None for the whole history.
+    :type start_date: Optional[date]
+    :param end_date: The last day of the range, or None for the whole history.
+    :type end_date: Optional[date]
+    :param compute: Function computing the statistics on a miss.
+    :type compute: Callable[[], list]
+    :return: The statistics.
+    :rtype: list
+    """
+    cache = _cache()
+    key = statistics_key(account, start_date, end_date)
+    statistic_data = cache.get(key)
+    if statistic_data is None:
+        _increment(MISSES_KEY)
+        statistic_data = compute()
+        cache.set(key, statistic_data, getattr(settings, 'HBM_STATISTICS_CACHE_TIMEOUT', 3600))
+    else:
+        _increment(HITS_KEY)
+    return statistic_data
+
+
+async def aget_cached_statistics(account: Account, start_date: Optional[date], end_date: Optional[date],
+                                 compute: Callable[[], Awaitable[list]]) -> list:
+    """
+    Async version of get_cached_statistics() for async views. The cache is used through its async methods and
+    compute is awaited on a miss.
+    """
+    cache = _cache()
+    key = statistics_key(account, start_date, end_date)
+    statistic_data = await cache.aget(key)
+    if statistic_data is None:
+        await sync_to_async(_increment)(MISSES_KEY)
+        statistic_data = await compute()
+        await cache.aset(key, statistic_data, getattr(settings, 'HBM_STATISTICS_CACHE_TIMEOUT', 3600))
+    else:
+        await sync_to_async(_increment)(HITS_KEY)
+    return statistic_data
+
+
+def get_statistics_cache_counters() -> dict:
+    """
+    Function for the hit and miss counters of the statistics cache.
+    :return: A dict with 'hits' and 'misses' keys.
+    :rtype: dict
+    """
+    cache = _cache()
+    return {'hits': cache.get(HITS_KEY, 0), 'misses': cache.get(MISSES_KEY, 0)}
@@ -0,0 +1,80 @@
+import io
+import os
+
+from django.http import QueryDict
+
+from .importers import import_transactions, parse_csv, parse_ofx
+from .jobs import job_storage
+from .models import Job
+from .reconciliation import reconcile_balances
+from .snapshot import ledger_sums
+from .views import EXPORT_FIELDS, STREAM_CHUNK_SIZE, get_filtered_transactions, get_statistic_data, \
+    parse_date_range, stream_csv, stream_ndjson
+
+# The tasks of the jobs, see hbm.jobs.JOB_TASKS. Each takes the claimed job and returns its JSON result.
+
+
+def statistics_job(job: Job) -> list:
+    """
+    Task computing the statistics of the account for the transaction_start_date and transaction_end_date parameters
+    of the query, like the statistics page. They are the result of the job and do not warm the statistics cache, which
+    may be local to the worker process.
+    """
+    transaction_start_date, transaction_end_date = parse_date_range(QueryDict(job.job_params.get('query', '')))
+    return get_statistic_data(ledger_sums(job.job_account, transaction_start_date, transaction_end_date))
+
+
+def export_job(job: Job) -> dict:
+    """
+    Task writing the transactions selected by the filter parameters of the query to a CSV or NDJSON file of the job
+    storage, row by row like the export view.
+    :return: A dict with the name of the file in the job storage, its format and its number of rows.
+    :raises ValueError: If the export format is unknown.
+    """
+    params = QueryDict(job.job_params.get('query', ''))
+    export_format = params.get('export_format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        raise ValueError('Unknown export format')
+    exported = 0
+
+    def counted(rows):
+        nonlocal exported
+        for row in rows:
+            exported += 1
+            yield row
+
+    rows = counted(get_filtered_transactions(params, job.job_account).order_by('-transaction_date', '-id').values_list(
+        *EXPORT_FIELDS).iterator(chunk_size=STREAM_CHUNK_SIZE))
+    storage = job_storage()
+    name = storage.get_available_name(f'exports/transactions-{job.pk}.{export_format}')
+    os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+    with open(storage.path(name), 'w', encoding='utf-8', newline='') as file:
+        file.writelines(stream_csv(rows) if export_format == 'csv' else stream_ndjson(rows))
+    return {'file': name, 'format': export_format, 'rows': exported}
+
+
+def import_job(job: Job) -> dict:
+    """
+    Task importing the uploaded CSV or OFX file saved in the job storage into the account, like the import view,
+    then deleting the file.
+    :return: The result of import_transactions().
+    """
+    storage = job_storage()
+    name = job.job_params['file']
+    try:
+        with storage.open(name, 'rb') as upload:
+            file = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+            if job.job_params.get('format') == 'ofx':
+                rows = parse_ofx(file, job.job_params['category'])
+            else:
+                rows = parse_csv(file)
+            return import_transactions(job.job_account, rows)
+    finally:
+        storage.delete(name)
+
+
+def reconcile_job(job: Job) -> dict:
+    """
+    Task reconciling the balances of all accounts, see reconcile_balances(), with the fix and incremental parameters.
+    """
+    return reconcile_balances(bool(job.job_params.get('fix')), bool(job.job_params.get('incremental')))
@@ -0,0 +1,13 @@
+from django import template
+
+from hbm.categories import get_category_name
+
+register = template.Library()
+
+
+@register.filter
+def category_name(category_id: int) -> str:
+    """
+    Filter resolving a category ID to its name from the category registry, without a query.
+    """
+    return get_category_name(category_id)
@@ -1,10 +1,48 @@
 from decimal import Decimal
+from unittest import mock, skipUnless
 
-from django.test import TestCase
-from django.contrib.auth.models import User
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, DatabaseError
+from django.db.models import Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, Client, AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User, AnonymousUser
+from asgiref.sync import sync_to_async
 from datetime import date, timedelta
-from .models import Account, TransactionCategory, Transaction, PlanningTransaction
+import io
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from .models import Account, TransactionCategory, Transaction, PlanningTransaction, TransactionRollup, Job
 from .forms import TransactionForm, PlanningTransactionForm
+from .importers import import_transactions, parse_csv, parse_ofx
+from .budget import budget_report
+from .categories import get_categories, get_category_name, get_transfer_categories, invalidate_categories
+from .forecast import forecast
+from .rollups import rebuild_rollups, rollup_sums, arollup_sums, apply_to_rollup, account_sums
+from . import async_views
+from .load_test import percentile
+from .reconciliation import reconcile_balances
+from .jobs import MAX_JOB_ATTEMPTS, claim_jobs, enqueue_job, job_storage, requeue_stale_jobs, run_worker, \
+    touch_job
+from .ledger import delete_batch, save_batch, transfer
+from .profiling import get_metrics, reset_metrics
+from .views import get_statistic_data
+from .benchmarks.concurrency import read_write_benchmark
+from .benchmarks.generator import create_accounts, generate_transactions, load_categories
+from .benchmarks.runner import BENCHMARK_VIEWS, compare_results, run_benchmarks
+from .recurrence import occurrences, validate_cron_rule
+from .search import rebuild_search_index, search_transactions
+from .snapshot import clear_snapshots, compare_sums, get_snapshot, ledger_sums, np
+from .scheduler import PlansClaimed, due_plans, materialize_batch, materialize_plans
+from .statistics_cache import bump_statistics_version, get_statistics_cache_counters
 from django.utils import timezone
 
 
@@ -212,3 +250,2314 @@ class PlanningTransactionFormTest(TestCase):
         form = PlanningTransactionForm(data={'transaction_date_plan': date_test})
         form.is_valid()
         self.assertIsNone(form.errors.get('transaction_date_plan'))
+
+
+class TransactionStatisticsQueryTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.client.force_login(self.user)
+
+    def create_transactions(self, categories_count, rows_per_category):
+        """
+        Helper that creates the given number of categories with an expense and an income row for each of them.
+        """
+        categories = TransactionCategory.objects.bulk_create(
+            TransactionCategory(category_type=0, category_name=f'category {i}') for i in range(categories_count))
+        # bulk_create() sends no post_save signal, so the category registry and the statistics are invalidated by hand.
+        invalidate_categories()
+        get_categories()
+        bump_statistics_version(self.account.pk)
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2, transaction_category=c,
+                        transaction_date=date.today(), transaction_sum=Decimal('1.50'), transaction_comment='test')
+            for c in categories for i in range(rows_per_category))
+        rebuild_rollups()
+
+    def test_statistics_totals(self):
+        """
+        This test checks that the statistics view returns Decimal totals for income, expense and each category.
+        """
+        self.create_transactions(2, 2)
+        response = self.client.get('/transaction_statistics/')
+        statistic_data = response.context['statistic_data']
+        self.assertEqual(statistic_data[0], {'overall_income': Decimal('3.00')})
+        self.assertEqual(statistic_data[1], {'overall_expense': Decimal('3.00')})
+        self.assertCountEqual(statistic_data[2:], [{'category 0': Decimal('3.00')}, {'category 1': Decimal('3.00')}])
+
+    def test_statistics_query_count_is_constant(self):
+        """
+        This test checks that the number of queries does not grow with the number of categories and rows.
+        """
+        for categories_count, rows_per_category in ((1, 1), (10, 10), (50, 40)):
+            Transaction.objects.all().delete()
+            self.create_transactions(categories_count, rows_per_category)
+            with self.assertNumQueries(4):
+                response = self.client.get('/transaction_statistics/')
+            self.assertEqual(len(response.context['statistic_data']), categories_count + 2)
+
+
+class TransactionRollupTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account, a category and transactions spread over three
+        years.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.client.force_login(self.user)
+        start = date(2020, 1, 1)
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2, transaction_category=self.category,
+                        transaction_date=start + timedelta(days=i), transaction_sum=Decimal(i % 7 + 1),
+                        transaction_comment='test')
+            for i in range(3 * 365))
+        rebuild_rollups()
+        get_categories()
+        caches['statistics'].clear()
+
+    def expected_sums(self, start_date, end_date):
+        """
+        Helper that computes the income and expense totals of a date range from the raw transactions.
+        """
+        transactions = Transaction.objects.filter(transaction_date__range=[start_date or date.min, end_date or date.max])
+        return [sum((t.transaction_sum for t in transactions if t.transaction_type == transaction_type), Decimal(0))
+                for transaction_type in (1, 0)]
+
+    def test_rollup_sums_match_raw_transactions(self):
+        """
+        This test checks that sums over ranges with partial and whole months equal the sums of the raw transactions.
+        """
+        for start_date, end_date in ((date(2020, 1, 15), date(2022, 6, 10)), (date(2020, 3, 1), date(2021, 2, 28)),
+                                     (date(2021, 5, 3), date(2021, 5, 20)), (date(2020, 12, 31), date(2021, 1, 1)),
+                                     (date(2021, 5, 3), None), (None, date(2021, 5, 20)), (None, None)):
+            sums = rollup_sums(self.account, start_date, end_date)
+            income = sum((row['total'] for row in sums if row['type'] == 1), Decimal(0))
+            expense = sum((row['total'] for row in sums if row['type'] == 0), Decimal(0))
+            self.assertEqual([income, expense], self.expected_sums(start_date, end_date))
+
+    def test_add_and_del_transaction_update_rollup(self):
+        """
+        This test checks that adding and deleting a transaction through the views keeps the rollup up to date.
+        """
+        self.client.post('/add_transaction/', {'transaction_type': 1, 'transaction_category': self.category.pk,
+                                               'transaction_date': '2021-05-10', 'transaction_sum': '100.00',
+                                               'transaction_comment': 'test'})
+        rollup = TransactionRollup.objects.get(rollup_month=date(2021, 5, 1), rollup_type=1)
+        expected = self.expected_sums(date(2021, 5, 1), date(2021, 5, 31))[0]
+        self.assertEqual(rollup.rollup_sum, expected)
+        transaction = Transaction.objects.get(transaction_sum=Decimal('100.00'))
+        self.client.post(f'/del_transaction/{transaction.pk}')
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.rollup_sum, expected - Decimal('100.00'))
+
+    def test_statistics_query_count_does_not_depend_on_range(self):
+        """
+        This test checks that a multi-year statistics request costs the same number of queries as a short one when
+        the sums are read from the rollups.
+        """
+        for start_date, end_date in (('2020-01-05', '2020-03-25'), ('2020-01-05', '2022-12-25')):
+            with self.assertNumQueries(5):
+                self.client.get('/transaction_statistics/',
+                                {'transaction_start_date': start_date, 'transaction_end_date': end_date})
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Reads the SQLite EXPLAIN QUERY PLAN output')
+class TransactionIndexTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user and an account.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+
+    def test_latest_uses_account_date_index(self):
+        """
+        This test checks that the latest transactions query reads the (account, -date) index instead of sorting.
+        """
+        plan = Transaction.objects.filter(transaction_account=self.account).order_by('-transaction_date')[:10].explain()
+        self.assertIn('transaction_account_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_type_and_date_filter_uses_index(self):
+        """
+        This test checks that filtering by type and date range reads the (account, type, date) index.
+        """
+        plan = Transaction.objects.filter(transaction_account=self.account, transaction_type=0,
+                                          transaction_date__range=[date(2020, 1, 1), date(2021, 1, 1)]).explain()
+        self.assertIn('transaction_acc_type_date_idx', plan)
+
+    def test_planned_transactions_use_account_date_index(self):
+        """
+        This test checks that the planned transactions query reads the (account, -date) index instead of sorting.
+        """
+        plan = PlanningTransaction.objects.filter(transaction_account_plan=self.account).order_by(
+            '-transaction_date_plan').explain()
+        self.assertIn('planning_account_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ConcurrentBalanceTest(TransactionTestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user, an account and a category, and logs in one client per worker thread.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.clients = [Client() for _ in range(8)]
+        for client in self.clients:
+            client.force_login(self.user)
+
+    def run_in_threads(self, requests):
+        """
+        Helper that runs (client index, method, path, data) requests on a thread pool, one database connection per
+        thread.
+        """
+        def run(request):
+            index, method, path, data = request
+            try:
+                return getattr(self.clients[index % len(self.clients)], method)(path, data).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
+            return list(executor.map(run, requests))
+
+    @skipUnless(connection.vendor != 'sqlite' or not connection.is_in_memory_db(),
+                'Needs a file-backed database shared by the threads')
+    def test_parallel_add_and_delete_keep_balance(self):
+        """
+        This test fires parallel add and delete requests, including duplicate deletes, and checks that the final
+        balance equals the sum of the remaining transactions.
+        """
+        self.run_in_threads([
+            (i, 'post', '/add_transaction/', {'transaction_type': i % 2, 'transaction_category': self.category.pk,
+                                              'transaction_date': date.today(), 'transaction_sum': f'{i + 1}.25',
+                                              'transaction_comment': 'test'})
+            for i in range(40)])
+        self.assertEqual(Transaction.objects.count(), 40)
+        to_delete = list(Transaction.objects.values_list('pk', flat=True)[:20])
+        self.run_in_threads([(i, 'post', f'/del_transaction/{pk}', {}) for i, pk in enumerate(to_delete * 2)])
+
+        self.account.refresh_from_db()
+        expected = sum((t.transaction_sum if t.transaction_type == 1 else -t.transaction_sum
+                        for t in Transaction.objects.all()), Decimal(0))
+        self.assertEqual(Transaction.objects.count(), 20)
+        self.assertEqual(self.account.account_balance, expected)
+
+    @skipUnless(connection.vendor != 'sqlite' or not connection.is_in_memory_db(),
+                'Needs a file-backed database shared by the threads')
+    def test_parallel_batch_deletes_keep_balance(self):
+        """
+        This test runs overlapping batch deletes in parallel and checks that each transaction is taken out of the
+        balance and the rollup once.
+        """
+        save_batch(self.account, [
+            Transaction(transaction_type=i % 2, transaction_category=self.category, transaction_date=date.today(),
+                        transaction_sum=Decimal(f'{i + 1}.25'), transaction_comment='test') for i in range(40)])
+        ids = list(Transaction.objects.values_list('pk', flat=True))
+
+        def run(batch):
+            try:
+                return delete_batch(Account.objects.get(pk=self.account.pk), batch)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
+            deleted = sum(executor.map(run, [ids[:30], ids[10:], ids[:20], ids[20:]] * 2))
+        self.assertEqual(deleted, 40)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('0.00'))
+        self.assertFalse(TransactionRollup.objects.filter(rollup_planned=False).exclude(rollup_count=0).exists())
+
+    @skipUnless(connection.vendor != 'sqlite' or not connection.is_in_memory_db(),
+                'Needs a file-backed database shared by the threads')
+    def test_parallel_plan_deletes_keep_rollup(self):
+        """
+        This test fires duplicate parallel deletes of planned transactions and checks that each one is taken out of
+        the planned rollup once.
+        """
+        save_batch(self.account, [
+            PlanningTransaction(transaction_type_plan=0, transaction_category_plan=self.category,
+                                transaction_date_plan=date.today(), transaction_sum_plan=Decimal(f'{i + 1}.00'),
+                                transaction_comment_plan='plan') for i in range(10)], planned=True)
+        to_delete = list(PlanningTransaction.objects.values_list('pk', flat=True)[:5])
+        self.run_in_threads([(i, 'post', f'/planned/del_scheduled_transaction/{pk}', {})
+                             for i, pk in enumerate(to_delete * 3)])
+        self.assertEqual(PlanningTransaction.objects.count(), 5)
+        self.assertEqual(rollup_sums(self.account, planned=True)[0]['total'],
+                         PlanningTransaction.objects.aggregate(total=Sum('transaction_sum_plan'))['total'])
+
+
+class FilterPaginationTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account and 120 transactions, several per day.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.client.force_login(self.user)
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2, transaction_category=self.category,
+                        transaction_date=date(2022, 1, 1) + timedelta(days=i // 3), transaction_sum=Decimal('1.00'),
+                        transaction_comment=f'comment {i}')
+            for i in range(120))
+
+    def test_keyset_pages_cover_all_transactions(self):
+        """
+        This test follows the next page cursors and checks that every transaction is listed exactly once, newest first.
+        """
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get('/filter/', params)
+            seen.extend(response.context['transactions'])
+            if 'next_page_query' not in response.context:
+                break
+            params = QueryDict(response.context['next_page_query'])
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(len({t.pk for t in seen}), 120)
+        self.assertEqual([(t.transaction_date, t.pk) for t in seen],
+                         sorted(((t.transaction_date, t.pk) for t in seen), reverse=True))
+
+    def test_keyset_page_keeps_filters(self):
+        """
+        This test checks that the next page cursor keeps the type filter.
+        """
+        response = self.client.get('/filter/', {'transaction_type': 'Income'})
+        self.assertEqual(len(response.context['transactions']), 50)
+        response = self.client.get('/filter/', QueryDict(response.context['next_page_query']))
+        self.assertEqual(len(response.context['transactions']), 10)
+        self.assertTrue(all(t.transaction_type == 1 for t in response.context['transactions']))
+
+    def test_invalid_cursor(self):
+        """
+        This test checks that a malformed cursor is rejected.
+        """
+        response = self.client.get('/filter/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_streaming_renders_all_transactions(self):
+        """
+        This test checks that the streaming mode renders every matching transaction in one response.
+        """
+        response = self.client.get('/filter/', {'stream': '1'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<td>comment'), 120)
+        self.assertIn('</html>', content)
+
+
+class ListQueryCountTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in superuser with an account and two categories.
+        """
+        self.user = User.objects.create_superuser(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.categories = [TransactionCategory.objects.create(category_type=0, category_name='food'),
+                           TransactionCategory.objects.create(category_type=1, category_name='salary')]
+        self.client.force_login(self.user)
+        get_categories()
+
+    def create_transactions(self, count):
+        """
+        Helper that replaces the account transactions and planned transactions with the given number of rows.
+        """
+        Transaction.objects.all().delete()
+        PlanningTransaction.objects.all().delete()
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2,
+                        transaction_category=self.categories[i % 2], transaction_date=date(2022, 1, 1),
+                        transaction_sum=Decimal('1.00'), transaction_comment='test')
+            for i in range(count))
+        PlanningTransaction.objects.bulk_create(
+            PlanningTransaction(transaction_account_plan=self.account, transaction_type_plan=i % 2,
+                                transaction_category_plan=self.categories[i % 2], transaction_date_plan=date.today(),
+                                transaction_sum_plan=Decimal('1.00'), transaction_comment_plan='test')
+            for i in range(count))
+
+    def assert_query_count(self, path, queries, params=None):
+        """
+        Helper that checks the query count of a page at 10, 1,000 and 10,000 rows.
+        """
+        for count in (10, 1000, 10000):
+            with self.subTest(count=count):
+                self.create_transactions(count)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(path, params)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+
+    def test_latest_query_count(self):
+        """
+        This test checks that the latest transactions page does not query per row.
+        """
+        self.assert_query_count('/latest/', 4)
+
+    def test_filter_query_count(self):
+        """
+        This test checks that the filter page does not query per row.
+        """
+        self.assert_query_count('/filter/', 4)
+
+    def test_filter_stream_query_count(self):
+        """
+        This test checks that the streaming filter page does not query per row.
+        """
+        self.assert_query_count('/filter/', 4, {'stream': '1'})
+
+    def test_planned_transactions_query_count(self):
+        """
+        This test checks that the planned transactions page does not query per row.
+        """
+        self.assert_query_count('/planned/transactions/', 4)
+
+    def test_admin_transaction_changelist_query_count(self):
+        """
+        This test checks that the transaction admin changelist does not query per row.
+        """
+        self.assert_query_count('/admin/hbm/transaction/', 5)
+
+    def test_admin_planning_transaction_changelist_query_count(self):
+        """
+        This test checks that the planned transaction admin changelist does not query per row.
+        """
+        self.assert_query_count('/admin/hbm/planningtransaction/', 5)
+
+
+class CategoryRegistryTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test category and loads the category registry.
+        """
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        get_categories()
+
+    def test_registry_does_not_query(self):
+        """
+        This test checks that a loaded registry resolves category names and renders form choices without queries.
+        """
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category_name(self.category.pk), 'food')
+            form = TransactionForm(initial={'transaction_category': self.category.pk})
+            self.assertIn('<option value="%d" selected>food</option>' % self.category.pk,
+                          str(form['transaction_category']))
+        form = TransactionForm(data={'transaction_category': self.category.pk, 'transaction_date': date.today()})
+        form.is_valid()
+        self.assertEqual(form.cleaned_data['transaction_category'], self.category)
+
+    def test_registry_is_invalidated_on_save_and_delete(self):
+        """
+        This test checks that saving and deleting a category updates the registry.
+        """
+        self.category.category_name = 'groceries'
+        self.category.save()
+        self.assertEqual(get_category_name(self.category.pk), 'groceries')
+        category_id = self.category.pk
+        self.category.delete()
+        self.assertNotIn(category_id, [category.pk for category in get_categories()])
+
+    def test_registry_follows_the_version_of_the_cache(self):
+        """
+        This test checks that a category changed by another process, which bumps the version of the shared cache,
+        the default one unless configured, is reloaded at the start of the next request, and that a change of this
+        process bumps the version too.
+        """
+        self.client.get('/')
+        for alias in ('default', 'statistics'):
+            with override_settings(HBM_CATEGORY_CACHE=alias):
+                caches[alias].clear()
+                self.client.get('/')
+                # Another process renames the category: no signal here, only the shared cache changes.
+                name = f'groceries {alias}'
+                TransactionCategory.objects.filter(pk=self.category.pk).update(category_name=name)
+                caches[alias].delete('hbm:categories')
+                caches[alias].set('hbm:categories-version', 0)
+                self.assertNotEqual(get_category_name(self.category.pk), name)
+                with self.assertNumQueries(1):
+                    self.client.get('/')
+                self.assertEqual(get_category_name(self.category.pk), name)
+                with self.captureOnCommitCallbacks(execute=True):
+                    TransactionCategory.objects.create(category_type=1, category_name='salary')
+                self.assertNotEqual(caches[alias].get('hbm:categories-version'), 0)
+
+    def test_unknown_category_is_invalid(self):
+        """
+        This test checks that the form rejects a category ID that does not exist.
+        """
+        form = TransactionForm(data={'transaction_category': self.category.pk + 100,
+                                     'transaction_date': date.today()})
+        self.assertIn('transaction_category', form.errors)
+
+
+class StatisticsCacheTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account, a category and one transaction, and clears the
+        statistics cache.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.client.force_login(self.user)
+        caches['statistics'].clear()
+        self.add_transaction('10.00')
+
+    def add_transaction(self, transaction_sum):
+        """
+        Helper that adds an income transaction through the view and runs the on-commit invalidation.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/add_transaction/', {'transaction_type': 1, 'transaction_category': self.category.pk,
+                                                   'transaction_date': date.today(), 'transaction_sum': transaction_sum,
+                                                   'transaction_comment': 'test'})
+
+    def get_income(self):
+        """
+        Helper that returns the overall income shown by the statistics view.
+        """
+        return self.client.get('/transaction_statistics/').context['statistic_data'][0]['overall_income']
+
+    def test_repeated_request_is_a_cache_hit(self):
+        """
+        This test checks that a repeated statistics request reads no transactions and counts a hit.
+        """
+        self.get_income()
+        counters = get_statistics_cache_counters()
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get_income(), Decimal('10.00'))
+        self.assertEqual(get_statistics_cache_counters()['hits'], counters['hits'] + 1)
+
+    def test_add_and_del_transaction_invalidate(self):
+        """
+        This test checks that adding and deleting a transaction invalidates the cached statistics.
+        """
+        self.assertEqual(self.get_income(), Decimal('10.00'))
+        self.add_transaction('5.00')
+        self.assertEqual(self.get_income(), Decimal('15.00'))
+        transaction = Transaction.objects.get(transaction_sum=Decimal('5.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/del_transaction/{transaction.pk}')
+        self.assertEqual(self.get_income(), Decimal('10.00'))
+
+    def test_write_of_another_process_invalidates(self):
+        """
+        This test checks that the statistics version is read from the database, so a write whose on-commit callbacks
+        never run in this process, as for a write made by another worker, invalidates its cached statistics.
+        """
+        self.assertEqual(self.get_income(), Decimal('10.00'))
+        save_batch(self.account, [Transaction(transaction_type=1, transaction_category=self.category,
+                                              transaction_date=date.today(), transaction_sum=Decimal('5.00'),
+                                              transaction_comment='test')])
+        self.assertEqual(self.get_income(), Decimal('15.00'))
+
+    def test_write_bumps_version_once(self):
+        """
+        This test checks that the version is bumped by the UPDATE of the balance, with no other UPDATE of the account.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.add_transaction('5.00')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "hbm_account"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('account_version', updates[0])
+        self.assertEqual(self.get_income(), Decimal('15.00'))
+
+    def test_admin_edit_invalidates(self):
+        """
+        This test checks that editing a transaction in the admin, which does not change the balance, invalidates the
+        cache.
+        """
+        self.assertEqual(self.get_income(), Decimal('10.00'))
+        admin_client = Client()
+        admin_client.force_login(User.objects.create_superuser(username='admin', password='12345'))
+        transaction = Transaction.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = admin_client.post(f'/admin/hbm/transaction/{transaction.pk}/change/', {
+                'transaction_account': self.account.pk, 'transaction_type': 1,
+                'transaction_category': self.category.pk, 'transaction_date': transaction.transaction_date,
+                'transaction_sum': '20.00', 'transaction_comment': 'test'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_income(), Decimal('20.00'))
+
+    def test_admin_writes_keep_rollups(self):
+        """
+        This test checks that adding, changing and deleting transactions and planned transactions in the admin, and
+        in the transaction inline of the account admin, keep the monthly rollup as a rebuild would leave it.
+        """
+        admin_client = Client()
+        admin_client.force_login(User.objects.create_superuser(username='admin', password='12345'))
+        transaction = Transaction.objects.get()
+        data = {'transaction_account': self.account.pk, 'transaction_type': 1,
+                'transaction_category': self.category.pk, 'transaction_date': date.today(),
+                'transaction_sum': '20.00', 'transaction_comment': 'test'}
+        plan = {'transaction_account_plan': self.account.pk, 'transaction_type_plan': 0,
+                'transaction_category_plan': self.category.pk, 'transaction_date_plan': date.today(),
+                'transaction_sum_plan': '7.00', 'transaction_comment_plan': 'plan',
+                'transaction_recurrence_plan': '', 'transaction_rule_plan': ''}
+        with self.captureOnCommitCallbacks(execute=True):
+            for url, post in ((f'/admin/hbm/transaction/{transaction.pk}/change/', data),
+                              ('/admin/hbm/transaction/add/', {**data, 'transaction_sum': '5.00'}),
+                              ('/admin/hbm/planningtransaction/add/', plan),
+                              ('/admin/hbm/planningtransaction/add/', {**plan, 'transaction_sum_plan': '3.00'})):
+                self.assertEqual(admin_client.post(url, post).status_code, 302)
+        self.assertEqual(self.get_income(), Decimal('25.00'))
+        added = Transaction.objects.exclude(pk=transaction.pk).get()
+        deleted_plan = PlanningTransaction.objects.get(transaction_sum_plan=Decimal('3.00'))
+        inline = {'account_owner': self.user.pk, 'account_number': self.account.account_number,
+                  'account_balance': '0.00', 'account_name': '', 'transaction_set-TOTAL_FORMS': 2,
+                  'transaction_set-INITIAL_FORMS': 2, 'transaction_set-MIN_NUM_FORMS': 0,
+                  'transaction_set-MAX_NUM_FORMS': 1000}
+        for number, (row, transaction_sum, delete) in enumerate(((transaction, '30.00', ''), (added, '5.00', 'on'))):
+            inline.update({f'transaction_set-{number}-{field}': value for field, value in data.items()})
+            inline.update({f'transaction_set-{number}-id': row.pk, f'transaction_set-{number}-DELETE': delete,
+                           f'transaction_set-{number}-transaction_sum': transaction_sum})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(admin_client.post(f'/admin/hbm/planningtransaction/{deleted_plan.pk}/delete/',
+                                               {'post': 'yes'}).status_code, 302)
+            self.assertEqual(admin_client.post(f'/admin/hbm/account/{self.account.pk}/change/', inline).status_code,
+                             302)
+        self.assertEqual(self.get_income(), Decimal('30.00'))
+        rollups = TransactionRollup.objects.filter(rollup_count__gt=0).values_list(
+            'rollup_planned', 'rollup_month', 'rollup_type', 'rollup_category', 'rollup_sum', 'rollup_count')
+        kept = sorted(rollups)
+        rebuild_rollups(self.account)
+        self.assertEqual(kept, sorted(rollups))
+        self.assertEqual([(row[0], row[4]) for row in kept], [(False, Decimal('30.00')), (True, Decimal('7.00'))])
+
+
+class ImportTransactionsTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account and two categories.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('100.00')
+        )
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.salary = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        self.client.force_login(self.user)
+
+    def test_csv_upload(self):
+        """
+        This test uploads a CSV file with valid and invalid rows and checks the imported rows, the balance and the
+        rollup.
+        """
+        tomorrow = date.today() + timedelta(days=1)
+        content = ('transaction_date,transaction_type,transaction_category,transaction_sum,transaction_comment\n'
+                   '2023-01-05,Expense,food,10.50,bread\n'
+                   f'2023-01-06,1,{self.salary.pk},1000.00,salary\n'
+                   f'{tomorrow},Expense,food,1.00,future\n'
+                   '2023-01-07,Expense,unknown,1.00,bad category\n'
+                   '2023-01-08,Expense,food,-5,negative\n')
+        response = self.client.post('/import/', {
+            'import_file': SimpleUploadedFile('bank.csv', content.encode()), 'import_format': 'csv'})
+        result = response.context['result']
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['error_count'], 3)
+        self.assertTrue(result['errors'][0].startswith('Line 3:'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('1089.50'))
+        self.assertEqual(Transaction.objects.get(transaction_comment='bread').transaction_category, self.food)
+        self.assertEqual(TransactionRollup.objects.get(rollup_type=1).rollup_sum, Decimal('1000.00'))
+
+    def test_ofx_parsing(self):
+        """
+        This test checks that OFX statement entries are parsed into rows with the sign giving the type.
+        """
+        content = ('OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+                   '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20230105120000\n<TRNAMT>-12.50\n<NAME>Shop\n'
+                   '<MEMO>Bread</STMTTRN>\n'
+                   '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20230110<TRNAMT>500.00<NAME>Employer</STMTTRN>\n'
+                   '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n')
+        rows = list(parse_ofx(io.StringIO(content), self.food.pk))
+        self.assertEqual(rows, [
+            {'transaction_date': '2023-01-05', 'transaction_type': 0, 'transaction_category': self.food.pk,
+             'transaction_sum': '12.50', 'transaction_comment': 'Shop Bread'},
+            {'transaction_date': '2023-01-10', 'transaction_type': 1, 'transaction_category': self.food.pk,
+             'transaction_sum': '500.00', 'transaction_comment': 'Employer'},
+        ])
+        result = import_transactions(self.account, rows)
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(Transaction.objects.get(transaction_comment='Shop Bread').transaction_date, date(2023, 1, 5))
+
+    def test_batches_use_constant_queries(self):
+        """
+        This test checks that each batch costs a fixed number of queries, whatever its size.
+        """
+        get_categories()
+        rows = [{'transaction_date': '2023-01-05', 'transaction_type': '0', 'transaction_category': 'food',
+                 'transaction_sum': '1.00', 'transaction_comment': 'test'}] * 300
+        with CaptureQueriesContext(connection) as queries:
+            result = import_transactions(self.account, iter(rows), batch_size=100)
+        self.assertEqual(result['imported'], 300)
+        statements = [query['sql'].split()[0] for query in queries]
+        # Per batch: one balance UPDATE, one INSERT of the transactions and one rollup UPDATE (or INSERT).
+        self.assertEqual(statements.count('UPDATE'), 3 * 2)
+        self.assertEqual(statements.count('INSERT'), 3 + 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('-200.00'))
+
+
+class ExportTransactionsTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account, a category and two transactions.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.client.force_login(self.user)
+        self.create_transactions(2)
+
+    def create_transactions(self, count):
+        """
+        Helper that replaces the account transactions with the given number of rows.
+        """
+        Transaction.objects.all().delete()
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2, transaction_category=self.category,
+                        transaction_date=date(2023, 1, 1) + timedelta(days=i % 300),
+                        transaction_sum=Decimal('12.50'), transaction_comment=f'comment, {i}')
+            for i in range(count))
+
+    def export(self, params=None):
+        """
+        Helper that returns the streamed export content.
+        """
+        response = self.client.get('/export/', params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_can_be_imported(self):
+        """
+        This test checks that the CSV export has the import columns and can be read back by the CSV import.
+        """
+        rows = list(parse_csv(io.StringIO(self.export())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0], {'transaction_date': '2023-01-02', 'transaction_type': 'Income',
+                                   'transaction_category': 'food', 'transaction_sum': '12.50',
+                                   'transaction_comment': 'comment, 1'})
+        result = import_transactions(self.account, rows)
+        self.assertEqual(result['imported'], 2)
+
+    def test_ndjson_export_uses_filters(self):
+        """
+        This test checks that the NDJSON export applies the filter parameters.
+        """
+        lines = self.export({'export_format': 'ndjson', 'transaction_type': 'Expense'}).splitlines()
+        self.assertEqual([json.loads(line)['transaction_comment'] for line in lines], ['comment, 0'])
+
+    def test_unknown_format(self):
+        """
+        This test checks that an unknown export format is rejected.
+        """
+        self.assertEqual(self.client.get('/export/', {'export_format': 'xml'}).status_code, 400)
+
+    def test_invalid_filter(self):
+        """
+        This test checks that an invalid date or category is rejected by the export and the filter page, and that a
+        date given alone filters the transactions.
+        """
+        for params in ({'transaction_start_date': 'bad'}, {'transaction_end_date': '2023-02-30'},
+                       {'transaction_category': 'abc'}):
+            for url in ('/export/', '/filter/'):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        lines = self.export({'export_format': 'ndjson', 'transaction_start_date': '2023-01-02'}).splitlines()
+        self.assertEqual([json.loads(line)['transaction_comment'] for line in lines], ['comment, 1'])
+
+    def test_export_memory_is_flat(self):
+        """
+        This benchmark measures the export rate in rows per second and checks that the memory peak while streaming
+        does not grow with the number of rows.
+        """
+        peaks = []
+        for count in (2000, 20000):
+            self.create_transactions(count)
+            response = self.client.get('/export/')
+            tracemalloc.start()
+            started = time.perf_counter()
+            exported = sum(chunk.count(b'\n') for chunk in response.streaming_content) - 1
+            rows_per_second = exported / (time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            self.assertEqual(exported, count, f'{rows_per_second:.0f} rows/s')
+        self.assertLess(peaks[1], peaks[0] * 2)
+
+
+class TransactionApiTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account and two categories.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('100.00')
+        )
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.salary = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        invalidate_categories()
+        self.client.force_login(self.user)
+
+    def post_json(self, url, body):
+        """
+        Helper that posts a JSON body.
+        """
+        return self.client.post(url, json.dumps(body), content_type='application/json')
+
+    def test_anonymous_request_gets_401(self):
+        """
+        This test checks that the API answers anonymous requests with 401 instead of a login redirect.
+        """
+        self.client.logout()
+        response = self.client.get('/api/transactions/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_batch_create_changes_balance_once(self):
+        """
+        This test checks that a batch is saved with the rollup and the balance changed by a single UPDATE.
+        """
+        rows = [{'transaction_type': 'Income', 'transaction_category': 'salary', 'transaction_date': '2023-01-10',
+                 'transaction_sum': '50.00', 'transaction_comment': 'pay'}] + [
+            {'transaction_type': 0, 'transaction_category': self.food.pk, 'transaction_date': '2023-01-11',
+             'transaction_sum': '10.00', 'transaction_comment': f'row {i}'} for i in range(20)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_json('/api/transactions/batch/', {'transactions': rows})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['created'], 21)
+        self.assertEqual(len(response.json()['ids']), 21)
+        balance_updates = [query for query in queries.captured_queries
+                           if query['sql'].startswith('UPDATE') and 'account_balance' in query['sql']]
+        self.assertEqual(len(balance_updates), 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('-50.00'))
+        incremental = sorted(map(str, TransactionRollup.objects.values_list('rollup_sum', flat=True)))
+        rebuild_rollups(self.account)
+        self.assertEqual(incremental, ['200.00', '50.00'])
+        self.assertEqual(sorted(map(str, TransactionRollup.objects.values_list('rollup_sum', flat=True))),
+                         incremental)
+
+    def test_batch_create_is_all_or_nothing(self):
+        """
+        This test checks that one invalid row rejects the whole batch with its error.
+        """
+        rows = [{'transaction_type': 0, 'transaction_category': self.food.pk, 'transaction_date': '2023-01-11',
+                 'transaction_sum': '10.00', 'transaction_comment': 'lunch'},
+                {'transaction_type': 0, 'transaction_category': self.food.pk, 'transaction_date': '2023-01-11',
+                 'transaction_sum': '-1', 'transaction_comment': 'refund'}]
+        response = self.post_json('/api/transactions/batch/', {'transactions': rows})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['errors'][0].startswith('Line 2:'))
+        self.assertFalse(Transaction.objects.exists())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('100.00'))
+
+    def test_batch_delete_restores_balance(self):
+        """
+        This test checks that a batch delete reverts the balance and the rollup and ignores IDs of other accounts.
+        """
+        rows = [{'transaction_type': transaction_type, 'transaction_category': self.food.pk,
+                 'transaction_date': '2023-02-01', 'transaction_sum': '30.00', 'transaction_comment': 'shop'} for transaction_type in (0, 1, 0)]
+        ids = self.post_json('/api/transactions/batch/', {'transactions': rows}).json()['ids']
+        other_user = User.objects.create_user(username='other', password='12345')
+        other_account = Account.objects.create(account_owner=other_user, account_number='2',
+                                               account_balance=Decimal('0.00'))
+        other = Transaction.objects.create(transaction_account=other_account, transaction_type=0,
+                                           transaction_category=self.food, transaction_date=date(2023, 2, 1),
+                                           transaction_sum=Decimal('5.00'))
+        response = self.post_json('/api/transactions/batch_delete/', {'ids': ids[:2] + [other.pk]})
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('70.00'))
+        self.assertTrue(Transaction.objects.filter(pk=other.pk).exists())
+        self.assertEqual([row['total'] for row in rollup_sums(self.account)], [Decimal('30.00')])
+        for invalid_ids in ([True], [ids[2], '1'], [1.0]):
+            response = self.post_json('/api/transactions/batch_delete/', {'ids': invalid_ids})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Transaction.objects.filter(transaction_account=self.account).count(), 1)
+
+    def test_batch_delete_costs_constant_queries(self):
+        """
+        This test checks that a batch delete costs the same number of queries whatever its size, removes the
+        transactions from the search index and deletes nothing the second time.
+        """
+        counts = []
+        for size in (5, 50):
+            saved = save_batch(self.account, [
+                Transaction(transaction_type=0, transaction_category=self.food, transaction_date=date(2023, 3, 1),
+                            transaction_sum=Decimal('1.00'), transaction_comment='coffee') for _ in range(size)])
+            ids = [transaction.pk for transaction in saved]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(delete_batch(self.account, ids), size)
+            counts.append(len(queries))
+            self.assertEqual(delete_batch(self.account, ids), 0)
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(search_transactions(Transaction.objects.all(), self.account, 'coffee').exists())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('100.00'))
+
+    def test_list_pages_with_cursor(self):
+        """
+        This test checks that the list walks all filtered transactions page by page, newest first.
+        """
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2, transaction_category=self.food,
+                        transaction_date=date(2023, 1, 1) + timedelta(days=i % 7), transaction_sum=Decimal('1.00'))
+            for i in range(25))
+        seen = []
+        params = {'limit': 10, 'transaction_type': 'Expense'}
+        while True:
+            body = self.client.get('/api/transactions/', params).json()
+            seen.extend(body['results'])
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(len(seen), 13)
+        self.assertEqual(len({row['id'] for row in seen}), 13)
+        self.assertEqual(seen, sorted(seen, key=lambda row: (row['transaction_date'], row['id']), reverse=True))
+        self.assertEqual(self.client.get('/api/transactions/', {'cursor': 'bad'}).status_code, 400)
+
+    def test_planned_batch_does_not_change_balance(self):
+        """
+        This test checks that planned transactions are created and deleted without changing the balance.
+        """
+        future = (date.today() + timedelta(days=10)).isoformat()
+        rows = [{'transaction_type_plan': 0, 'transaction_category_plan': self.food.pk,
+                 'transaction_date_plan': future, 'transaction_sum_plan': '15.00', 'transaction_comment_plan': 'rent'}] * 2
+        ids = self.post_json('/api/planned/batch/', {'transactions': rows}).json()['ids']
+        self.assertEqual(len(self.client.get('/api/planned/').json()['results']), 2)
+        self.assertEqual(self.post_json('/api/planned/batch_delete/', {'ids': ids}).json(), {'deleted': 2})
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('100.00'))
+        self.assertFalse(PlanningTransaction.objects.exists())
+
+    def test_summary(self):
+        """
+        This test checks that the summary has the balance and the statistics of the period.
+        """
+        caches['statistics'].clear()
+        self.post_json('/api/transactions/batch/', {'transactions': [
+            {'transaction_type': 1, 'transaction_category': self.salary.pk, 'transaction_date': '2023-03-05',
+             'transaction_sum': '40.00', 'transaction_comment': 'bonus'}]})
+        body = self.client.get('/api/summary/', {'transaction_start_date': '2023-03-01',
+                                                 'transaction_end_date': '2023-03-31'}).json()
+        self.assertEqual(body['account_balance'], '140.00')
+        self.assertEqual(Decimal(body['statistics'][0]['overall_income']), Decimal('40.00'))
+        self.assertEqual(Decimal(body['statistics'][2]['salary']), Decimal('40.00'))
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user with an account, a category, transactions and a planned transaction.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('0.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        invalidate_categories()
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.account, transaction_type=i % 2, transaction_category=self.category,
+                        transaction_date=date(2023, 1, 1) + timedelta(days=i), transaction_sum=Decimal('10.00'),
+                        transaction_comment=f'comment {i}')
+            for i in range(60))
+        rebuild_rollups(self.account)
+        PlanningTransaction.objects.create(transaction_account_plan=self.account, transaction_type_plan=0,
+                                           transaction_category_plan=self.category,
+                                           transaction_date_plan=date.today() + timedelta(days=5),
+                                           transaction_sum_plan=Decimal('5.00'), transaction_comment_plan='rent')
+        self.factory = AsyncRequestFactory()
+
+    def get(self, path, params=None, user=None):
+        """
+        Helper that builds an async GET request for the user.
+        """
+        request = self.factory.get(path, params)
+        request.user = user or self.user
+        return request
+
+    async def test_pages_render(self):
+        """
+        This test checks that the async read views render the same data as the sync ones.
+        """
+        response = await async_views.latest(self.get('/latest/'))
+        self.assertContains(response, 'comment 59')
+        response = await async_views.planned_transactions(self.get('/planned/transactions/'))
+        self.assertContains(response, 'rent')
+        response = await async_views.home(self.get('/'))
+        self.assertContains(response, 'testuser')
+
+    async def test_anonymous_user_is_redirected(self):
+        """
+        This test checks that anonymous users are redirected to the login page.
+        """
+        response = await async_views.latest(self.get('/latest/', user=AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login'))
+        response = await async_views.home(self.get('/', user=AnonymousUser()))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_filter_pages_and_stream(self):
+        """
+        This test checks that the async filter pages with the cursor and streams all rows.
+        """
+        response = await async_views.filter(self.get('/filter/'))
+        self.assertContains(response, 'comment 59')
+        self.assertNotContains(response, 'comment 9<')
+        self.assertContains(response, 'cursor=')
+        response = await async_views.filter(self.get('/filter/', {'cursor': 'bad'}))
+        self.assertEqual(response.status_code, 400)
+        response = await async_views.filter(self.get('/filter/', {'stream': '1'}))
+        content = ''.join([chunk.decode() async for chunk in response])
+        self.assertEqual(content.count('comment '), 60)
+
+    async def test_statistics_match_sync(self):
+        """
+        This test checks that the async statistics are the same as the sync ones.
+        """
+        caches['statistics'].clear()
+        start, end = date(2023, 1, 15), date(2023, 2, 20)
+        expected = await sync_to_async(rollup_sums)(self.account, start, end)
+        self.assertEqual(await arollup_sums(self.account, start, end), expected)
+        response = await async_views.transaction_statistics(self.get(
+            '/transaction_statistics/', {'transaction_start_date': '2023-01-15', 'transaction_end_date': '2023-02-20'}))
+        self.assertContains(response, 'food')
+        with override_settings(HBM_LEDGER_SNAPSHOTS=True):
+            response = await async_views.transaction_statistics(self.get(
+                '/transaction_statistics/', {'transaction_end_date': '2023-02-20'}))
+        self.assertContains(response, 'food')
+        response = await async_views.transaction_statistics(self.get(
+            '/transaction_statistics/', {'transaction_start_date': 'bad'}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_percentile(self):
+        """
+        This test checks the nearest-rank percentile of the load-test harness.
+        """
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile([3], 0.99), 3)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+
+class RequestAccountTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account and a category.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(
+            account_owner=self.user,
+            account_number='1234567890',
+            account_balance=Decimal('100.00')
+        )
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        get_categories()
+        self.client.force_login(self.user)
+        caches['default'].clear()
+
+    def account_queries(self, path):
+        """
+        Helper that requests the page and returns the number of queries reading the account table.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return sum('FROM "hbm_account"' in query['sql'] for query in queries.captured_queries)
+
+    def test_account_is_read_once_per_request(self):
+        """
+        This test checks that the view and the header share one account query.
+        """
+        self.assertEqual(self.account_queries('/latest/'), 1)
+        self.assertContains(self.client.get('/latest/'), 'Your balance: 100.00')
+
+    @override_settings(HBM_ACCOUNT_CACHE='default')
+    def test_cached_account_is_invalidated_on_balance_change(self):
+        """
+        This test checks that a configured account cache saves the account query and is invalidated by a balance
+        change.
+        """
+        self.assertEqual(self.account_queries('/latest/'), 1)
+        self.assertEqual(self.account_queries('/latest/'), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/add_transaction/', {'transaction_type': 0, 'transaction_category': self.category.pk,
+                                                   'transaction_date': '2023-01-10', 'transaction_sum': '30.00',
+                                                   'transaction_comment': 'lunch'})
+        self.assertContains(self.client.get('/latest/'), 'Your balance: 70.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.account.account_number = '42'
+            self.account.save()
+        self.assertEqual(self.account_queries('/latest/'), 1)
+
+    def test_user_without_account_gets_404(self):
+        """
+        This test checks that pages of a user without an account answer 404.
+        """
+        user = User.objects.create_user(username='noaccount', password='12345')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/latest/').status_code, 404)
+
+
+class ReconciliationTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates accounts whose balances match their transactions.
+        """
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.accounts = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'user{i}', password='12345')
+            account = Account.objects.create(account_owner=user, account_number=str(i),
+                                             account_balance=Decimal('15.00'))
+            Transaction.objects.create(transaction_account=account, transaction_type=1,
+                                       transaction_category=self.category, transaction_date=date(2023, 1, 1),
+                                       transaction_sum=Decimal('20.00'), transaction_comment='salary')
+            Transaction.objects.create(transaction_account=account, transaction_type=0,
+                                       transaction_category=self.category, transaction_date=date(2023, 1, 2),
+                                       transaction_sum=Decimal('5.00'), transaction_comment='lunch')
+            self.accounts.append(account)
+
+    def test_no_drift(self):
+        """
+        This test checks that matching balances are not reported.
+        """
+        result = reconcile_balances()
+        self.assertEqual(result['checked'], 3)
+        self.assertEqual(result['drift'], [])
+
+    def test_cents_are_not_drift(self):
+        """
+        This test checks that sums of cents that cancel out, inexact as floats, are not reported as drift.
+        """
+        sums = [Decimal(cents).scaleb(-2) for cents in random.Random(1).choices(range(100, 20000), k=300)]
+        Transaction.objects.bulk_create(
+            Transaction(transaction_account=self.accounts[0], transaction_type=transaction_type,
+                        transaction_category=self.category, transaction_date=date(2023, 1, 3),
+                        transaction_sum=transaction_sum, transaction_comment='test')
+            for transaction_type in (0, 1) for transaction_sum in sums)
+        self.assertEqual(reconcile_balances()['drift'], [])
+
+    def test_drift_is_reported_and_fixed(self):
+        """
+        This test checks that drifted balances, e.g. after an admin edit, are reported and fixed in bulk.
+        """
+        Account.objects.filter(pk=self.accounts[1].pk).update(account_balance=Decimal('99.99'))
+        empty = Account.objects.create(account_owner=User.objects.create_user(username='empty', password='12345'),
+                                       account_number='9', account_balance=Decimal('1.00'))
+        result = reconcile_balances()
+        self.assertEqual([(row['account'], row['drift']) for row in result['drift']],
+                         [(self.accounts[1].pk, Decimal('-84.99')), (empty.pk, Decimal('-1.00'))])
+        self.assertEqual(Account.objects.get(pk=empty.pk).account_balance, Decimal('1.00'))
+        result = reconcile_balances(fix=True)
+        self.assertEqual(result['fixed'], 2)
+        self.assertEqual(Account.objects.get(pk=self.accounts[1].pk).account_balance, Decimal('15.00'))
+        self.assertEqual(Account.objects.get(pk=empty.pk).account_balance, Decimal('0.00'))
+        self.assertEqual(reconcile_balances()['drift'], [])
+
+    def test_incremental_checks_accounts_after_watermark(self):
+        """
+        This test checks that an incremental run only checks the accounts with transactions after the watermark.
+        """
+        reconcile_balances()
+        Transaction.objects.create(transaction_account=self.accounts[2], transaction_type=0,
+                                   transaction_category=self.category, transaction_date=date(2023, 1, 3),
+                                   transaction_sum=Decimal('1.00'), transaction_comment='added by the admin')
+        result = reconcile_balances(incremental=True)
+        self.assertEqual(result['checked'], 1)
+        self.assertEqual(result['drift'][0]['drift'], Decimal('-1.00'))
+        reconcile_balances(fix=True, incremental=True)
+        self.assertEqual(reconcile_balances(incremental=True)['checked'], 0)
+
+    def test_query_count_does_not_grow_with_accounts(self):
+        """
+        This test checks that the check and the fix cost the same number of queries for any number of accounts
+        within a batch.
+        """
+        reconcile_balances()
+        counts = []
+        for count in (10, 800):
+            User.objects.bulk_create(User(username=f'bulk{count}-{i}') for i in range(count))
+            Account.objects.bulk_create(Account(account_owner=user, account_number='0', account_balance=Decimal('3'))
+                                        for user in User.objects.filter(username__startswith=f'bulk{count}-'))
+            with CaptureQueriesContext(connection) as queries:
+                result = reconcile_balances(fix=True)
+            self.assertEqual(result['fixed'], count)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class RecurrenceTest(TestCase):
+    def test_monthly_keeps_day_and_clamps(self):
+        """
+        This test checks that monthly occurrences keep the start day and are clamped to shorter months.
+        """
+        days = list(occurrences(date(2023, 1, 31), 'monthly', '', date(2023, 1, 30), date(2023, 5, 1)))
+        self.assertEqual(days, [date(2023, 1, 31), date(2023, 2, 28), date(2023, 3, 31), date(2023, 4, 30)])
+        days = list(occurrences(date(2023, 1, 31), 'monthly', '', date(2023, 3, 31), date(2023, 6, 30)))
+        self.assertEqual(days, [date(2023, 4, 30), date(2023, 5, 31), date(2023, 6, 30)])
+
+    def test_weekly_once_and_yearly(self):
+        """
+        This test checks weekly, one-off and yearly occurrences after a watermark.
+        """
+        self.assertEqual(list(occurrences(date(2023, 1, 2), 'weekly', '', date(2023, 1, 10), date(2023, 1, 23))),
+                         [date(2023, 1, 16), date(2023, 1, 23)])
+        self.assertEqual(list(occurrences(date(2023, 1, 2), '', '', date(2023, 1, 1), date(2023, 1, 23))),
+                         [date(2023, 1, 2)])
+        self.assertEqual(list(occurrences(date(2023, 1, 2), '', '', date(2023, 1, 2), date(2023, 1, 23))), [])
+        self.assertEqual(list(occurrences(date(2020, 2, 29), 'yearly', '', date(2020, 3, 1), date(2024, 3, 1))),
+                         [date(2021, 2, 28), date(2022, 2, 28), date(2023, 2, 28), date(2024, 2, 29)])
+
+    def test_cron_rules(self):
+        """
+        This test checks cron rules with lists, ranges and steps, and the validation of malformed rules.
+        """
+        weekdays = list(occurrences(date(2023, 1, 1), 'cron', '* * 1-5', date(2022, 12, 31), date(2023, 1, 8)))
+        self.assertEqual(weekdays, [date(2023, 1, d) for d in range(2, 7)])
+        quarterly = list(occurrences(date(2023, 1, 1), 'cron', '0 0 15 */3 *', date(2022, 12, 31),
+                                     date(2023, 12, 31)))
+        self.assertEqual(quarterly, [date(2023, m, 15) for m in (1, 4, 7, 10)])
+        for rule in ('32 * *', '* *', 'x * *', '* 0 *'):
+            with self.assertRaises(ValidationError):
+                validate_cron_rule(rule)
+
+
+class MaterializePlansTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates two accounts with a category.
+        """
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='rent')
+        self.accounts = [Account.objects.create(account_owner=User.objects.create_user(username=f'user{i}'),
+                                                account_number=str(i), account_balance=Decimal('1000.00'))
+                         for i in range(2)]
+
+    def plan(self, account, start, recurrence='', rule='', plan_sum='100.00', transaction_type=0):
+        """
+        Helper that creates a plan of the account.
+        """
+        plan = PlanningTransaction.objects.create(
+            transaction_account_plan=account, transaction_type_plan=transaction_type,
+            transaction_category_plan=self.category, transaction_date_plan=start,
+            transaction_sum_plan=Decimal(plan_sum), transaction_comment_plan='plan',
+            transaction_recurrence_plan=recurrence, transaction_rule_plan=rule)
+        apply_to_rollup(account.pk, start, transaction_type, self.category.pk, Decimal(plan_sum), planned=True)
+        return plan
+
+    def test_materialize_is_idempotent(self):
+        """
+        This test checks that due occurrences become transactions with the balances changed once, one-off plans are
+        kept but no longer due and a rerun creates nothing.
+        """
+        monthly = self.plan(self.accounts[0], date(2023, 1, 31), 'monthly')
+        self.plan(self.accounts[0], date(2023, 2, 10))
+        self.plan(self.accounts[1], date(2023, 3, 1), 'weekly', plan_sum='10.00', transaction_type=1)
+        self.plan(self.accounts[1], date(2023, 6, 1))
+        result = materialize_plans(date(2023, 3, 31))
+        self.assertEqual(result, {'plans': 3, 'transactions': 3 + 1 + 5})
+        self.assertEqual(materialize_plans(date(2023, 3, 31)), {'plans': 0, 'transactions': 0})
+        self.assertEqual(sorted(Transaction.objects.filter(transaction_account=self.accounts[0]).values_list(
+            'transaction_date', flat=True)), [date(2023, 1, 31), date(2023, 2, 10), date(2023, 2, 28),
+                                              date(2023, 3, 31)])
+        balances = dict(Account.objects.values_list('pk', 'account_balance'))
+        self.assertEqual(balances[self.accounts[0].pk], Decimal('600.00'))
+        self.assertEqual(balances[self.accounts[1].pk], Decimal('1050.00'))
+        self.assertEqual(PlanningTransaction.objects.count(), 4)
+        monthly.refresh_from_db()
+        self.assertEqual(monthly.transaction_materialized_plan, date(2023, 3, 31))
+        self.assertEqual(materialize_plans(date(2023, 4, 30))['transactions'], 1 + 4)
+        self.assertEqual(reconcile_balances()['drift'], [
+            {'account': account.pk, 'owner': account.account_owner_id, 'balance': Decimal('1000.00') - drift,
+             'ledger_balance': -drift, 'drift': Decimal('-1000.00')}
+            for account, drift in ((self.accounts[0], Decimal('500.00')), (self.accounts[1], Decimal('-90.00')))])
+        rollups = sorted(rollup_sums(self.accounts[1], planned=True), key=lambda row: row['total'])
+        self.assertEqual([row['total'] for row in rollups], [Decimal('10.00'), Decimal('100.00')])
+
+    def test_claimed_batch_is_skipped(self):
+        """
+        This test checks that a batch claimed by another run is not materialized twice.
+        """
+        plan = self.plan(self.accounts[0], date(2023, 1, 1), 'daily')
+        plans = list(due_plans(date(2023, 1, 3)).select_related('transaction_account_plan'))
+        materialize_batch(plans, date(2023, 1, 3))
+        with self.assertRaises(PlansClaimed):
+            materialize_batch(plans, date(2023, 1, 3))
+        self.assertEqual(Transaction.objects.filter(transaction_account=plan.transaction_account_plan).count(), 3)
+
+    def test_query_count_per_batch(self):
+        """
+        This test checks that the scheduler reads the plans in batches, with a query count depending on the number
+        of batches and accounts and not on the number of plans (as long as the new rows fit in one INSERT).
+        """
+        counts = []
+        # The first run creates the rollup rows, the later ones only update them.
+        for count in (10, 10, 120):
+            PlanningTransaction.objects.all().delete()
+            PlanningTransaction.objects.bulk_create(
+                PlanningTransaction(transaction_account_plan=self.accounts[i % 2], transaction_type_plan=0,
+                                    transaction_category_plan=self.category, transaction_date_plan=date(2023, 1, 1),
+                                    transaction_sum_plan=Decimal('1.00'), transaction_comment_plan='plan',
+                                    transaction_recurrence_plan='monthly')
+                for i in range(count))
+            with CaptureQueriesContext(connection) as queries:
+                result = materialize_plans(date(2023, 1, 31), batch_size=500)
+            self.assertEqual(result['plans'], count)
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[2])
+
+    def test_form_validates_recurrence(self):
+        """
+        This test checks that a cron plan needs a valid rule.
+        """
+        data = {'transaction_type_plan': 0, 'transaction_category_plan': self.category.pk,
+                'transaction_date_plan': date.today() + timedelta(days=1), 'transaction_sum_plan': '5.00',
+                'transaction_comment_plan': 'plan', 'transaction_recurrence_plan': 'cron'}
+        self.assertFalse(PlanningTransactionForm(data=data).is_valid())
+        self.assertFalse(PlanningTransactionForm(data={**data, 'transaction_rule_plan': '40 * *'}).is_valid())
+        self.assertTrue(PlanningTransactionForm(data={**data, 'transaction_rule_plan': '1 * *'}).is_valid())
+
+
+class ForecastTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account and a few plans.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1',
+                                              account_balance=Decimal('100.00'))
+        self.category = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        self.today = timezone.localdate()
+        for offset, recurrence, transaction_type, plan_sum in ((-2, '', 0, '30.00'), (1, 'weekly', 1, '10.00'),
+                                                               (3, '', 0, '500.00')):
+            PlanningTransaction.objects.create(
+                transaction_account_plan=self.account, transaction_type_plan=transaction_type,
+                transaction_category_plan=self.category, transaction_date_plan=self.today + timedelta(days=offset),
+                transaction_sum_plan=Decimal(plan_sum), transaction_comment_plan='plan',
+                transaction_recurrence_plan=recurrence)
+        self.client.force_login(self.user)
+
+    def test_daily_series_with_recurrences(self):
+        """
+        This test checks the projected balances, with the overdue plan counted today, using a single query.
+        """
+        with self.assertNumQueries(1):
+            series = forecast(self.account, self.today + timedelta(days=15))
+        self.assertEqual(len(series), 16)
+        self.assertEqual([day['date'] for day in series[:2]], [self.today, self.today + timedelta(days=1)])
+        self.assertEqual([day['balance'] for day in series[:4]],
+                         [Decimal('70.00'), Decimal('80.00'), Decimal('80.00'), Decimal('-420.00')])
+        self.assertEqual(series[8]['change'], Decimal('10.00'))
+        self.assertEqual(series[-1]['balance'], Decimal('-400.00'))
+
+    def test_daily_plan_as_rate(self):
+        """
+        This test checks that a daily plan started before today counts its overdue days today and then every day.
+        """
+        PlanningTransaction.objects.all().delete()
+        PlanningTransaction.objects.create(
+            transaction_account_plan=self.account, transaction_type_plan=0, transaction_category_plan=self.category,
+            transaction_date_plan=self.today - timedelta(days=3), transaction_sum_plan=Decimal('1.00'),
+            transaction_comment_plan='plan', transaction_recurrence_plan='daily')
+        series = forecast(self.account, self.today + timedelta(days=9))
+        self.assertEqual([day['change'] for day in series[:2]], [Decimal('-4.00'), Decimal('-1.00')])
+        self.assertEqual(series[-1]['balance'], Decimal('87.00'))
+
+    def test_materialized_occurrences_are_skipped(self):
+        """
+        This test checks that the occurrences already turned into transactions are not counted twice.
+        """
+        materialize_plans(self.today + timedelta(days=1))
+        self.account.refresh_from_db()
+        series = forecast(self.account, self.today + timedelta(days=15), self.today + timedelta(days=1))
+        self.assertEqual(series[0]['balance'], Decimal('80.00'))
+        self.assertEqual(series[-1]['balance'], Decimal('-400.00'))
+
+    def test_api_multi_year_series(self):
+        """
+        This test checks the forecast endpoint for ten years and its validation of the period.
+        """
+        start = time.perf_counter()
+        response = self.client.get('/api/forecast/', {'days': 3650})
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        series = response.json()['series']
+        self.assertEqual(len(series), 3650)
+        self.assertEqual(Decimal(series[-1]['balance']), Decimal('-430.00') + 10 * len(range(1, 3650, 7)))
+        self.assertLess(elapsed, 1)
+        self.assertEqual(self.client.get('/api/forecast/', {'days': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/forecast/', {'end': 'soon'}).status_code, 400)
+
+    def test_planned_statistics_page(self):
+        """
+        This test checks that the planned statistics page shows the projected and the lowest balances.
+        """
+        end = self.today + timedelta(days=15)
+        response = self.client.get('/planned/transaction_statistics/', {
+            'transaction_start_date': self.today.isoformat(), 'transaction_end_date': end.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['forecast_end']['balance'], Decimal('-400.00'))
+        self.assertEqual(response.context['forecast_lowest']['balance'], Decimal('-420.00'))
+        self.assertContains(response, 'projected balance on ' + end.isoformat())
+
+
+class RunningBalanceTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account opened with 1000.00 and 130 transactions on a few
+        dates, and the expected balance after each transaction, newest first.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1',
+                                              account_balance=Decimal('1000.00'))
+        transactions = [Transaction(transaction_account=self.account, transaction_type=int(i % 3 == 0),
+                                    transaction_category=self.category, transaction_date=date(2022, 1, 1 + i // 10),
+                                    transaction_sum=Decimal(i + 1), transaction_comment='test')
+                        for i in range(130)]
+        save_batch(self.account, transactions)
+        self.account.refresh_from_db()
+        balance = Decimal('1000.00')
+        expected = {}
+        for transaction in sorted(transactions, key=lambda t: (t.transaction_date, t.pk)):
+            balance += transaction.transaction_sum if transaction.transaction_type == 1 else \
+                -transaction.transaction_sum
+            expected[transaction.pk] = balance
+        self.expected = expected
+        self.client.force_login(self.user)
+        get_categories()
+
+    def walk_filter_pages(self, params=None):
+        """
+        Helper that reads every page of the filter view, returning the transactions and the query count per page.
+        """
+        params = dict(params or {})
+        rows, counts = [], []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/filter/', params)
+            counts.append(len(queries))
+            rows.extend(response.context['transactions'])
+            if 'next_page_query' not in response.context:
+                return rows, counts
+            params['cursor'] = QueryDict(response.context['next_page_query'])['cursor']
+
+    def test_pages_start_from_cached_checkpoints(self):
+        """
+        This test checks the balance after each transaction on every page, and that the later pages read their
+        checkpoints from the cache instead of summing the newer transactions.
+        """
+        rows, counts = self.walk_filter_pages()
+        self.assertEqual(len(rows), 130)
+        self.assertEqual(rows[0].running_balance, self.account.account_balance)
+        self.assertEqual({row.pk: row.running_balance for row in rows}, self.expected)
+        self.assertEqual(len(set(counts)), 1)
+
+        cursor = QueryDict(self.client.get('/filter/').context['next_page_query'])['cursor']
+        caches['statistics'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/filter/', {'cursor': cursor})
+        self.assertEqual(len(queries), counts[1] + 1)
+        self.assertEqual({row.pk: row.running_balance for row in response.context['transactions']},
+                         {row.pk: row.running_balance for row in rows[50:100]})
+
+    def test_checkpoint_is_invalidated_by_a_new_transaction(self):
+        """
+        This test checks that a cached checkpoint is not used after a transaction changed the balances.
+        """
+        rows, _ = self.walk_filter_pages()
+        oldest = rows[-1]
+        self.client.post('/add_transaction/', {
+            'transaction_type': 1, 'transaction_category': self.category.pk, 'transaction_date': '2021-12-31',
+            'transaction_sum': '5.00', 'transaction_comment': 'first'})
+        rows, _ = self.walk_filter_pages()
+        self.assertEqual(len(rows), 131)
+        self.assertEqual(next(row for row in rows if row.pk == oldest.pk).running_balance,
+                         self.expected[oldest.pk] + 5)
+
+    def test_date_range_latest_and_stream(self):
+        """
+        This test checks the running balance with an end date, on the latest page and in the streamed list, and
+        that it is not shown for transactions filtered by category.
+        """
+        rows, _ = self.walk_filter_pages({'transaction_start_date': '2022-01-02',
+                                          'transaction_end_date': '2022-01-05'})
+        self.assertEqual(len(rows), 40)
+        self.assertEqual({row.pk: row.running_balance for row in rows},
+                         {pk: self.expected[pk] for pk in (row.pk for row in rows)})
+        latest = self.client.get('/latest/').context['transactions']
+        self.assertEqual([row.running_balance for row in latest],
+                         [self.expected[row.pk] for row in latest])
+        response = self.client.get('/filter/', {'stream': 1})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('<th>Balance</th>', content)
+        self.assertIn(f'<td>{min(self.expected.values())}</td>', content)
+        response = self.client.get('/filter/', {'transaction_category': self.category.pk})
+        self.assertFalse(response.context['show_balance'])
+        self.assertNotContains(response, '<th>Balance</th>')
+
+    def test_balances_are_rounded_to_cents(self):
+        """
+        This test checks that the running balances of sums of cents, inexact as floats, are exact to the cent.
+        """
+        Transaction.objects.all().delete()
+        sums = [Decimal(cents).scaleb(-2) for cents in random.Random(1).choices(range(100, 20000), k=100)]
+        save_batch(self.account, [
+            Transaction(transaction_type=transaction_type, transaction_category=self.category,
+                        transaction_date=date(2022, 1, 1), transaction_sum=transaction_sum, transaction_comment='test')
+            for transaction_type in (0, 1) for transaction_sum in sums])
+        Account.objects.filter(pk=self.account.pk).update(account_balance=Decimal('0.01'))
+        rows, _ = self.walk_filter_pages()
+        self.assertEqual(rows[-1].running_balance, Decimal('0.01') - sums[0])
+        self.assertEqual(rows[100].running_balance, Decimal('0.01') - sum(sums))
+        self.assertEqual({row.running_balance.as_tuple().exponent for row in rows}, {-2})
+
+    async def test_async_filter(self):
+        """
+        This test checks that the async filter view shows the same running balances.
+        """
+        request = AsyncRequestFactory().get('/filter/', {'cursor': ''})
+        request.user = self.user
+        response = await async_views.filter(request)
+        self.assertEqual(response.status_code, 200)
+        request = AsyncRequestFactory().get('/latest/')
+        request.user = self.user
+        response = await async_views.latest(request)
+        self.assertContains(response, f'<td>{self.account.account_balance}</td>')
+
+
+@override_settings(HBM_PROFILING=True)
+class ProfilingTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with an account and a transaction, and clears the metrics.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1',
+                                              account_balance=Decimal('100.00'))
+        category = TransactionCategory.objects.create(category_type=0, category_name='food')
+        Transaction.objects.create(transaction_account=self.account, transaction_type=0,
+                                   transaction_category=category, transaction_date=date(2023, 1, 1),
+                                   transaction_sum=Decimal('10.00'), transaction_comment='test')
+        self.client.force_login(self.user)
+        # Loaded ahead, as a registry cleared by a change is reloaded when the request starts, before the middleware.
+        get_categories()
+        reset_metrics()
+
+    def test_view_metrics(self):
+        """
+        This test checks that the query count, the SQL and render times and the response size are recorded per view
+        and exposed in the Prometheus format to staff users and to the metrics token only.
+        """
+        query_count = 0
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/filter/')
+            query_count += len(queries)
+        self.client.get('/transaction_statistics/')
+        metrics = get_metrics()
+        self.assertEqual(set(metrics), {'filter', 'transaction_statistics'})
+        self.assertEqual(metrics['filter']['requests'], 2)
+        self.assertEqual(metrics['filter']['queries'], query_count)
+        self.assertGreater(metrics['filter']['sql_seconds'], 0)
+        self.assertGreater(metrics['filter']['render_seconds'], 0)
+        self.assertEqual(metrics['filter']['response_bytes'], 2 * len(response.content))
+
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'hbm_view_queries_total{{view="filter"}} {query_count}')
+        self.assertContains(response, 'hbm_view_duration_seconds_count{view="transaction_statistics"} 1')
+        self.assertContains(response, 'hbm_view_duration_seconds_bucket{view="filter",le="+Inf"} 2')
+        self.assertNotIn('metrics', get_metrics())
+        anonymous = Client()
+        self.assertEqual(anonymous.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 404)
+        with override_settings(HBM_METRICS_TOKEN='secret'):
+            self.assertEqual(anonymous.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+            self.assertEqual(anonymous.get('/metrics/', HTTP_AUTHORIZATION='Bearer other').status_code, 404)
+            self.assertEqual(anonymous.get('/metrics/').status_code, 404)
+
+    @override_settings(HBM_SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_warning(self):
+        """
+        This test checks that the requests slower than the threshold are logged and counted.
+        """
+        with self.assertLogs('hbm.profiling', 'WARNING') as logs:
+            self.client.get('/latest/')
+        self.assertIn('Slow request to latest (200)', logs.output[0])
+        self.assertEqual(get_metrics()['latest']['slow_requests'], 1)
+
+    async def test_async_requests(self):
+        """
+        This test checks that the queries run in a thread by a sync view served under ASGI are counted.
+        """
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/latest/')
+        self.assertEqual(response.status_code, 200)
+        metrics = await sync_to_async(get_metrics)()
+        self.assertGreater(metrics['latest']['queries'], 0)
+        self.assertGreater(metrics['latest']['render_seconds'], 0)
+
+    @override_settings(HBM_PROFILING=False)
+    def test_disabled(self):
+        """
+        This test checks that nothing is recorded without HBM_PROFILING.
+        """
+        self.client.get('/latest/')
+        self.assertEqual(get_metrics(), {})
+
+
+class BenchmarkTest(TestCase):
+    def test_generated_ledgers_are_consistent(self):
+        """
+        This test checks that the synthetic ledgers have the categories of categories.json, balances and rollups
+        matching the transactions, and are the same for the same seed.
+        """
+        categories = load_categories()
+        self.assertEqual(len(categories), 18)
+        self.assertEqual(TransactionCategory.objects.get(category_name='salary').category_type, 1)
+        accounts = create_accounts(2)
+        self.assertEqual(generate_transactions(accounts, 300, categories, seed=1, batch_size=70), 600)
+        self.assertEqual(reconcile_balances()['drift'], [])
+        self.assertEqual(sorted((row['total'] for row in rollup_sums(accounts[0]))),
+                         sorted(row['total'] for row in Transaction.objects.filter(
+                             transaction_account=accounts[0]).values('transaction_type', 'transaction_category')
+                                .annotate(total=Sum('transaction_sum'))))
+        first = list(Transaction.objects.values_list('transaction_date', 'transaction_sum').order_by('pk')[:50])
+        Transaction.objects.all().delete()
+        generate_transactions(accounts, 300, categories, seed=1)
+        self.assertEqual(list(Transaction.objects.values_list('transaction_date', 'transaction_sum').order_by(
+            'pk')[:50]), first)
+
+    def test_run_and_compare(self):
+        """
+        This test checks that every view is timed at each size, the ledger keeps its size, and that slower medians
+        or more queries than the baseline are reported.
+        """
+        result = run_benchmarks(sizes=[50, 20], repeat=3)
+        self.assertEqual([(row['size'], row['view']) for row in result['results']],
+                         [(size, view) for size in (20, 50) for view in BENCHMARK_VIEWS])
+        self.assertEqual(Transaction.objects.filter(transaction_account__account_owner__username='bench0').count(),
+                         50)
+        self.assertEqual(compare_results(result, result), [])
+        slower = {'results': [{**row, 'median_ms': row['median_ms'] * 2, 'queries': row['queries'] + 1}
+                              for row in result['results'][:1]]}
+        self.assertEqual(len(compare_results(result, slower, 0.5)), 2)
+        self.assertEqual(compare_results(result, slower, 1.5)[0].split(':')[0], 'latest at 20')
+
+
+class SqliteProfileTest(TransactionTestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user, an account and a category.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1234567890',
+                                              account_balance=Decimal('100.00'))
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='food')
+
+    def tearDown(self):
+        connections.close_all()
+
+    def pragmas(self, profile):
+        """
+        Method opening a new connection with the given profile and returning its journal mode, synchronous level and
+        busy timeout. The other connections are closed first, as only a single connection can change the journal mode.
+        """
+        connections.close_all()
+        with override_settings(HBM_SQLITE_PROFILE=profile):
+            new_connection = connections.create_connection('default')
+            try:
+                with new_connection.cursor() as cursor:
+                    return tuple(cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                                 for name in ('journal_mode', 'synchronous', 'busy_timeout'))
+            finally:
+                new_connection.close()
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite profiles')
+    def test_profiles_are_applied_to_new_connections(self):
+        """
+        This test checks that the PRAGMAs of the profile are set on every new connection, and that the default
+        profile switches the database file back from WAL.
+        """
+        self.assertEqual(self.pragmas('wal'), ('wal', 1, 5000))
+        self.assertEqual(self.pragmas('default'), ('delete', 2, 5000))
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite profiles')
+    def test_read_write_benchmark(self):
+        """
+        This test checks that readers and writers run concurrently under WAL without failures, and that every write
+        reaches the balance.
+        """
+        result = read_write_benchmark(self.account, self.category, 'wal', readers=2, writers=2, duration=1.0)
+        self.assertEqual(result['journal_mode'], 'wal')
+        self.assertGreater(result['reads'], 0)
+        self.assertGreater(result['writes'], 0)
+        self.assertEqual(result['failures'], 0)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('100.00') - result['writes'])
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates two logged-in test users with an account each, and transactions with a few comments.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='otheruser', password='12345')
+        self.category = TransactionCategory.objects.create(category_type=0, category_name='health')
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1')
+        self.other_account = Account.objects.create(account_owner=self.other, account_number='2')
+        comments = ['Dentist appointment', 'dentist: dentist filling', 'Groceries', 'Dentistry supplies',
+                    'Café au lait']
+        self.transactions = save_batch(self.account, [
+            Transaction(transaction_category=self.category, transaction_date=date(2022, 1, 1 + i),
+                        transaction_sum=Decimal('10.00'), transaction_comment=comment)
+            for i, comment in enumerate(comments)])
+        save_batch(self.other_account, [Transaction(transaction_category=self.category,
+                                                    transaction_date=date(2022, 1, 1), transaction_sum=Decimal('5.00'),
+                                                    transaction_comment='dentist')])
+        self.client.force_login(self.user)
+
+    def search(self, query, account=None):
+        """
+        Helper returning the comments of the transactions of the account matching the query, the best first.
+        """
+        account = account or self.account
+        return list(search_transactions(Transaction.objects.filter(transaction_account=account), account, query)
+                    .order_by('search_rank', '-transaction_date', '-id').values_list('transaction_comment', flat=True))
+
+    def test_matches_are_ranked_and_scoped_to_the_account(self):
+        """
+        This test checks that words match case-insensitively, accents aside, that a word ending with * matches as
+        a prefix, that the best match comes first, and that other accounts and special characters are ignored.
+        """
+        self.assertEqual(self.search('dentist'), ['dentist: dentist filling', 'Dentist appointment'])
+        self.assertEqual(self.search('DENTIST appointment'), ['Dentist appointment'])
+        self.assertEqual(set(self.search('dent*')), {'dentist: dentist filling', 'Dentist appointment',
+                                                     'Dentistry supplies'})
+        self.assertEqual(self.search('cafe'), ['Café au lait'])
+        self.assertEqual(self.search('"dentist" OR -groceries)'), [])
+        self.assertEqual(self.search('   '), [])
+        self.assertEqual(self.search('dentist', self.other_account), ['dentist'])
+
+    def test_index_follows_saves_and_deletes(self):
+        """
+        This test checks that saved, deleted and bulk-created transactions are found or not straight away, and that
+        the rebuilt index finds the same transactions.
+        """
+        transaction = self.transactions[2]
+        transaction.transaction_comment = 'Orthodontist'
+        transaction.save()
+        self.assertEqual(self.search('groceries'), [])
+        self.assertEqual(self.search('orthodontist'), ['Orthodontist'])
+        self.client.post(f'/del_transaction/{self.transactions[0].pk}')
+        self.assertEqual(self.search('dentist'), ['dentist: dentist filling'])
+        save_batch(self.account, [Transaction(transaction_category=self.category, transaction_date=date(2022, 2, 1),
+                                              transaction_sum=Decimal('1.00'), transaction_comment='Dentist again')])
+        self.assertEqual(len(self.search('dentist')), 2)
+        self.assertEqual(rebuild_search_index(self.account), 5)
+        self.assertEqual(len(self.search('dentist')), 2)
+        self.assertEqual(rebuild_search_index(), 6)
+        self.assertEqual(self.search('dentist', self.other_account), ['dentist'])
+
+    def test_filter_view(self):
+        """
+        This test checks that the search combines with the other filters, is paginated by page number without a
+        running balance, and that the export is narrowed by the search too.
+        """
+        save_batch(self.account, [Transaction(transaction_category=self.food, transaction_date=date(2022, 3, 1),
+                                              transaction_sum=Decimal('1.00'), transaction_comment=f'dentist {i}')
+                                  for i in range(60)])
+        response = self.client.get('/filter/', {'search': 'dentist'})
+        self.assertFalse(response.context['show_balance'])
+        self.assertEqual(len(response.context['transactions']), 50)
+        next_page = QueryDict(response.context['next_page_query'])
+        self.assertEqual(next_page['cursor'], '2')
+        response = self.client.get('/filter/', next_page)
+        self.assertEqual(len(response.context['transactions']), 12)
+        self.assertNotIn('next_page_query', response.context)
+        response = self.client.get('/filter/', {'search': 'dentist', 'transaction_category': self.category.pk})
+        self.assertEqual([t.transaction_comment for t in response.context['transactions']],
+                         ['dentist: dentist filling', 'Dentist appointment'])
+        self.assertContains(response, 'value="dentist"')
+        self.assertEqual(self.client.get('/filter/', {'search': 'dentist', 'cursor': '0'}).status_code, 400)
+        response = self.client.get('/export/', {'search': 'appointment'})
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+    async def test_async_filter(self):
+        """
+        This test checks that the async filter view returns the same search results.
+        """
+        request = AsyncRequestFactory().get('/filter/', {'search': 'dentist'})
+        request.user = self.user
+        response = await async_views.filter(request)
+        self.assertContains(response, 'Dentist appointment')
+        self.assertNotContains(response, 'Groceries')
+
+
+class MultiAccountTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a logged-in test user with a card and a savings account, another user, and categories.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.card = Account.objects.create(account_owner=self.user, account_number='1111', account_name='Card')
+        self.savings = Account.objects.create(account_owner=self.user, account_number='2222', account_name='Savings')
+        self.other = Account.objects.create(account_owner=User.objects.create_user(username='other', password='12345'),
+                                            account_number='3333')
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.salary = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        save_batch(self.card, [
+            Transaction(transaction_type=1, transaction_category=self.salary, transaction_date=date(2023, 1, 5),
+                        transaction_sum=Decimal('1000.00'), transaction_comment='salary'),
+            Transaction(transaction_category=self.food, transaction_date=date(2023, 2, 10),
+                        transaction_sum=Decimal('40.50'), transaction_comment='lunch')])
+        self.client.force_login(self.user)
+        get_categories()
+
+    def switch(self, account, next_page='/latest/'):
+        """
+        Helper that selects the account with the account switcher.
+        """
+        return self.client.post('/accounts/switch/', {'account': account.pk, 'next': next_page})
+
+    def test_switcher_selects_the_account_of_the_pages(self):
+        """
+        This test checks that the oldest account is shown first, that the switcher selects another account of the
+        user for the following pages with one account query per request, and that accounts of other users and
+        unsafe redirects are refused.
+        """
+        response = self.client.get('/latest/')
+        self.assertContains(response, 'Your balance: 959.50')
+        self.assertContains(response, f'<option value="{self.savings.pk}">Savings</option>')
+        self.assertRedirects(self.switch(self.savings), '/latest/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/latest/')
+        self.assertEqual(sum('FROM "hbm_account"' in query['sql'] for query in queries.captured_queries), 1)
+        self.assertContains(response, 'Your balance: 0.00')
+        self.assertEqual(list(response.context['transactions']), [])
+        self.assertEqual(self.switch(self.other).status_code, 404)
+        self.assertRedirects(self.switch(self.card, 'https://example.com/'), '/', fetch_redirect_response=False)
+        self.assertContains(self.client.get('/latest/'), 'Your balance: 959.50')
+        self.assertEqual(self.client.get('/api/transactions/', {'account': self.savings.pk}).json()['results'], [])
+        self.assertEqual(self.client.get('/api/transactions/', {'account': self.other.pk}).status_code, 404)
+
+    def test_add_account(self):
+        """
+        This test checks that a new account starts with a zero balance and is selected.
+        """
+        response = self.client.post('/accounts/add/', {'account_name': 'Visa', 'account_number': '4444'})
+        self.assertRedirects(response, '/accounts/')
+        account = Account.objects.get(account_name='Visa')
+        self.assertEqual((account.account_owner, account.account_balance), (self.user, Decimal('0.00')))
+        self.assertContains(self.client.get('/latest/'), 'Your balance: 0.00')
+
+    def test_transfer_posts_both_legs(self):
+        """
+        This test checks that a transfer moves the sum between the accounts with an expense and an income that keep
+        the balances reconciled, and that it cannot target the same account or an account of another user.
+        """
+        response = self.client.post('/accounts/transfer/', {
+            'transfer_account': self.savings.pk, 'transaction_date': '2023-03-01', 'transaction_sum': '300.00'})
+        self.assertRedirects(response, '/accounts/')
+        self.card.refresh_from_db()
+        self.savings.refresh_from_db()
+        self.assertEqual((self.card.account_balance, self.savings.account_balance),
+                         (Decimal('659.50'), Decimal('300.00')))
+        self.assertEqual(list(Transaction.objects.filter(transaction_account=self.savings).values_list(
+            'transaction_type', 'transaction_category__category_name', 'transaction_comment')),
+            [(1, 'Transfer', 'Transfer from Card')])
+        self.assertEqual(reconcile_balances()['drift'], [])
+        response = self.client.post('/accounts/transfer/', {
+            'transfer_account': self.other.pk, 'transaction_date': '2023-03-01', 'transaction_sum': '1.00'})
+        self.assertTrue(response.context['form'].errors)
+        with self.assertRaises(ValueError):
+            transfer(self.card, self.card, Decimal('1.00'), date(2023, 3, 1))
+
+    def test_transfer_is_atomic(self):
+        """
+        This test checks that a transfer failing after both legs were inserted leaves both balances and ledgers
+        unchanged.
+        """
+        with mock.patch('hbm.ledger.apply_to_rollup', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                transfer(self.card, self.savings, Decimal('10.00'), date(2023, 3, 1))
+        self.card.refresh_from_db()
+        self.savings.refresh_from_db()
+        self.assertEqual((self.card.account_balance, self.savings.account_balance),
+                         (Decimal('959.50'), Decimal('0.00')))
+        self.assertEqual(Transaction.objects.filter(transaction_account__in=[self.card, self.savings]).count(), 2)
+
+    def test_consolidated_sums_in_one_query(self):
+        """
+        This test checks the income and expenses of each account and of all of them, without the transfers, and
+        that the number of queries does not depend on the number of accounts.
+        """
+        transfer(self.card, self.savings, Decimal('100.00'), date(2023, 3, 1))
+        save_batch(self.savings, [Transaction(transaction_category=self.food, transaction_date=date(2023, 3, 15),
+                                              transaction_sum=Decimal('5.25'), transaction_comment='coffee')])
+        self.client.get('/accounts/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/accounts/')
+        count = len(queries)
+        self.assertEqual([(row['account'].account_label, row['income'], row['expense'])
+                          for row in response.context['rows']],
+                         [('Card', Decimal('1000.00'), Decimal('40.50')), ('Savings', Decimal('0.00'),
+                                                                          Decimal('5.25'))])
+        self.assertEqual(response.context['totals'], {'balance': Decimal('954.25'), 'income': Decimal('1000.00'),
+                                                      'expense': Decimal('45.75')})
+        for number in range(3):
+            account = Account.objects.create(account_owner=self.user, account_number=str(number))
+            save_batch(account, [Transaction(transaction_category=self.food, transaction_date=date(2023, 1, 1),
+                                             transaction_sum=Decimal('1.00'), transaction_comment='test')])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/accounts/', {'transaction_start_date': '2023-01-01',
+                                                      'transaction_end_date': '2023-02-15'})
+        self.assertEqual(len(queries), count + 1)
+        self.assertEqual(response.context['totals']['expense'], Decimal('43.50'))
+        self.assertEqual(account_sums([self.card], date(2023, 2, 1), date(2023, 2, 28)),
+                         {self.card.pk: [Decimal('40.50'), Decimal('0.00')]})
+
+
+@skipUnless(np is not None, 'NumPy is not installed')
+@override_settings(HBM_LEDGER_SNAPSHOTS=True)
+class LedgerSnapshotTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user with an account, three categories and a ledger over two years.
+        """
+        caches['statistics'].clear()
+        clear_snapshots()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1234567890')
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.rent = TransactionCategory.objects.create(category_type=0, category_name='rent')
+        self.salary = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        rng = random.Random(0)
+        self.transactions = [
+            Transaction(transaction_type=category.category_type, transaction_category=category,
+                        transaction_date=date(2021, 1, 1) + timedelta(days=rng.randrange(730)),
+                        transaction_sum=Decimal(rng.randint(1, 100000)).scaleb(-2), transaction_comment='test')
+            for category in rng.choices([self.food, self.rent, self.salary], k=300)]
+        save_batch(self.account, self.transactions)
+        self.client.force_login(self.user)
+
+    def expected_sums(self, start_date, end_date, categories=None) -> dict:
+        """
+        Method for the sums per type and category name of the test transactions, computed in Python.
+        """
+        sums = {}
+        for transaction in self.transactions:
+            if start_date <= transaction.transaction_date <= end_date and (
+                    categories is None or transaction.transaction_category_id in categories):
+                key = (transaction.transaction_type, transaction.transaction_category.category_name)
+                sums[key] = sums.get(key, Decimal(0)) + transaction.transaction_sum
+        return sums
+
+    def test_slices_match_the_ledger_without_queries(self):
+        """
+        This test checks the sums of date ranges and categories against the ledger, and that no query is made once
+        the snapshot is loaded.
+        """
+        ledger_sums(self.account)
+        slices = ((date(2021, 1, 1), date(2022, 12, 31), None), (date(2021, 3, 15), date(2021, 3, 15), None),
+                  (date(2021, 2, 10), date(2022, 7, 3), [self.food.pk]),
+                  (date(2022, 1, 1), date(2022, 6, 30), [self.rent.pk, self.salary.pk]),
+                  (date(2023, 1, 1), date(2023, 12, 31), None))
+        with CaptureQueriesContext(connection) as queries:
+            results = [ledger_sums(self.account, *arguments) for arguments in slices]
+        self.assertEqual(len(queries), 0)
+        for arguments, rows in zip(slices, results):
+            self.assertEqual({(row['type'], row['category_name']): row['total'] for row in rows},
+                             self.expected_sums(*arguments))
+        with override_settings(HBM_LEDGER_SNAPSHOTS=False):
+            self.assertEqual(get_statistic_data(rollup_sums(self.account, *slices[2][:2], categories=slices[2][2])),
+                             get_statistic_data(ledger_sums(self.account, *slices[2])))
+
+    def test_snapshot_is_reloaded_after_a_change(self):
+        """
+        This test checks that a saved transaction invalidates the snapshot of its account only.
+        """
+        other = Account.objects.create(account_owner=self.user, account_number='2')
+        snapshot = get_snapshot(self.account)
+        other_snapshot = get_snapshot(other)
+        self.assertEqual((len(snapshot), len(other_snapshot)), (300, 0))
+        self.assertIs(get_snapshot(self.account), snapshot)
+        save_batch(self.account, [Transaction(transaction_category=self.food, transaction_date=date(2021, 6, 1),
+                                              transaction_sum=Decimal('0.01'), transaction_comment='test')])
+        # The account of the next request.
+        self.account.refresh_from_db()
+        self.assertEqual(len(get_snapshot(self.account)), 301)
+        self.assertIs(get_snapshot(other), other_snapshot)
+        with override_settings(HBM_LEDGER_SNAPSHOT_ACCOUNTS=1):
+            get_snapshot(Account.objects.create(account_owner=self.user, account_number='3'))
+            self.assertIsNot(get_snapshot(other), other_snapshot)
+
+    def test_compare_periods(self):
+        """
+        This test checks the comparison of two periods per category.
+        """
+        period = (date(2022, 1, 1), date(2022, 12, 31))
+        previous = (date(2021, 1, 1), date(2021, 12, 31))
+        current, before = self.expected_sums(*period), self.expected_sums(*previous)
+        rows = compare_sums(self.account, period, previous)
+        self.assertEqual([(row['type'], row['category_name']) for row in rows], sorted(current.keys() | before))
+        for row in rows:
+            key = (row['type'], row['category_name'])
+            self.assertEqual((row['total'], row['previous_total'], row['change']),
+                             (current.get(key, 0), before.get(key, 0), current.get(key, 0) - before.get(key, 0)))
+
+    def test_api_summary_categories_and_comparison(self):
+        """
+        This test checks the category filter and the period comparison of the summary API.
+        """
+        body = self.client.get('/api/summary/', {
+            'transaction_start_date': '2022-01-01', 'transaction_end_date': '2022-12-31',
+            'compare_start_date': '2021-01-01', 'compare_end_date': '2021-12-31', 'category': [self.food.pk]}).json()
+        food = sum(self.expected_sums(date(2022, 1, 1), date(2022, 12, 31), [self.food.pk]).values())
+        self.assertEqual(Decimal(body['statistics'][1]['overall_expense']), food)
+        self.assertEqual(Decimal(body['statistics'][0]['overall_income']), 0)
+        self.assertEqual([(row['category_name'], Decimal(row['total'])) for row in body['comparison']],
+                         [('food', food)])
+        self.assertEqual(self.client.get('/api/summary/', {'category': 'food'}).status_code, 400)
+
+    def test_statistics_page_with_one_date(self):
+        """
+        This test checks that the statistics page accepts a start or an end date alone, with the same sums from the
+        snapshot and from the rollup, and rejects an invalid date.
+        """
+        for params, arguments in (({'transaction_start_date': '2022-03-10'}, (date(2022, 3, 10), date.max)),
+                                  ({'transaction_end_date': '2021-08-20'}, (date.min, date(2021, 8, 20)))):
+            statistic_data = []
+            for snapshots in (True, False):
+                caches['statistics'].clear()
+                with override_settings(HBM_LEDGER_SNAPSHOTS=snapshots):
+                    response = self.client.get('/transaction_statistics/', params)
+                self.assertEqual(response.status_code, 200)
+                statistic_data.append(response.context['statistic_data'])
+            expected = self.expected_sums(*arguments)
+            self.assertEqual(statistic_data[0][0]['overall_income'], sum(
+                (total for (transaction_type, _), total in expected.items() if transaction_type == 1), Decimal(0)))
+            snapshot_totals, rollup_totals = ({key: Decimal(value) for row in data for key, value in row.items()}
+                                              for data in statistic_data)
+            self.assertEqual(snapshot_totals, rollup_totals)
+        response = self.client.get('/transaction_statistics/', {'transaction_start_date': '2022-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BudgetTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user with two accounts, categories, planned and real transactions and a transfer.
+        """
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1234567890',
+                                              account_balance=Decimal('1000.00'))
+        self.savings = Account.objects.create(account_owner=self.user, account_number='2')
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.rent = TransactionCategory.objects.create(category_type=0, category_name='rent')
+        self.salary = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        plans = [(self.food, date(2023, 1, 10), '200.00'), (self.food, date(2023, 1, 20), '100.00'),
+                 (self.rent, date(2023, 1, 1), '500.00'), (self.food, date(2023, 2, 10), '300.00'),
+                 (self.salary, date(2023, 2, 1), '1000.00'), (self.food, date(2023, 4, 1), '50.00')]
+        save_batch(self.account, [
+            PlanningTransaction(transaction_type_plan=category.category_type, transaction_category_plan=category,
+                                transaction_date_plan=day, transaction_sum_plan=Decimal(amount),
+                                transaction_comment_plan='plan') for category, day, amount in plans], planned=True)
+        actuals = [(self.food, date(2023, 1, 5), '120.50'), (self.food, date(2023, 1, 25), '210.00'),
+                   (self.food, date(2023, 2, 14), '99.99'), (self.salary, date(2023, 2, 1), '1100.00'),
+                   (self.rent, date(2023, 3, 1), '500.00')]
+        save_batch(self.account, [
+            Transaction(transaction_type=category.category_type, transaction_category=category, transaction_date=day,
+                        transaction_sum=Decimal(amount), transaction_comment='real')
+            for category, day, amount in actuals])
+        transfer(self.account, self.savings, Decimal('50.00'), date(2023, 1, 15))
+        self.client.force_login(self.user)
+
+    def test_report_per_month_and_category(self):
+        """
+        This test checks the planned and actual totals, the variance and the percentage used per month and category
+        and over the period, without the transfers.
+        """
+        report = budget_report(self.account, date(2023, 1, 1), date(2023, 3, 31),
+                               [category.pk for category in get_transfer_categories()])
+        self.assertEqual([(row['month'], row['type'], row['category_name'], row['planned'], row['actual'],
+                           row['variance'], row['used']) for row in report['rows']], [
+            (date(2023, 1, 1), 0, 'food', Decimal('300.00'), Decimal('330.50'), Decimal('30.50'), Decimal('110.2')),
+            (date(2023, 1, 1), 0, 'rent', Decimal('500.00'), Decimal('0.00'), Decimal('-500.00'), Decimal('0.0')),
+            (date(2023, 2, 1), 0, 'food', Decimal('300.00'), Decimal('99.99'), Decimal('-200.01'), Decimal('33.3')),
+            (date(2023, 2, 1), 1, 'salary', Decimal('1000.00'), Decimal('1100.00'), Decimal('100.00'),
+             Decimal('110.0')),
+            (date(2023, 3, 1), 0, 'rent', Decimal('0.00'), Decimal('500.00'), Decimal('500.00'), None)])
+        self.assertEqual([(row['type'], row['category_name'], row['planned'], row['actual'], row['used'])
+                          for row in report['totals']], [
+            (0, 'food', Decimal('600.00'), Decimal('430.49'), Decimal('71.7')),
+            (0, 'rent', Decimal('500.00'), Decimal('500.00'), Decimal('100.0')),
+            (1, 'salary', Decimal('1000.00'), Decimal('1100.00'), Decimal('110.0'))])
+
+    def test_report_is_updated_by_the_write_paths(self):
+        """
+        This test checks that the report follows added and deleted transactions, and that it costs two queries
+        whatever the length of the period.
+        """
+        self.client.post('/add_transaction/', {'transaction_type': 0, 'transaction_category': self.rent.pk,
+                                               'transaction_date': '2023-01-31', 'transaction_sum': '450.00',
+                                               'transaction_comment': 'rent'})
+        ids = list(PlanningTransaction.objects.filter(transaction_category_plan=self.food).values_list('pk', flat=True))
+        delete_batch(self.account, ids, planned=True)
+        get_categories()
+        for end_month in (date(2023, 1, 1), date(2033, 12, 1)):
+            with self.assertNumQueries(2):
+                report = budget_report(self.account, date(2023, 1, 1), end_month)
+        self.assertEqual([(row['category_name'], row['planned'], row['actual'], row['used'])
+                          for row in report['rows'] if row['month'] == date(2023, 1, 1) and row['type'] == 0], [
+            ('Transfer', Decimal('0.00'), Decimal('50.00'), None), ('food', Decimal('0.00'), Decimal('330.50'), None),
+            ('rent', Decimal('500.00'), Decimal('450.00'), Decimal('90.0'))])
+
+    def test_recurring_and_materialized_plans(self):
+        """
+        This test checks that a recurring plan is planned in each month of the period, from a start before it, and
+        that the one-off plans materialized by the scheduler are still planned.
+        """
+        save_batch(self.account, [PlanningTransaction(
+            transaction_type_plan=0, transaction_category_plan=self.food, transaction_date_plan=date(2022, 12, 15),
+            transaction_sum_plan=Decimal('40.00'), transaction_comment_plan='plan',
+            transaction_recurrence_plan='monthly')], planned=True)
+        materialize_plans(date(2023, 1, 31))
+        self.assertTrue(PlanningTransaction.objects.filter(transaction_category_plan=self.rent).exists())
+        report = budget_report(self.account, date(2023, 1, 1), date(2023, 3, 31),
+                               [category.pk for category in get_transfer_categories()])
+        self.assertEqual([(row['month'], row['category_name'], row['planned'], row['actual'])
+                          for row in report['rows'] if row['type'] == 0], [
+            (date(2023, 1, 1), 'food', Decimal('340.00'), Decimal('670.50')),
+            (date(2023, 1, 1), 'rent', Decimal('500.00'), Decimal('500.00')),
+            (date(2023, 2, 1), 'food', Decimal('340.00'), Decimal('99.99')),
+            (date(2023, 3, 1), 'food', Decimal('40.00'), Decimal('0.00')),
+            (date(2023, 3, 1), 'rent', Decimal('0.00'), Decimal('500.00'))])
+
+    def test_budget_page_and_api(self):
+        """
+        This test checks the budget page and the budget API, their default period and the invalid months.
+        """
+        response = self.client.get('/planned/budget/', {'start_month': '2023-01', 'end_month': '2023-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['report']['rows']), 4)
+        self.assertContains(response, '110.2 %')
+        self.assertNotContains(response, '<td>Transfer</td>')
+        response = self.client.get('/planned/budget/')
+        self.assertEqual(response.context['start_month'], timezone.localdate().replace(month=1, day=1))
+        self.assertEqual(self.client.get('/planned/budget/', {'start_month': '2023-13'}).status_code, 400)
+        body = self.client.get('/api/budget/', {'start_month': '2023-02', 'end_month': '2023-02'}).json()
+        self.assertEqual([(row['category_name'], row['variance'], row['used']) for row in body['totals']],
+                         [('food', '-200.01', '33.3'), ('salary', '100.00', '110.0')])
+        self.assertEqual(self.client.get('/api/budget/', {'end_month': 'May'}).status_code, 400)
+
+
+class JobTest(TestCase):
+    def setUp(self):
+        """
+        Method called before each test case in order to set up initial data.
+        This method creates a test user with an account, categories and transactions, and a directory for the job
+        files.
+        """
+        caches['statistics'].clear()
+        files = tempfile.TemporaryDirectory()
+        self.addCleanup(files.cleanup)
+        settings_override = override_settings(HBM_JOB_FILES_DIR=files.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.account = Account.objects.create(account_owner=self.user, account_number='1234567890',
+                                              account_balance=Decimal('100.00'))
+        self.food = TransactionCategory.objects.create(category_type=0, category_name='food')
+        self.salary = TransactionCategory.objects.create(category_type=1, category_name='salary')
+        save_batch(self.account, [
+            Transaction(transaction_type=number % 2, transaction_category=(self.food, self.salary)[number % 2],
+                        transaction_date=date(2023, 1, 1) + timedelta(days=number), transaction_sum=Decimal('10.00'),
+                        transaction_comment=f'test {number}') for number in range(6)])
+        self.client.force_login(self.user)
+
+    def test_claim_is_exclusive_and_stale_jobs_are_requeued(self):
+        """
+        This test checks that a job is claimed once, and that a job without heartbeat for too long is requeued, then
+        failed after MAX_JOB_ATTEMPTS attempts, while an import is failed at once and a touched job is left running.
+        """
+        first = enqueue_job(self.user, 'statistics', self.account)
+        second = enqueue_job(self.user, 'statistics', self.account)
+        imported = enqueue_job(self.user, 'import', self.account, {'file': 'imports/test.csv'})
+        touched = enqueue_job(self.user, 'export', self.account)
+        self.assertEqual(claim_jobs(1), [first.pk])
+        self.assertEqual(claim_jobs(5), [second.pk, imported.pk, touched.pk])
+        self.assertEqual(claim_jobs(5), [])
+        self.assertEqual(requeue_stale_jobs(60), 0)
+        Job.objects.update(job_started=timezone.now() - timedelta(hours=2),
+                           job_updated=timezone.now() - timedelta(hours=2))
+        Job.objects.filter(pk=second.pk).update(job_attempts=MAX_JOB_ATTEMPTS)
+        touch_job(touched.pk)
+        self.assertEqual(requeue_stale_jobs(60), 3)
+        self.assertEqual([(job.job_status, job.job_error) for job in Job.objects.order_by('pk')],
+                         [('queued', ''), ('failed', 'Timed out'),
+                          ('failed', 'Timed out; the job may have partly run and is not retried'), ('running', '')])
+        with self.assertRaises(ValueError):
+            enqueue_job(self.user, 'unknown')
+
+    def test_statistics_and_export_jobs(self):
+        """
+        This test hands statistics and an export off from the pages, runs them with an inline worker and checks
+        their results, the statistics matching the page, and the exported file.
+        """
+        response = self.client.post('/jobs/start/statistics/', {'transaction_start_date': '2023-01-01',
+                                                                 'transaction_end_date': '2023-01-04'})
+        job = Job.objects.get(job_kind='statistics')
+        self.assertRedirects(response, f'/jobs/{job.pk}/')
+        self.assertContains(self.client.get(f'/jobs/{job.pk}/'), 'http-equiv="refresh"')
+        self.client.post('/jobs/start/export/', {'query': 'transaction_type=Expense'})
+        self.assertEqual(run_worker(0, once=True), {'done': 2, 'failed': 0})
+        job.refresh_from_db()
+        result = [{key: Decimal(value) for key, value in row.items()} for row in job.job_result]
+        self.assertEqual(result, [{'overall_income': Decimal('20.00')}, {'overall_expense': Decimal('20.00')},
+                                  {'food': Decimal('20.00')}, {'salary': Decimal('20.00')}])
+        self.assertEqual(self.client.get('/transaction_statistics/', {
+            'transaction_start_date': '2023-01-01', 'transaction_end_date': '2023-01-04'}).context['statistic_data'],
+            result)
+        export = Job.objects.get(job_kind='export')
+        self.assertEqual(export.job_result['rows'], 3)
+        response = self.client.get(f'/jobs/{export.pk}/download/')
+        expected = self.client.get('/export/', {'transaction_type': 'Expense'})
+        self.assertEqual(b''.join(response.streaming_content), b''.join(expected.streaming_content))
+        self.assertEqual(self.client.post('/jobs/start/import/').status_code, 404)
+        for kind, params in (('statistics', {'transaction_start_date': 'bad'}),
+                             ('statistics', {'query': 'transaction_end_date=2023-02-30'}),
+                             ('export', {'query': 'transaction_category=abc'}), ('export', {'export_format': 'xml'})):
+            self.assertEqual(self.client.post(f'/jobs/start/{kind}/', params).status_code, 400)
+        self.assertEqual(Job.objects.count(), 2)
+        other = User.objects.create_user(username='other', password='12345')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/jobs/{export.pk}/download/').status_code, 404)
+
+    def test_background_import(self):
+        """
+        This test checks that an upload imported in the background gives the same transactions and result as the
+        import page, and that the file is deleted.
+        """
+        content = ('transaction_date,transaction_type,transaction_category,transaction_sum,transaction_comment\n'
+                   '2023-02-05,Expense,food,10.50,bread\n'
+                   '2023-02-07,Expense,unknown,1.00,bad category\n')
+        response = self.client.post('/import/', {
+            'import_file': SimpleUploadedFile('bank.csv', content.encode()), 'import_format': 'csv',
+            'import_in_background': 'on'})
+        job = Job.objects.get()
+        self.assertRedirects(response, f'/jobs/{job.pk}/')
+        self.assertTrue(job_storage().exists(job.job_params['file']))
+        self.assertFalse(Transaction.objects.filter(transaction_comment='bread').exists())
+        run_worker(0, once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.job_status, job.job_result['imported'], job.job_result['error_count']), ('done', 1, 1))
+        self.assertFalse(job_storage().exists(job.job_params['file']))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.account_balance, Decimal('89.50'))
+        self.assertContains(self.client.get(f'/jobs/{job.pk}/'), 'Imported 1 transactions')
+
+    def test_job_api(self):
+        """
+        This test checks the job API: queueing, polling, the failures of tasks, and the staff-only reconciliation.
+        """
+        response = self.client.post('/api/jobs/', json.dumps({'kind': 'export', 'params': {
+            'transaction_type': 'Income', 'export_format': 'ndjson'}}), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        url = response.json()['url']
+        self.assertEqual(self.client.get(url).json()['status'], 'queued')
+        failing = self.client.post('/api/jobs/', json.dumps({'kind': 'export', 'params': {'export_format': 'xml'}}),
+                                   content_type='application/json').json()['url']
+        for body, status in (({'kind': 'import'}, 400), ({'kind': 'export', 'params': []}, 400),
+                             ({'kind': 'reconcile'}, 403)):
+            self.assertEqual(self.client.post('/api/jobs/', json.dumps(body),
+                                              content_type='application/json').status_code, status)
+        with self.assertLogs('hbm.jobs', 'ERROR'):
+            self.assertEqual(run_worker(0, once=True), {'done': 1, 'failed': 1})
+        body = self.client.get(url).json()
+        self.assertEqual((body['status'], body['result']['rows']), ('done', 3))
+        self.assertEqual(len(self.client.get(body['download']).getvalue().splitlines()), 3)
+        self.assertEqual(self.client.get(failing).json()['error'], 'ValueError: Unknown export format')
+        self.user.is_staff = True
+        self.user.save()
+        self.client.post('/api/jobs/', json.dumps({'kind': 'reconcile', 'params': {'fix': True}}),
+                         content_type='application/json')
+        run_worker(0, once=True)
+        result = Job.objects.get(job_kind='reconcile').job_result
+        self.assertEqual(([row['account'] for row in result['drift']], result['fixed']), ([self.account.pk], 1))
+        self.client.force_login(User.objects.create_user(username='other', password='12345'))
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -1,19 +1,47 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, async_views, views
+
+# The read-heavy pages are served by their async versions under ASGI, see HBM_ASYNC_VIEWS.
+read_views = async_views if settings.HBM_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', read_views.home, name='home'),
     path('login/', auth_views.LoginView.as_view(template_name='hbm/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(template_name='hbm/logout.html'), name='logout'),
     path('register/', views.register, name='register'),
-    path('latest/', views.latest, name="latest"),
+    path('latest/', read_views.latest, name="latest"),
     path('add_transaction/', views.add_transaction, name='add_transaction'),
     path('del_transaction/<int:transaction_id>', views.del_transaction, name='del_transaction'),
-    path('transaction_statistics/', views.transaction_statistics, name='transaction_statistics'),
-    path('planned/transactions/', views.planned_transactions, name='planned_transactions'),
+    path('transaction_statistics/', read_views.transaction_statistics, name='transaction_statistics'),
+    path('planned/transactions/', read_views.planned_transactions, name='planned_transactions'),
     path('planned/add_scheduled_transaction/', views.add_scheduled_transaction, name='add_scheduled_transaction'),
     path('planned/del_scheduled_transaction/<int:transaction_id>', views.del_scheduled_transaction, name='del_scheduled_transaction'),
-    #path('planned/transaction_statistics/', views.planned_transaction_statistics, name='planned_transaction_statistics'),
-    path('filter/', views.filter, name='filter'),
+    path('planned/transaction_statistics/', views.planned_transaction_statistics, name='planned_transaction_statistics'),
+    path('planned/budget/', views.budget, name='budget'),
+    path('filter/', read_views.filter, name='filter'),
+    path('accounts/', views.accounts, name='accounts'),
+    path('accounts/add/', views.add_account, name='add_account'),
+    path('accounts/switch/', views.switch_account, name='switch_account'),
+    path('accounts/transfer/', views.transfer_between_accounts, name='transfer'),
+    path('import/', views.upload_transactions, name='upload_transactions'),
+    path('export/', views.export_transactions, name='export_transactions'),
+    path('jobs/', views.jobs, name='jobs'),
+    path('jobs/<int:job_id>/', views.job, name='job'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
+    path('jobs/start/<str:kind>/', views.start_job, name='start_job'),
+    path('api/transactions/', api.transaction_list, name='api_transactions'),
+    path('api/transactions/batch/', api.transaction_batch_create, name='api_transactions_batch'),
+    path('api/transactions/batch_delete/', api.transaction_batch_delete, name='api_transactions_batch_delete'),
+    path('api/planned/', api.transaction_list, {'planned': True}, name='api_planned'),
+    path('api/planned/batch/', api.transaction_batch_create, {'planned': True}, name='api_planned_batch'),
+    path('api/planned/batch_delete/', api.transaction_batch_delete, {'planned': True},
+         name='api_planned_batch_delete'),
+    path('api/summary/', api.summary, name='api_summary'),
+    path('api/budget/', api.budget, name='api_budget'),
+    path('api/jobs/', api.job_create, name='api_jobs'),
+    path('api/jobs/<int:job_id>/', api.job_detail, name='api_job'),
+    path('api/forecast/', api.balance_forecast, name='api_forecast'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
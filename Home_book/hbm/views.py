@@ -1,18 +1,225 @@
-from datetime import datetime, date
+import csv
+import io
+import json
+from datetime import datetime, date, timedelta
 from decimal import Decimal
-from typing import Union
+from itertools import islice
+from typing import Optional, Tuple, Union, Iterator
 
+from django.conf import settings
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from django.db.models import Sum, FloatField
-from django.http import HttpResponse, JsonResponse, HttpRequest, HttpResponseRedirect
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse, JsonResponse, HttpRequest, HttpResponseRedirect, HttpResponseBadRequest, \
+    StreamingHttpResponse, QueryDict, Http404, FileResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_http_methods
 
-from .forms import TransactionForm, PlanningTransactionForm
-from .models import Transaction, Account, TransactionCategory, PlanningTransaction
+from .accounts import SESSION_ACCOUNT_KEY, find_account
+from .budget import budget_report, parse_month
+from .categories import TRANSFER_CATEGORY_NAME, get_categories, get_category_name
+from .forecast import FORECAST_DAYS, forecast
+from .forms import TransactionForm, PlanningTransactionForm, ImportTransactionsForm, AccountForm, TransferForm
+from .importers import import_transactions, parse_csv, parse_ofx
+from .jobs import JOB_DONE, enqueue_job, job_storage
+from .ledger import keyset_page, transfer
+from .models import Transaction, Account, PlanningTransaction, Job
+from .profiling import render_metrics
+from .running_balance import balance_checkpoint, running_balance_page, set_running_balances, with_running_total
+from .search import search_page, search_transactions
+from .snapshot import ledger_sums
+from .statistics_cache import get_cached_statistics
+from .rollups import LEDGER_FIELDS, rollup_sums, add_transaction_to_rollup, remove_transaction_from_rollup, \
+    add_planned_transaction_to_rollup, remove_planned_transaction_from_rollup, account_sums
+
+FILTER_PAGE_SIZE = 50
+STREAM_CHUNK_SIZE = 500
+STREAM_ROWS_MARKER = '<!-- transaction rows -->'
+JOBS_PAGE_SIZE = 20
+PAGE_JOB_KINDS = ('statistics', 'export')
+EXPORT_FIELDS = ('transaction_date', 'transaction_type', 'transaction_category', 'transaction_sum',
+                 'transaction_comment')
+
+
+def get_statistic_data(sums: list, income_key: str = 'overall_income', expense_key: str = 'overall_expense') -> list:
+    """
+    Function for collecting the total income, the total expense and the sum for each category from the grouped sums
+    returned by rollup_sums() or ledger_sums().
+    :param sums: The sums per transaction type and category name.
+    :type sums: list
+    :param income_key: The key of the total income dict.
+    :type income_key: str
+    :param expense_key: The key of the total expense dict.
+    :type expense_key: str
+    :return: A list of dicts: overall income, overall expense and one dict per category name.
+    :rtype: list
+    """
+    overall_income = Decimal(0)
+    overall_expense = Decimal(0)
+    category_sums = {}
+    for row in sums:
+        if row['type'] == 1:
+            overall_income += row['total']
+        else:
+            overall_expense += row['total']
+        category_sums[row['category_name']] = category_sums.get(row['category_name'], Decimal(0)) + row['total']
+    statistic_data = [{income_key: overall_income}, {expense_key: overall_expense}]
+    statistic_data.extend({name: total} for name, total in category_sums.items())
+    return statistic_data
+
+
+def get_request_account(request: HttpRequest) -> Account:
+    """
+    Function for the account of the logged-in user, resolved once per request by account_middleware.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The account.
+    :rtype: Account
+    :raises Http404: If the user has no account.
+    """
+    if not request.account:
+        raise Http404('No Account matches the given query.')
+    return request.account
+
+
+def parse_date_range(params: QueryDict) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Function for the transaction_start_date and transaction_end_date parameters, each of them optional: a missing
+    bound leaves that side of the range open.
+    :param params: The request parameters.
+    :type params: QueryDict
+    :return: The first and the last day of the range, each of them a date or None.
+    :rtype: Tuple[Optional[date], Optional[date]]
+    :raises ValueError: If a date is invalid.
+    """
+    return tuple(datetime.strptime(params[key], '%Y-%m-%d').date() if params.get(key) else None
+                 for key in ("transaction_start_date", "transaction_end_date"))
+
+
+def get_filtered_transactions(params: QueryDict, user_account: Account, planned: bool = False) -> QuerySet:
+    """
+    Function for the transactions of the account filtered by the type, category and date range request parameters
+    and, for real transactions, by the words of the search parameter in their comments, see search_transactions().
+    :param params: The request parameters.
+    :type params: QueryDict
+    :param user_account: The account whose transactions are filtered.
+    :type user_account: Account
+    :param planned: True to filter planned transactions.
+    :type planned: bool
+    :return: The filtered transactions.
+    :rtype: QuerySet
+    :raises ValueError: If a date or the category is invalid.
+    """
+    fields = LEDGER_FIELDS[planned]
+    transactions = fields['model'].objects.filter(**{fields['account']: user_account})
+
+    transaction_type = params.get("transaction_type")
+    transaction_category = params.get("transaction_category")
+    transaction_start_date, transaction_end_date = parse_date_range(params)
+
+    if transaction_start_date:
+        transactions = transactions.filter(**{f"{fields['date']}__gte": transaction_start_date})
+    if transaction_end_date:
+        transactions = transactions.filter(**{f"{fields['date']}__lte": transaction_end_date})
+
+    if transaction_type and transaction_type == "Expense":
+        transactions = transactions.filter(**{fields['type']: 0})
+    elif transaction_type and transaction_type == "Income":
+        transactions = transactions.filter(**{fields['type']: 1})
+
+    if transaction_category:
+        transactions = transactions.filter(**{fields['category']: int(transaction_category)})
+
+    search = params.get("search")
+    if search and not planned:
+        transactions = search_transactions(transactions, user_account, search)
+    return transactions
+
+
+def running_balance_end_date(params: QueryDict) -> Tuple[bool, Optional[date]]:
+    """
+    Function telling whether the transactions selected by the filter parameters can show a running balance, which
+    is the case unless they are filtered by type, category or search, and up to which date.
+    :param params: The request parameters.
+    :type params: QueryDict
+    :return: True if the running balance can be shown, and the end date of the filter or None.
+    :rtype: Tuple[bool, Optional[date]]
+    :raises ValueError: If the end date is invalid.
+    """
+    if params.get("transaction_type") or params.get("transaction_category") or params.get("search"):
+        return False, None
+    return True, parse_date_range(params)[1]
+
+
+def stream_filtered_transactions(request: HttpRequest, transactions: QuerySet, context: dict,
+                                 checkpoint: Optional[Decimal] = None) -> Iterator[str]:
+    """
+    Generator rendering the filter page around the transaction rows, which are read with a server-side iterator and
+    rendered STREAM_CHUNK_SIZE rows at a time, so memory does not depend on the number of transactions.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param transactions: The filtered and ordered transactions, annotated by with_running_total() if checkpoint is
+        given.
+    :type transactions: QuerySet
+    :param context: The template context of the filter page.
+    :type context: dict
+    :param checkpoint: The balance after the first transaction, to show the running balance, or None.
+    :type checkpoint: Optional[Decimal]
+    :return: The chunks of the rendered page.
+    :rtype: Iterator[str]
+    """
+    page = render_to_string('hbm/filter.html', {**context, 'stream_rows_marker': STREAM_ROWS_MARKER}, request=request)
+    head, tail = page.split(STREAM_ROWS_MARKER)
+    yield head
+    rows = transactions.iterator(chunk_size=STREAM_CHUNK_SIZE)
+    while chunk := list(islice(rows, STREAM_CHUNK_SIZE)):
+        if checkpoint is not None:
+            set_running_balances(chunk, checkpoint)
+        yield render_to_string('hbm/filter_rows.html', {'transactions': chunk, 'show_balance': checkpoint is not None})
+    yield tail
+
+
+def export_row(row: tuple) -> list:
+    """
+    Function converting a values_list() row of EXPORT_FIELDS to the exported values.
+    """
+    transaction_date, transaction_type, category_id, transaction_sum, transaction_comment = row
+    return [transaction_date.isoformat(), 'Income' if transaction_type == 1 else 'Expense',
+            get_category_name(category_id), str(transaction_sum), transaction_comment]
+
+
+def stream_csv(rows: Iterator[tuple]) -> Iterator[str]:
+    """
+    Generator writing the exported rows as CSV lines, starting with the header.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(export_row(row))
+
+
+def stream_ndjson(rows: Iterator[tuple]) -> Iterator[str]:
+    """
+    Generator writing the exported rows as newline-delimited JSON objects.
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, export_row(row)))) + '\n'
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, so csv.writer can produce one line at a time.
+    """
+
+    def write(self, value: str) -> str:
+        return value
 
 
 # Create your views here.
@@ -26,7 +233,7 @@ def home(request: HttpRequest) -> HttpResponse:
     :rtype: HttpResponse
     """
     if request.user.is_authenticated:
-        user_account = get_object_or_404(Account, account_owner=request.user)
+        user_account = get_request_account(request)
         return render(request, 'hbm/home.html', {'user_account': user_account})
     else:
         return render(request, 'hbm/home.html')
@@ -61,14 +268,16 @@ def register(request: HttpRequest) -> Union[HttpResponse, HttpResponseRedirect]:
 @require_http_methods(["GET"])
 def latest(request: HttpRequest) -> HttpResponse:
     """
-    Function for the list of recent transactions. Returns the 10 most recent transactions, sorted by date.
+    Function for the list of recent transactions. Returns the 10 most recent transactions, sorted by date, with the
+    balance after each of them.
     :param request: The HTTP request.
     :type request: HttpRequest
     :return: The rendered HTML template for displaying the latest transactions.
     :rtype: HttpResponse
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
-    transactions = Transaction.objects.filter(transaction_account=user_account).order_by('-transaction_date')[:10]
+    user_account = get_request_account(request)
+    transactions, _ = running_balance_page(
+        user_account, Transaction.objects.filter(transaction_account=user_account), None, 10)
     return render(request, 'hbm/transaction.html', {'transactions': transactions, 'user_account': user_account})
 
 
@@ -83,18 +292,19 @@ def add_transaction(request: HttpRequest) -> Union[HttpResponse, HttpResponseRed
              transactions, otherwise returns a template with a form to add a transaction.
     :rtype: Union[HttpResponse, HttpResponseRedirect]
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
+    user_account = get_request_account(request)
     if request.method == "POST":
         form = TransactionForm(request.POST)
         if form.is_valid():
             transaction = form.save(commit=False)
             transaction.transaction_account = user_account
-            if transaction.transaction_type == 1:
-                user_account.account_balance += transaction.transaction_sum
-            else:
-                user_account.account_balance -= transaction.transaction_sum
-            user_account.save()
-            transaction.save()
+            with db_transaction.atomic():
+                if transaction.transaction_type == 1:
+                    user_account.add_to_balance(transaction.transaction_sum)
+                else:
+                    user_account.add_to_balance(-transaction.transaction_sum)
+                transaction.save()
+                add_transaction_to_rollup(transaction)
             return redirect('latest')
     else:
         form = TransactionForm()
@@ -113,51 +323,143 @@ def del_transaction(request: HttpRequest, transaction_id: int) -> HttpResponseRe
     :return: A redirect response to the latest transactions page.
     :rtype: HttpResponseRedirect
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
+    user_account = get_request_account(request)
     transaction = get_object_or_404(Transaction, pk=transaction_id, transaction_account=user_account)
-    if transaction.transaction_type == 1:
-        user_account.account_balance -= transaction.transaction_sum
-    else:
-        user_account.account_balance += transaction.transaction_sum
-    user_account.save()
-    transaction.delete()
+    with db_transaction.atomic():
+        # The balance UPDATE comes first so the write lock is taken before any read. Only the request that actually
+        # deletes the row keeps the balance change.
+        if transaction.transaction_type == 1:
+            user_account.add_to_balance(-transaction.transaction_sum)
+        else:
+            user_account.add_to_balance(transaction.transaction_sum)
+        deleted, _ = Transaction.objects.filter(pk=transaction.pk).delete()
+        if deleted:
+            remove_transaction_from_rollup(transaction)
+        else:
+            db_transaction.set_rollback(True)
     return redirect('latest')
 
 
 @login_required
-@require_http_methods(["GET"])
-def filter(request: HttpRequest) -> HttpResponse:
+@require_http_methods(["GET", "POST"])
+def upload_transactions(request: HttpRequest) -> HttpResponse:
     """
-    A function to filter transactions by type, category and/or time period. Returns a filtered list of transactions.
-    :param request: The HTTP request object.
+    Function for importing transactions from an uploaded CSV or OFX file. The file is parsed as a stream and
+    inserted in batches, each batch changing the balance once. In the background, the file is saved and imported by
+    a job instead.
+    :param request: HTTP request object containing the form data and the file.
     :type request: HttpRequest
-    :return: The HTTP response object.
+    :return: The import form, with the import result after a valid upload.
     :rtype: HttpResponse
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
-    transactions = Transaction.objects.filter(transaction_account=user_account)
-    category_list = TransactionCategory.objects.all()
-
-    transaction_type = request.GET.get("transaction_type")
-    transaction_category = request.GET.get("transaction_category")
-    transaction_start_date = request.GET.get("transaction_start_date")
-    transaction_end_date = request.GET.get("transaction_end_date")
+    user_account = get_request_account(request)
+    result = None
+    if request.method == "POST":
+        form = ImportTransactionsForm(request.POST, request.FILES)
+        if form.is_valid():
+            if form.cleaned_data['import_in_background']:
+                category = form.cleaned_data['import_category']
+                job = enqueue_job(request.user, 'import', user_account, {
+                    'file': job_storage().save(f"imports/{form.cleaned_data['import_file'].name}",
+                                               form.cleaned_data['import_file']),
+                    'format': form.cleaned_data['import_format'], 'category': category.pk if category else None})
+                return redirect('job', job_id=job.pk)
+            file = io.TextIOWrapper(form.cleaned_data['import_file'], encoding='utf-8-sig', newline='')
+            if form.cleaned_data['import_format'] == 'ofx':
+                rows = parse_ofx(file, form.cleaned_data['import_category'].pk)
+            else:
+                rows = parse_csv(file)
+            result = import_transactions(user_account, rows)
+            user_account.refresh_from_db()
+    else:
+        form = ImportTransactionsForm()
+    return render(request, 'hbm/upload_transactions.html',
+                  {"form": form, "result": result, 'user_account': user_account})
 
-    if transaction_start_date and transaction_end_date:
-        transaction_start_date = datetime.strptime(transaction_start_date, '%Y-%m-%d')
-        transaction_end_date = datetime.strptime(transaction_end_date, '%Y-%m-%d')
-        transactions = transactions.filter(transaction_date__range=[transaction_start_date, transaction_end_date])
 
-    if transaction_type and transaction_type == "Expense":
-        transactions = transactions.filter(transaction_type=0)
-    elif transaction_type and transaction_type == "Income":
-        transactions = transactions.filter(transaction_type=1)
+@login_required
+@require_http_methods(["GET"])
+def filter(request: HttpRequest) -> Union[HttpResponse, StreamingHttpResponse]:
+    """
+    A function to filter transactions by type, category, time period and/or words of their comments. Returns a
+    filtered list of transactions, one page at a time. Pages are selected with a (transaction_date, id) cursor instead
+    of an offset, so every page costs the same. Unless the transactions are filtered by type, category or search,
+    each shows the balance after it. Search results are ordered by relevance, and their cursor is the page number.
+    With the stream parameter the whole list is rendered in chunks as a streaming response, newest first.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The HTTP response object.
+    :rtype: Union[HttpResponse, StreamingHttpResponse]
+    """
+    user_account = get_request_account(request)
+    try:
+        transactions = get_filtered_transactions(request.GET, user_account).order_by('-transaction_date', '-id')
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date or category')
+    category_list = get_categories()
+    export_query = request.GET.copy()
+    for name in ('cursor', 'stream'):
+        export_query.pop(name, None)
+    show_balance, end_date = running_balance_end_date(request.GET)
+    context = {'category_list': category_list, 'user_account': user_account, 'export_query': export_query.urlencode(),
+               'show_balance': show_balance, 'search': request.GET.get("search", "")}
+
+    if request.GET.get("stream"):
+        if show_balance:
+            return StreamingHttpResponse(stream_filtered_transactions(
+                request, with_running_total(transactions), context, balance_checkpoint(user_account, None, end_date)))
+        return StreamingHttpResponse(stream_filtered_transactions(request, transactions, context))
+
+    cursor = request.GET.get("cursor")
+    try:
+        if request.GET.get("search"):
+            page, next_cursor = search_page(transactions, cursor, FILTER_PAGE_SIZE)
+        elif show_balance:
+            page, next_cursor = running_balance_page(user_account, transactions, cursor, FILTER_PAGE_SIZE, end_date)
+        else:
+            page, next_cursor = keyset_page(transactions, cursor, FILTER_PAGE_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    if next_cursor:
+        next_page = request.GET.copy()
+        next_page['cursor'] = next_cursor
+        context['next_page_query'] = next_page.urlencode()
+    if cursor:
+        first_page = request.GET.copy()
+        del first_page['cursor']
+        context['first_page_query'] = first_page.urlencode()
+    context['transactions'] = page
+    return render(request, 'hbm/filter.html', context)
 
-    if transaction_category:
-        transactions = transactions.filter(transaction_category=transaction_category)
 
-    return render(request, 'hbm/filter.html',
-                  {'transactions': transactions, 'category_list': category_list, 'user_account': user_account})
+@login_required
+@require_http_methods(["GET"])
+def export_transactions(request: HttpRequest) -> StreamingHttpResponse:
+    """
+    Function for exporting the transactions selected by the filter parameters as CSV or NDJSON. Rows are streamed
+    from a values_list() iterator, so no model instances are built and memory does not depend on the export size.
+    The CSV columns are the ones accepted by the import.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The streaming CSV or NDJSON response.
+    :rtype: StreamingHttpResponse
+    """
+    user_account = get_request_account(request)
+    export_format = request.GET.get("export_format", "csv")
+    if export_format not in ('csv', 'ndjson'):
+        return HttpResponseBadRequest('Unknown export format')
+    try:
+        transactions = get_filtered_transactions(request.GET, user_account)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date or category')
+    rows = transactions.order_by('-transaction_date', '-id').values_list(*EXPORT_FIELDS).iterator(
+        chunk_size=STREAM_CHUNK_SIZE)
+    if export_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="transactions.{export_format}"'
+    return response
 
 
 @login_required
@@ -171,28 +473,15 @@ def transaction_statistics(request: HttpRequest) -> HttpResponse:
     :return: The HTTP response object.
     :rtype: HttpResponse
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
-    transactions = Transaction.objects.filter(transaction_account=user_account)
-
-    transaction_start_date = request.GET.get("transaction_start_date")
-    transaction_end_date = request.GET.get("transaction_end_date")
-
-    if transaction_start_date and transaction_end_date:
-        transaction_start_date = datetime.strptime(transaction_start_date, '%Y-%m-%d')
-        transaction_end_date = datetime.strptime(transaction_end_date, '%Y-%m-%d')
-        transactions = transactions.filter(transaction_date__range=[transaction_start_date, transaction_end_date])
-
-    transaction_inc_sum = transactions.filter(transaction_type=1).aggregate(
-        overall_income=Sum('transaction_sum', output_field=FloatField()))
-    transaction_exp_sum = transactions.filter(transaction_type=0).aggregate(
-        overall_expense=Sum('transaction_sum', output_field=FloatField()))
-    category_list = list(transactions.values('transaction_category__category_name'))
-    category_name_list = [
-        *set(category_list[i]['transaction_category__category_name'] for i in range(len(category_list)))]
-    statistic_data = [transaction_inc_sum, transaction_exp_sum]
-    for c in category_name_list:
-        statistic_data.append({c: transactions.filter(transaction_category__category_name=c).aggregate(
-            Sum('transaction_sum', output_field=FloatField()))["transaction_sum__sum"]})
+    user_account = get_request_account(request)
+    try:
+        transaction_start_date, transaction_end_date = parse_date_range(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date')
+
+    statistic_data = get_cached_statistics(
+        user_account, transaction_start_date, transaction_end_date,
+        lambda: get_statistic_data(ledger_sums(user_account, transaction_start_date, transaction_end_date)))
 
     return render(request, 'hbm/transaction_statistics.html',
                   {"statistic_data": statistic_data, 'user_account': user_account})
@@ -209,7 +498,7 @@ def planned_transactions(request: HttpRequest) -> HttpResponse:
     :return: The rendered HTML template for displaying the planned transactions.
     :rtype: HttpResponse
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
+    user_account = get_request_account(request)
     transactions = PlanningTransaction.objects.filter(transaction_account_plan=user_account).order_by(
         '-transaction_date_plan')
     return render(request, 'hbm/planned_transactions.html',
@@ -227,13 +516,14 @@ def add_scheduled_transaction(request: HttpRequest) -> Union[HttpResponse, HttpR
         add_scheduled_transaction template.
     :rtype: Union[HttpResponse, HttpResponseRedirect]
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
+    user_account = get_request_account(request)
     if request.method == "POST":
         form = PlanningTransactionForm(request.POST)
         if form.is_valid():
             transaction = form.save(commit=False)
             transaction.transaction_account_plan = user_account
             transaction.save()
+            add_planned_transaction_to_rollup(transaction)
             return redirect('planned_transactions')
     else:
         form = PlanningTransactionForm()
@@ -252,9 +542,13 @@ def del_scheduled_transaction(request: HttpRequest, transaction_id: int) -> Http
     :return: A redirect to the planned transactions page.
     :rtype: HttpResponseRedirect
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
+    user_account = get_request_account(request)
     transaction = get_object_or_404(PlanningTransaction, pk=transaction_id, transaction_account_plan=user_account)
-    transaction.delete()
+    with db_transaction.atomic():
+        # Only the request that actually deletes the plan takes it out of the rollup.
+        deleted, _ = PlanningTransaction.objects.filter(pk=transaction.pk).delete()
+        if deleted:
+            remove_planned_transaction_from_rollup(transaction)
     return redirect('planned_transactions')
 
 
@@ -263,28 +557,260 @@ def del_scheduled_transaction(request: HttpRequest, transaction_id: int) -> Http
 def planned_transaction_statistics(request: HttpRequest) -> HttpResponse:
     """
     Function for statistics on planned transactions for the selected period. Gives the total amount of income and
-    expenses and the amount for each category of transactions.
+    expenses, and the projected balance at the end of the period (a year from today by default) with the lowest
+    projected balance until then.
     :param request: The HTTP request object.
     :type request: HttpRequest
     :return: The HTTP response object that the client will receive with the statistics of planned transactions.
     :rtype: HttpResponse
     """
-    user_account = get_object_or_404(Account, account_owner=request.user)
-    transactions = PlanningTransaction.objects.filter(transaction_account_plan=user_account)
+    user_account = get_request_account(request)
+    try:
+        transaction_start_date, transaction_end_date = parse_date_range(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date')
+
+    statistic_data = get_statistic_data(
+        rollup_sums(user_account, transaction_start_date, transaction_end_date, planned=True),
+        income_key='planned_income', expense_key='planned_expense')[:2]
+
+    today = timezone.localdate()
+    forecast_end = transaction_end_date if transaction_end_date and transaction_end_date >= today else None
+    series = forecast(user_account, forecast_end or today + timedelta(days=FORECAST_DAYS - 1), today)
+    return render(request, 'hbm/plan_transaction_statistics.html',
+                  {"statistic_data": statistic_data, 'user_account': user_account, 'forecast_end': series[-1],
+                   'forecast_lowest': min(series, key=lambda day: day['balance'])})
+
+
+@login_required
+@require_http_methods(["GET"])
+def budget(request: HttpRequest) -> HttpResponse:
+    """
+    Function for the budget-vs-actual report of the account between the start_month and end_month months, the
+    current year by default: the planned and the real totals of each category per month and over the period, their
+    variance and the percentage of the budget used. The transfers between the accounts are left out.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The HTTP response object.
+    :rtype: HttpResponse
+    """
+    user_account = get_request_account(request)
+    today = timezone.localdate()
+    try:
+        start_month = parse_month(request.GET.get("start_month"), today.replace(month=1))
+        end_month = parse_month(request.GET.get("end_month"), today.replace(month=12))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid month')
+
+    transfer_categories = [category.pk for category in get_categories()
+                           if category.category_name == TRANSFER_CATEGORY_NAME]
+    report = budget_report(user_account, start_month, end_month, transfer_categories)
+    return render(request, 'hbm/budget.html', {'report': report, 'user_account': user_account,
+                                               'start_month': start_month, 'end_month': end_month})
+
+
+# Accounts
+@login_required
+@require_http_methods(["GET"])
+def accounts(request: HttpRequest) -> HttpResponse:
+    """
+    Function for the consolidated view of all the accounts of the user: the balance, the income and the expenses of
+    each account for the selected period, and their totals. The sums of all accounts come from the same grouped
+    queries, and the transfers between the accounts are left out of them.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The HTTP response object.
+    :rtype: HttpResponse
+    """
+    user_accounts = list(request.accounts)
+    try:
+        transaction_start_date, transaction_end_date = parse_date_range(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date')
+
+    transfer_categories = [category.pk for category in get_categories()
+                           if category.category_name == TRANSFER_CATEGORY_NAME]
+    sums = account_sums(user_accounts, transaction_start_date, transaction_end_date, transfer_categories)
+    rows = [{'account': account, 'expense': sums[account.pk][0], 'income': sums[account.pk][1]}
+            for account in user_accounts]
+    totals = {'balance': sum((account.account_balance for account in user_accounts), Decimal(0)),
+              'expense': sum((row['expense'] for row in rows), Decimal(0)),
+              'income': sum((row['income'] for row in rows), Decimal(0))}
+    return render(request, 'hbm/accounts.html', {'rows': rows, 'totals': totals})
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def add_account(request: HttpRequest) -> Union[HttpResponse, HttpResponseRedirect]:
+    """
+    Function for opening another account of the user, with a zero balance. The new account is selected.
+    :param request: HTTP request object containing the form data.
+    :type request: HttpRequest
+    :return: If the request method is POST and the form is valid, redirects the user to the accounts page,
+             otherwise returns a template with a form to add an account.
+    :rtype: Union[HttpResponse, HttpResponseRedirect]
+    """
+    if request.method == "POST":
+        form = AccountForm(request.POST)
+        if form.is_valid():
+            account = form.save(commit=False)
+            account.account_owner = request.user
+            account.save()
+            request.session[SESSION_ACCOUNT_KEY] = account.pk
+            return redirect('accounts')
+    else:
+        form = AccountForm()
+    return render(request, 'hbm/add_account.html', {'form': form})
+
+
+@login_required
+@require_http_methods(["POST"])
+def switch_account(request: HttpRequest) -> HttpResponseRedirect:
+    """
+    Function for selecting the account the other pages show, kept in the session.
+    :param request: The HTTP request object with the ID of the account and the page to go back to.
+    :type request: HttpRequest
+    :return: A redirect response to the next page, or to the home page.
+    :rtype: HttpResponseRedirect
+    :raises Http404: If the account is not one of the user.
+    """
+    account = find_account(request.accounts, request.POST.get('account'))
+    if account is None:
+        raise Http404('No Account matches the given query.')
+    request.session[SESSION_ACCOUNT_KEY] = account.pk
+    next_page = request.POST.get('next')
+    if next_page and url_has_allowed_host_and_scheme(next_page, allowed_hosts={request.get_host()},
+                                                     require_https=request.is_secure()):
+        return redirect(next_page)
+    return redirect('home')
 
-    transaction_start_date = request.GET.get("transaction_start_date")
-    transaction_end_date = request.GET.get("transaction_end_date")
 
-    if transaction_start_date and transaction_end_date:
-        transaction_start_date = datetime.strptime(transaction_start_date, '%Y-%m-%d')
-        transaction_end_date = datetime.strptime(transaction_end_date, '%Y-%m-%d')
-        transactions = transactions.filter(transaction_date_plan__range=[transaction_start_date, transaction_end_date])
+@login_required
+@require_http_methods(["GET", "POST"])
+def transfer_between_accounts(request: HttpRequest) -> Union[HttpResponse, HttpResponseRedirect]:
+    """
+    Function for moving money from the selected account to another account of the user. Both transactions are
+    saved atomically, see ledger.transfer().
+    :param request: HTTP request object containing the form data.
+    :type request: HttpRequest
+    :return: If the request method is POST and the form is valid, redirects the user to the accounts page,
+             otherwise returns a template with a form to make a transfer.
+    :rtype: Union[HttpResponse, HttpResponseRedirect]
+    """
+    user_account = get_request_account(request)
+    others = [account for account in request.accounts if account.pk != user_account.pk]
+    if request.method == "POST":
+        form = TransferForm(request.POST, accounts=others)
+        if form.is_valid():
+            transfer(user_account, find_account(others, form.cleaned_data['transfer_account']),
+                     form.cleaned_data['transaction_sum'], form.cleaned_data['transaction_date'],
+                     form.cleaned_data['transaction_comment'])
+            return redirect('accounts')
+    else:
+        form = TransferForm(accounts=others)
+    return render(request, 'hbm/transfer.html', {'form': form, 'user_account': user_account})
 
-    transaction_inc_sum = transactions.filter(transaction_type_plan=1).aggregate(
-        planned_income=Sum('transaction_sum_plan', output_field=FloatField()))
-    transaction_exp_sum = transactions.filter(transaction_type_plan=0).aggregate(
-        planned_expense=Sum('transaction_sum_plan', output_field=FloatField()))
 
-    statistic_data = [transaction_inc_sum, transaction_exp_sum]
-    return render(request, 'hbm/plan_transaction_statistics.html',
-                  {"statistic_data": statistic_data, 'user_account': user_account})
+# Jobs
+@login_required
+@require_http_methods(["POST"])
+def start_job(request: HttpRequest, kind: str) -> Union[HttpResponseRedirect, HttpResponseBadRequest]:
+    """
+    Function handing a statistics or export request off to the job queue and redirecting to the page of the job. The
+    parameters of the request are given by the query field as a query string, or else by the fields of the form.
+    They are checked as the job will read them before it is queued, so invalid ones are rejected here instead of
+    failing the job.
+    :param request: HTTP request object containing the parameters.
+    :type request: HttpRequest
+    :param kind: The kind of the job, 'statistics' or 'export'.
+    :type kind: str
+    :return: A redirect to the page of the job, or a bad request response if the parameters are invalid.
+    :rtype: Union[HttpResponseRedirect, HttpResponseBadRequest]
+    :raises Http404: If the kind cannot be started from the pages.
+    """
+    if kind not in PAGE_JOB_KINDS:
+        raise Http404
+    user_account = get_request_account(request)
+    query = request.POST.get('query')
+    if query is None:
+        params = request.POST.copy()
+        params.pop('csrfmiddlewaretoken', None)
+        query = params.urlencode()
+    params = QueryDict(query)
+    try:
+        if kind == 'statistics':
+            parse_date_range(params)
+        else:
+            get_filtered_transactions(params, user_account)
+            if params.get('export_format', 'csv') not in ('csv', 'ndjson'):
+                raise ValueError('Unknown export format')
+    except ValueError:
+        return HttpResponseBadRequest('Invalid date, category or export format')
+    job = enqueue_job(request.user, kind, user_account, {'query': query})
+    return redirect('job', job_id=job.pk)
+
+
+@login_required
+@require_http_methods(["GET"])
+def jobs(request: HttpRequest) -> HttpResponse:
+    """
+    Function for the latest jobs of the user, newest first.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The HTTP response object.
+    :rtype: HttpResponse
+    """
+    return render(request, 'hbm/jobs.html',
+                  {'jobs': Job.objects.filter(job_owner=request.user).order_by('-id')[:JOBS_PAGE_SIZE]})
+
+
+@login_required
+@require_http_methods(["GET"])
+def job(request: HttpRequest, job_id: int) -> HttpResponse:
+    """
+    Function for the status of a job of the user and its result once done. The page reloads itself until then.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param job_id: The ID of the job.
+    :type job_id: int
+    :return: The HTTP response object.
+    :rtype: HttpResponse
+    """
+    return render(request, 'hbm/job.html', {'job': get_object_or_404(Job, pk=job_id, job_owner=request.user)})
+
+
+@login_required
+@require_http_methods(["GET"])
+def job_download(request: HttpRequest, job_id: int) -> FileResponse:
+    """
+    Function for the file written by a finished export job of the user.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :param job_id: The ID of the job.
+    :type job_id: int
+    :return: The file as an attachment.
+    :rtype: FileResponse
+    :raises Http404: If the job is not a finished export of the user.
+    """
+    job = get_object_or_404(Job, pk=job_id, job_owner=request.user, job_kind='export', job_status=JOB_DONE)
+    return FileResponse(job_storage().open(job.job_result['file'], 'rb'), as_attachment=True,
+                        filename=f"transactions.{job.job_result['format']}")
+
+
+@require_http_methods(["GET"])
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Function for the metrics of the profiling middleware in the Prometheus text format, served only to staff users
+    and to the requests authorized with the HBM_METRICS_TOKEN bearer token, if it is set. The client address is not
+    trusted, as behind a reverse proxy it is the address of the proxy.
+    :param request: The HTTP request object.
+    :type request: HttpRequest
+    :return: The metrics.
+    :rtype: HttpResponse
+    :raises Http404: If the request is neither from a staff user nor authorized by the token.
+    """
+    token = getattr(settings, 'HBM_METRICS_TOKEN', None)
+    if not (request.user.is_staff or token and constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}')):
+        raise Http404
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
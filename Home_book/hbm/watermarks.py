@@ -0,0 +1,24 @@
+from .models import Watermark
+
+
+def get_watermark(name: str) -> int:
+    """
+    Function for the value of a named watermark, 0 if it was never set.
+    :param name: The name of the watermark.
+    :type name: str
+    :return: The value, e.g. the last processed ID.
+    :rtype: int
+    """
+    return Watermark.objects.filter(watermark_name=name).values_list('watermark_value', flat=True).first() or 0
+
+
+def set_watermark(name: str, value: int) -> None:
+    """
+    Function storing the value of a named watermark.
+    :param name: The name of the watermark.
+    :type name: str
+    :param value: The new value.
+    :type value: int
+    :return: None
+    """
+    Watermark.objects.update_or_create(watermark_name=name, defaults={'watermark_value': value})